@@ -19,6 +19,13 @@ from adsrental.admin.lead_account_issue_admin import LeadAccountIssueAdmin
 from adsrental.admin.bundler_team_admin import BundlerTeamAdmin
 from adsrental.admin.lead_account_issue_image_admin import LeadAccountIssueImageAdmin
 from adsrental.admin.comment_admin import CommentAdmin
+from adsrental.admin.proxykeeper_stat_admin import ProxykeeperStatAdmin
+from adsrental.admin.slack_message_admin import SlackMessageAdmin
+from adsrental.admin.shipment_tracking_admin import ShipmentTrackingAdmin
+from adsrental.admin.shipstation_order_request_admin import ShipStationOrderRequestAdmin
+from adsrental.admin.adsdb_push_admin import AdsdbPushAdmin
+from adsrental.admin.instance_sync_run_admin import InstanceSyncRunAdmin
+from adsrental.admin.bundler_payment_total_admin import BundlerPaymentTotalAdmin
 
 
 admin.site.register(CustomUserAdmin.model, CustomUserAdmin)
@@ -44,3 +51,10 @@ admin.site.register(LeadAccountIssueAdmin.model, LeadAccountIssueAdmin)
 admin.site.register(BundlerTeamAdmin.model, BundlerTeamAdmin)
 admin.site.register(LeadAccountIssueImageAdmin.model, LeadAccountIssueImageAdmin)
 admin.site.register(CommentAdmin.model, CommentAdmin)
+admin.site.register(ProxykeeperStatAdmin.model, ProxykeeperStatAdmin)
+admin.site.register(SlackMessageAdmin.model, SlackMessageAdmin)
+admin.site.register(ShipmentTrackingAdmin.model, ShipmentTrackingAdmin)
+admin.site.register(ShipStationOrderRequestAdmin.model, ShipStationOrderRequestAdmin)
+admin.site.register(AdsdbPushAdmin.model, AdsdbPushAdmin)
+admin.site.register(InstanceSyncRunAdmin.model, InstanceSyncRunAdmin)
+admin.site.register(BundlerPaymentTotalAdmin.model, BundlerPaymentTotalAdmin)
@@ -0,0 +1,52 @@
+from django.contrib import admin
+
+from adsrental.models.adsdb_push import AdsdbPush
+from adsrental.models.lead_account import LeadAccount
+from adsrental.admin.base import CSVExporter
+
+
+class AdsdbPushAdmin(admin.ModelAdmin, CSVExporter):
+    model = AdsdbPush
+    csv_fields = (
+        'id',
+        'lead_account_id',
+        'status',
+        'updates',
+        'attempts',
+        'last_error',
+        'sent_date',
+        'created',
+    )
+
+    csv_titles = (
+        'Id',
+        'Lead Account Id',
+        'Status',
+        'Updates',
+        'Attempts',
+        'Last Error',
+        'Sent Date',
+        'Created',
+    )
+    list_display = ('id', 'lead_account', 'status', 'updates', 'attempts', 'last_error', 'requested', 'sent_date', 'created')
+    search_fields = ('lead_account__username', 'lead_account__lead__email', )
+    list_filter = ('status', )
+    list_select_related = ('lead_account', )
+    raw_id_fields = ('lead_account', )
+    readonly_fields = ('created', 'sent_date', 'request_data', 'response', )
+    actions = (
+        'export_as_csv',
+        'retry',
+    )
+
+    def retry(self, request, queryset):
+        queryset = queryset.exclude(status=AdsdbPush.STATUS_SENT)
+        LeadAccount.objects.filter(id__in=queryset.values('lead_account_id')).update(adsdb_sync_status=LeadAccount.ADSDB_SYNC_STATUS_PENDING)
+        queryset.update(
+            status=AdsdbPush.STATUS_PENDING,
+            attempts=0,
+            next_attempt=None,
+            dispatch_id=None,
+        )
+
+    retry.short_description = 'Retry push'
@@ -4,6 +4,7 @@ from django.contrib import admin
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 
+from adsrental.models.bundler import Bundler
 from adsrental.models.bundler_lead_stat import BundlerLeadStat
 from adsrental.admin.base import CSVExporter
 
@@ -176,8 +177,7 @@ class BundlerLeadStatsAdmin(admin.ModelAdmin, CSVExporter):
         )
 
     def calculate(self, request, queryset):
-        for bundler_lead_stat in queryset:
-            BundlerLeadStat.calculate(bundler_lead_stat.bundler)
+        BundlerLeadStat.calculate_all(Bundler.objects.filter(id__in=queryset.values('bundler_id')))
 
     bundler_field.short_description = 'Bundler'
     bundler_field.admin_order_field = 'bundler__name'
@@ -0,0 +1,43 @@
+from django.contrib import admin
+
+from adsrental.models.bundler_payment_total import BundlerPaymentTotal
+from adsrental.admin.base import CSVExporter
+
+
+class BundlerPaymentTotalAdmin(admin.ModelAdmin, CSVExporter):
+    model = BundlerPaymentTotal
+    csv_fields = (
+        'bundler',
+        'date',
+        'payment_type',
+        'paid_sum',
+        'not_paid_sum',
+        'payments_count',
+        'updated',
+    )
+
+    csv_titles = (
+        'Bundler',
+        'Month',
+        'Payment Type',
+        'Paid',
+        'Not Paid',
+        'Payments',
+        'Updated',
+    )
+    list_display = (
+        'id',
+        'bundler',
+        'date',
+        'payment_type',
+        'paid_sum',
+        'not_paid_sum',
+        'payments_count',
+        'updated',
+    )
+    list_filter = ('payment_type', )
+    list_select_related = ('bundler', )
+    search_fields = ('bundler__name', )
+    actions = (
+        'export_as_csv',
+    )
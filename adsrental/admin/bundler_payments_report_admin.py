@@ -4,6 +4,7 @@ from django.utils.safestring import mark_safe
 
 from adsrental.models.bundler_payments_report import BundlerPaymentsReport
 from adsrental.models.bundler_payment import BundlerPayment
+from adsrental.models.bundler_payment_total import BundlerPaymentTotal
 from adsrental.admin.base import CSVExporter
 
 
@@ -72,7 +73,7 @@ class BundlerPaymentsReportAdmin(admin.ModelAdmin, CSVExporter):
                 lead_account.charge_back_billed = False
                 lead_account.save()
 
-            bundler_payments.update(report=None, paid=False)
+            BundlerPaymentTotal.set_paid(bundler_payments, False, report=None)
             report.cancelled = True
             report.save()
             messages.success(request, f'Report for {report.date} has been cancelled')
@@ -13,6 +13,10 @@ class CustomerIOEventAdmin(admin.ModelAdmin, CSVExporter):
         'lead_email',
         'name',
         'sent',
+        'status',
+        'attempts',
+        'last_error',
+        'sent_date',
         'created'
     )
 
@@ -23,15 +27,20 @@ class CustomerIOEventAdmin(admin.ModelAdmin, CSVExporter):
         'Lead Email',
         'Name',
         'Sent',
+        'Status',
+        'Attempts',
+        'Last Error',
+        'Sent Date',
         'Created'
     )
-    list_display = ('id', 'lead', 'lead_name', 'lead_email', 'name', 'sent', 'created')
+    list_display = ('id', 'lead', 'lead_name', 'lead_email', 'name', 'status', 'attempts', 'sent_date', 'created')
     search_fields = ('lead__email', 'lead__first_name',
                      'lead__last_name', 'name', )
-    list_filter = ('name', )
-    readonly_fields = ('created', )
+    list_filter = ('name', 'status', )
+    readonly_fields = ('created', 'sent_date', 'idempotency_key', )
     actions = (
         'export_as_csv',
+        'retry',
     )
 
     def lead_email(self, obj):
@@ -39,3 +48,13 @@ class CustomerIOEventAdmin(admin.ModelAdmin, CSVExporter):
 
     def lead_name(self, obj):
         return obj.lead.name()
+
+    def retry(self, request, queryset):
+        queryset.exclude(status=CustomerIOEvent.STATUS_SENT).update(
+            status=CustomerIOEvent.STATUS_PENDING,
+            attempts=0,
+            next_attempt=None,
+            dispatch_id=None,
+        )
+
+    retry.short_description = 'Retry delivery'
@@ -0,0 +1,50 @@
+from django.contrib import admin
+
+from adsrental.models.instance_sync_run import InstanceSyncRun
+from adsrental.admin.base import CSVExporter
+
+
+class InstanceSyncRunAdmin(admin.ModelAdmin, CSVExporter):
+    model = InstanceSyncRun
+    csv_fields = (
+        'provider',
+        'started',
+        'duration',
+        'api_calls',
+        'instances_total',
+        'instances_created',
+        'instances_updated',
+        'instances_deleted',
+        'instances_unchanged',
+        'error',
+    )
+
+    csv_titles = (
+        'Provider',
+        'Started',
+        'Duration',
+        'API Calls',
+        'Total',
+        'Created',
+        'Updated',
+        'Deleted',
+        'Unchanged',
+        'Error',
+    )
+    list_display = (
+        'id',
+        'provider',
+        'started',
+        'duration',
+        'api_calls',
+        'instances_total',
+        'instances_created',
+        'instances_updated',
+        'instances_deleted',
+        'instances_unchanged',
+        'error',
+    )
+    list_filter = ('provider', )
+    actions = (
+        'export_as_csv',
+    )
@@ -146,6 +146,7 @@ class LeadAccountAdmin(admin.ModelAdmin, CSVExporter):
         'charge_back',
         'primary',
         'ban_reason',
+        'adsdb_sync_status',
         'lead__company',
         ('lead__bundler__is_active', titled_filter('Lead Bundler active')),
         LeadBundlerListFilter,
@@ -184,6 +185,8 @@ class LeadAccountAdmin(admin.ModelAdmin, CSVExporter):
         'bundler_paid_date',
         'charge_back',
         'active',
+        'adsdb_sync_status',
+        'adsdb_sync_date',
     )
     raw_id_fields = ('lead', )
     exclude = ('comments',)
@@ -391,7 +394,7 @@ class LeadAccountAdmin(admin.ModelAdmin, CSVExporter):
             return
 
         if create_order_result:
-            messages.success(request, f'{lead_account} order created: {lead_account.lead.shipstation_order_number}')
+            messages.success(request, f'{lead_account} order queued: {lead_account.lead.shipstation_order_number}')
         else:
             messages.info(request, f'{lead_account} order already exists: {lead_account.lead.shipstation_order_number}.')
 
@@ -490,9 +493,9 @@ class LeadAccountAdmin(admin.ModelAdmin, CSVExporter):
                 lead.save()
                 messages.warning(request, f'{lead.email} touch count has been increased to meet conditions.')
 
-            result = lead_account.sync_to_adsdb()
-            if result:
-                messages.info(request, f'{lead_account} is synced: {result}')
+            adsdb_push, _ = lead_account.sync_to_adsdb()
+            if adsdb_push:
+                messages.info(request, f'{lead_account} is queued for sync')
             else:
                 messages.warning(request, f'{lead_account} does not meet conditions to sync.')
 
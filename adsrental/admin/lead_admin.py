@@ -238,7 +238,7 @@ class LeadAdmin(admin.ModelAdmin, CSVExporter):
         'shipstation_order_number',
         'raspberry_pi',
     )
-    exclude = ('tracking_info', 'utm_source', 'lead_account__comments', 'comments')
+    exclude = ('utm_source', 'lead_account__comments', 'comments')
     raw_id_fields = ('raspberry_pi', )
 
     def __init__(self, *args, **kwargs):
@@ -594,7 +594,7 @@ class LeadAdmin(admin.ModelAdmin, CSVExporter):
             return
 
         if create_order_result:
-            messages.success(request, '{} order created: {}'.format(lead_account, lead_account.lead.shipstation_order_number))
+            messages.success(request, '{} order queued: {}'.format(lead_account, lead_account.lead.shipstation_order_number))
         else:
             messages.info(request, '{} order already exists: {}.'.format(lead_account, lead_account.lead.shipstation_order_number))
 
@@ -640,7 +640,7 @@ class LeadAdmin(admin.ModelAdmin, CSVExporter):
 
                 if lead_account.lead.add_shipstation_order():
                     messages.success(
-                        request, '{} order created: {}'.format(lead_account, lead_account.lead.shipstation_order_number))
+                        request, '{} order queued: {}'.format(lead_account, lead_account.lead.shipstation_order_number))
                 else:
                     messages.info(
                         request, 'Lead {} order already exists: {}.'.format(lead_account, lead_account.lead.shipstation_order_number))
@@ -831,9 +831,9 @@ class LeadAdmin(admin.ModelAdmin, CSVExporter):
             for lead_account in lead.lead_accounts.filter(active=True, account_type__in=LeadAccount.ACCOUNT_TYPES_FACEBOOK):
                 lead_account.touch()
                 messages.info(request, '{} has been touched for {} times.'.format(lead_account, lead_account.touch_count))
-                result, request_data = lead_account.sync_to_adsdb()
-                if result:
-                    messages.info(request, '{} is synced to AdsDB: {} ({})'.format(lead_account, result, request_data))
+                adsdb_push, _ = lead_account.sync_to_adsdb()
+                if adsdb_push:
+                    messages.info(request, '{} is queued for AdsDB sync'.format(lead_account))
                 else:
                     messages.warning(request, '{} does not meet conditions to sync to AdsDB.'.format(lead_account))
 
@@ -850,9 +850,9 @@ class LeadAdmin(admin.ModelAdmin, CSVExporter):
                 messages.warning(request, '{} touch count has been increased to meet conditions.'.format(lead.email))
 
             for lead_account in lead.lead_accounts.filter(active=True, account_type=LeadAccount.ACCOUNT_TYPE_FACEBOOK):
-                result, request_data = lead_account.sync_to_adsdb()
-                if result:
-                    messages.info(request, '{} is synced: {} ({})'.format(lead_account, result, request_data))
+                adsdb_push, _ = lead_account.sync_to_adsdb()
+                if adsdb_push:
+                    messages.info(request, '{} is queued for sync'.format(lead_account))
                 else:
                     messages.warning(request, '{} does not meet conditions to sync.'.format(lead_account))
 
@@ -5,7 +5,9 @@ from django.template.loader import render_to_string
 from django.db.models import Value
 from django.db.models.functions import Concat
 
+from adsrental.models.lead import Lead
 from adsrental.models.lead_history import LeadHistory
+from adsrental.models.lead_history_month import LeadHistoryMonth
 from adsrental.models.lead_account import LeadAccount
 from adsrental.admin.list_filters import DateMonthListFilter, LeadStatusListFilter, AbstractUIDListFilter
 from adsrental.admin.base import CSVExporter
@@ -119,45 +121,72 @@ class LeadHistoryAdmin(admin.ModelAdmin, CSVExporter):
             amount,
         ))
 
+    @staticmethod
+    def refresh_finalized(lead_histories):
+        'Recalculate month totals for leads of finalized days, finalized days are repacked to LeadCheckMonth as well'
+        months_lead_ids = {}
+        for lead_history in lead_histories:
+            if lead_history.finalized:
+                months_lead_ids.setdefault(lead_history.date.replace(day=1), set()).add(lead_history.lead_id)
+        for date_month, lead_ids in sorted(months_lead_ids.items()):
+            LeadHistoryMonth.aggregate_month(Lead.objects.filter(leadid__in=lead_ids), date_month)
+
+    def update_checks(self, queryset, **kwargs):
+        'Update check counters and refresh finalized days'
+        queryset.update(**kwargs)
+        self.refresh_finalized(queryset.filter(finalized=True).only('lead_id', 'date', 'finalized'))
+
+    def save_model(self, request, obj, form, change):
+        super(LeadHistoryAdmin, self).save_model(request, obj, form, change)
+        self.refresh_finalized([obj])
+
     def mark_as_online(self, request, queryset):
-        queryset.update(
+        self.update_checks(
+            queryset,
             checks_online=24,
             checks_offline=0,
         )
 
     def mark_as_offline(self, request, queryset):
-        queryset.update(
+        self.update_checks(
+            queryset,
             checks_online=0,
             checks_offline=24,
         )
 
     def mark_as_correct_password_fb(self, request, queryset):
-        queryset.update(
+        self.update_checks(
+            queryset,
             checks_wrong_password_facebook=0,
         )
 
     def mark_as_correct_password_google(self, request, queryset):
-        queryset.update(
+        self.update_checks(
+            queryset,
             checks_wrong_password_google=0,
         )
 
     def mark_as_correct_password_amazon(self, request, queryset):
-        queryset.update(
+        self.update_checks(
+            queryset,
             checks_wrong_password_amazon=0,
         )
 
     def mark_as_wrong_password_fb(self, request, queryset):
-        queryset.update(
+        self.update_checks(
+            queryset,
             checks_wrong_password_facebook=24,
         )
 
     def mark_as_wrong_password_google(self, request, queryset):
-        queryset.update(
+        self.update_checks(
+            queryset,
             checks_wrong_password_google=24,
         )
 
     def mark_as_wrong_password_amazon(self, request, queryset):
-        queryset.update(
+        self.update_checks(
+            queryset,
             checks_wrong_password_amazon=24,
         )
 
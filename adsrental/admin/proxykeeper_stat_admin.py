@@ -0,0 +1,158 @@
+from django.contrib import admin
+from django.contrib import messages
+from django.urls import reverse
+from django.utils.safestring import mark_safe
+
+from adsrental.models.proxykeeper_stat import ProxykeeperStat
+from adsrental.models.raspberry_pi import RaspberryPi
+from adsrental.admin.base import CSVExporter
+
+
+class ProxykeeperStatAdmin(admin.ModelAdmin, CSVExporter):
+    csv_fields = (
+        'proxy_hostname',
+        'tunnels_total',
+        'tunnels_active',
+        'tunnels_online',
+        'tunnels_offline',
+        'tunnels_checked',
+        'tunnels_dead',
+        'delay_p50',
+        'delay_p90',
+        'delay_p99',
+        'ports_used',
+        'port_utilization',
+        'reassigned_from_last_24_hours',
+        'reassigned_from_last_7_days',
+        'reassigned_from_last_30_days',
+        'reassigned_to_last_24_hours',
+        'reassigned_to_last_7_days',
+        'reassigned_to_last_30_days',
+        'updated',
+    )
+
+    csv_titles = (
+        'Proxy Hostname',
+        'Tunnels Total',
+        'Tunnels Active',
+        'Tunnels Online',
+        'Tunnels Offline',
+        'Tunnels Checked',
+        'Tunnels Dead',
+        'Delay P50',
+        'Delay P90',
+        'Delay P99',
+        'Ports Used',
+        'Port Utilization',
+        'Reassigned From Last 24 Hours',
+        'Reassigned From Last 7 Days',
+        'Reassigned From Last 30 Days',
+        'Reassigned To Last 24 Hours',
+        'Reassigned To Last 7 Days',
+        'Reassigned To Last 30 Days',
+        'Updated',
+    )
+
+    model = ProxykeeperStat
+    list_display = (
+        'proxy_hostname_field',
+        'tunnels_total_field',
+        'tunnels_active',
+        'tunnels_online_field',
+        'tunnels_offline_field',
+        'tunnels_dead_field',
+        'delay_field',
+        'port_utilization_field',
+        'reassigned_from_field',
+        'reassigned_to_field',
+        'updated',
+    )
+    actions = (
+        'calculate',
+        'failover',
+        'export_as_csv',
+    )
+    readonly_fields = ('created', 'updated', )
+
+    def get_raspberry_pi_link(self, obj, value, query=''):
+        return mark_safe('<a href="{url}?is_proxy_tunnel__exact=1&proxy_hostname__exact={proxy_hostname}{query}">{value}</a>'.format(
+            url=reverse('admin:adsrental_raspberrypi_changelist'),
+            proxy_hostname=obj.proxy_hostname,
+            query=query,
+            value=value,
+        ))
+
+    def proxy_hostname_field(self, obj):
+        return f'{obj.get_proxy_hostname_display()} ({obj.proxy_hostname})'
+
+    def tunnels_total_field(self, obj):
+        return self.get_raspberry_pi_link(obj, obj.tunnels_total)
+
+    def tunnels_online_field(self, obj):
+        return self.get_raspberry_pi_link(obj, obj.tunnels_online, '&online=online')
+
+    def tunnels_offline_field(self, obj):
+        return self.get_raspberry_pi_link(obj, obj.tunnels_offline, '&online=offline')
+
+    def tunnels_dead_field(self, obj):
+        link = self.get_raspberry_pi_link(obj, obj.tunnels_dead, '&proxy_delay=unreachable')
+        if obj.is_dead():
+            return mark_safe(f'<span title="Proxykeeper looks dead, tunnels will be moved by failover" style="color: red">{link} of {obj.tunnels_checked}</span>')
+        return mark_safe(f'{link} of {obj.tunnels_checked}')
+
+    def delay_field(self, obj):
+        if obj.delay_p50 is None:
+            return 'Not measured'
+
+        return f'{obj.delay_p50}s / {obj.delay_p90}s / {obj.delay_p99}s'
+
+    def port_utilization_field(self, obj):
+        return f'{obj.ports_used} ({obj.port_utilization}%)'
+
+    def reassigned_from_field(self, obj):
+        return f'{obj.reassigned_from_last_24_hours} / {obj.reassigned_from_last_7_days} / {obj.reassigned_from_last_30_days}'
+
+    def reassigned_to_field(self, obj):
+        return f'{obj.reassigned_to_last_24_hours} / {obj.reassigned_to_last_7_days} / {obj.reassigned_to_last_30_days}'
+
+    def calculate(self, request, queryset):
+        ProxykeeperStat.calculate_all()
+
+    def failover(self, request, queryset):
+        proxy_hostnames = [i.proxy_hostname for i in queryset]
+        if len(proxy_hostnames) == len(RaspberryPi.PROXY_HOSTNAME_CHOICES):
+            messages.error(request, 'At least one proxykeeper should stay available')
+            return
+
+        raspberry_pis = list(RaspberryPi.objects.filter(is_proxy_tunnel=True, proxy_hostname__in=proxy_hostnames))
+        reassignments = RaspberryPi.bulk_reassign_proxy(raspberry_pis, exclude_hostnames=proxy_hostnames)
+        messages.success(request, f'{len(reassignments)} tunnels moved, devices will get new config on next ping')
+
+    proxy_hostname_field.short_description = 'Proxykeeper'
+    proxy_hostname_field.admin_order_field = 'proxy_hostname'
+
+    tunnels_total_field.short_description = 'Total tunnels'
+    tunnels_total_field.admin_order_field = 'tunnels_total'
+
+    tunnels_online_field.short_description = 'Online'
+    tunnels_online_field.admin_order_field = 'tunnels_online'
+
+    tunnels_offline_field.short_description = 'Offline'
+    tunnels_offline_field.admin_order_field = 'tunnels_offline'
+
+    tunnels_dead_field.short_description = 'Unreachable of checked'
+    tunnels_dead_field.admin_order_field = 'tunnels_dead'
+
+    delay_field.short_description = 'Delay p50 / p90 / p99'
+    delay_field.admin_order_field = 'delay_p90'
+
+    port_utilization_field.short_description = 'Ports used'
+    port_utilization_field.admin_order_field = 'port_utilization'
+
+    reassigned_from_field.short_description = 'Moved out (24h / 7d / 30d)'
+    reassigned_from_field.admin_order_field = 'reassigned_from_last_24_hours'
+
+    reassigned_to_field.short_description = 'Moved in (24h / 7d / 30d)'
+    reassigned_to_field.admin_order_field = 'reassigned_to_last_24_hours'
+
+    failover.short_description = 'Move all tunnels to other proxykeepers'
@@ -0,0 +1,41 @@
+from django.contrib import admin
+from django.utils.html import format_html
+
+from adsrental.models.shipment_tracking import ShipmentTracking
+from adsrental.admin.base import CSVExporter
+
+
+class ShipmentTrackingAdmin(admin.ModelAdmin, CSVExporter):
+    model = ShipmentTracking
+    csv_fields = (
+        'lead_id',
+        'tracking_code',
+        'status',
+        'last_event',
+        'delivery_date',
+        'updated',
+    )
+
+    csv_titles = (
+        'Lead Id',
+        'Tracking Code',
+        'Status',
+        'Last Event',
+        'Delivery Date',
+        'Updated',
+    )
+    list_display = ('lead', 'tracking_code', 'status', 'last_event', 'delivery_date', 'updated')
+    search_fields = ('tracking_code', 'lead__email', )
+    list_filter = ('status', )
+    list_select_related = ('lead', )
+    raw_id_fields = ('lead', )
+    exclude = ('raw_data', )
+    readonly_fields = ('raw_xml', 'payload_hash', 'created', 'updated', )
+    actions = (
+        'export_as_csv',
+    )
+
+    def raw_xml(self, obj):
+        return format_html('<pre>{}</pre>', obj.get_raw_xml() or '')
+
+    raw_xml.short_description = 'Raw XML'
@@ -0,0 +1,67 @@
+from django.contrib import admin
+from django.contrib import messages
+
+from adsrental.models.shipstation_order_request import ShipStationOrderRequest
+from adsrental.admin.base import CSVExporter
+from adsrental.utils import ShipStationClient
+
+
+class ShipStationOrderRequestAdmin(admin.ModelAdmin, CSVExporter):
+    model = ShipStationOrderRequest
+    csv_fields = (
+        'id',
+        'lead_id',
+        'order_key',
+        'order_status',
+        'status',
+        'attempts',
+        'last_error',
+        'shipstation_order_id',
+        'sent_date',
+        'created',
+    )
+
+    csv_titles = (
+        'Id',
+        'Lead Id',
+        'Order Key',
+        'Order Status',
+        'Status',
+        'Attempts',
+        'Last Error',
+        'ShipStation Order Id',
+        'Sent Date',
+        'Created',
+    )
+    list_display = ('id', 'lead', 'order_key', 'order_status', 'status', 'attempts', 'last_error', 'sent_date', 'created')
+    search_fields = ('order_key', 'lead__email', )
+    list_filter = ('status', )
+    list_select_related = ('lead', )
+    raw_id_fields = ('lead', )
+    readonly_fields = ('created', 'sent_date', 'shipstation_order_id', )
+    actions = (
+        'export_as_csv',
+        'retry',
+        'submit_now',
+    )
+
+    def retry(self, request, queryset):
+        queryset.exclude(status=ShipStationOrderRequest.STATUS_SENT).update(
+            status=ShipStationOrderRequest.STATUS_PENDING,
+            attempts=0,
+            next_attempt=None,
+            dispatch_id=None,
+        )
+
+    def submit_now(self, request, queryset):
+        order_requests = ShipStationClient().dispatch_orders()
+        for order_request in order_requests:
+            if order_request.status == ShipStationOrderRequest.STATUS_SENT:
+                messages.success(request, f'{order_request.order_key} order submitted')
+            else:
+                messages.error(request, f'{order_request.order_key} order was not submitted: {order_request.last_error}')
+        if not order_requests:
+            messages.info(request, 'No pending orders to submit')
+
+    retry.short_description = 'Retry submit'
+    submit_now.short_description = 'Submit all pending orders now'
@@ -0,0 +1,49 @@
+from django.contrib import admin
+
+from adsrental.models.slack_message import SlackMessage
+from adsrental.admin.base import CSVExporter
+
+
+class SlackMessageAdmin(admin.ModelAdmin, CSVExporter):
+    model = SlackMessage
+    csv_fields = (
+        'id',
+        'to',
+        'message',
+        'digest_key',
+        'status',
+        'attempts',
+        'last_error',
+        'sent_date',
+        'created',
+    )
+
+    csv_titles = (
+        'Id',
+        'To',
+        'Message',
+        'Digest Key',
+        'Status',
+        'Attempts',
+        'Last Error',
+        'Sent Date',
+        'Created',
+    )
+    list_display = ('id', 'to', 'message', 'digest_key', 'status', 'attempts', 'sent_date', 'created')
+    search_fields = ('to', 'message', )
+    list_filter = ('status', 'digest_key', )
+    readonly_fields = ('created', 'sent_date', 'thread_ts', )
+    actions = (
+        'export_as_csv',
+        'retry',
+    )
+
+    def retry(self, request, queryset):
+        queryset.exclude(status=SlackMessage.STATUS_SENT).update(
+            status=SlackMessage.STATUS_PENDING,
+            attempts=0,
+            next_attempt=None,
+            dispatch_id=None,
+        )
+
+    retry.short_description = 'Retry delivery'
@@ -51,8 +51,15 @@ class VultrInstanceAdmin(admin.ModelAdmin, CSVExporter):
 
     def refresh(self, request, queryset):
         if queryset.count() > 1:
-            VultrInstance.update_all_from_vultr()
-            messages.success(request, 'All instances updated from Vultr')
+            instance_sync_run = VultrInstance.sync_all_from_vultr()
+            if instance_sync_run.error:
+                messages.error(request, 'Vultr sync failed: {}'.format(instance_sync_run.error))
+                return
+            messages.success(request, 'All instances updated from Vultr: {} created, {} updated, {} deleted'.format(
+                instance_sync_run.instances_created,
+                instance_sync_run.instances_updated,
+                instance_sync_run.instances_deleted,
+            ))
             return
 
         for vultr_instance in queryset:
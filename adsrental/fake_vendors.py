@@ -0,0 +1,299 @@
+'''
+Lightweight local stand-ins for third-party APIs used by crons, for throughput testing.
+
+Implements only endpoints our clients call:
+
+* `/usps/ShippingAPI.dll` - USPS TrackV2 XML API, one or more *TrackID* per request
+* `/shipstation/shipments`, `/shipstation/orders`, `/shipstation/orders/createorder`, `/shipstation/orders/createorders` - ShipStation
+* `/adsdb/api/v1/accounts/get`, `/adsdb/api/v1/accounts/create-s`, `/adsdb/api/v1/accounts/update-s` - Adsdb
+* `/customerio/api/v1/customers/<id>`, `/customerio/api/v1/customers/<id>/events` - customer.io
+* `/slack/api/chat.postMessage` - Slack
+
+Each vendor has configurable latency, page size, rate limit and error rate, see *FakeVendorServer.DEFAULT_CONFIG*.
+Point clients to server with *FakeVendorServer.get_url_overrides* and *HttpClient.URL_OVERRIDES*.
+'''
+from __future__ import annotations
+
+import json
+import time
+import random
+import hashlib
+import threading
+import typing
+import urllib.parse
+import http.server
+from xml.etree import ElementTree
+
+
+class FakeVendorRequestHandler(http.server.BaseHTTPRequestHandler):
+    'Routes requests to FakeVendorServer handlers by first path segment'
+    protocol_version = 'HTTP/1.1'
+    server: FakeVendorHTTPServer
+
+    def log_message(self, format: str, *args: typing.Any) -> None:  # pylint: disable=redefined-builtin
+        if self.server.vendors.verbose:
+            super().log_message(format, *args)
+
+    def get_json_body(self) -> typing.Any:
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        if not body:
+            return {}
+        try:
+            return json.loads(body.decode())
+        except ValueError:
+            return {}
+
+    def send_body(self, status: int, body: bytes, content_type: str = 'application/json') -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if status == 429:
+            self.send_header('Retry-After', '1')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_request(self, method: str) -> None:
+        url = urllib.parse.urlsplit(self.path)
+        parts = url.path.strip('/').split('/', 1)
+        vendor = parts[0]
+        path = parts[1] if len(parts) > 1 else ''
+        params = dict(urllib.parse.parse_qsl(url.query))
+        body = self.get_json_body() if method in ['POST', 'PUT'] else {}
+        status, data = self.server.vendors.dispatch(vendor, method, path, params, body)
+        if isinstance(data, str):
+            self.send_body(status, data.encode(), 'text/xml')
+            return
+        self.send_body(status, json.dumps(data).encode())
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        self.handle_request('GET')
+
+    def do_POST(self) -> None:  # pylint: disable=invalid-name
+        self.handle_request('POST')
+
+    def do_PUT(self) -> None:  # pylint: disable=invalid-name
+        self.handle_request('PUT')
+
+
+class FakeVendorHTTPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    vendors: FakeVendorServer
+
+
+class FakeVendorServer():
+    '''
+    Threaded HTTP server with fake vendor APIs.
+
+    *config* - per vendor overrides for *DEFAULT_CONFIG*, for example `{'usps': {'latency': 0.5}}`:
+
+    * latency - seconds to wait before response, +-20% jitter
+    * error_rate - share of requests that get 500 response
+    * rate_limit - max requests per second, 429 response if exceeded. 0 means no limit
+    * page_size - items per page for paginated endpoints
+    * total - amount of generated items for list endpoints
+    '''
+    VENDORS = ['usps', 'shipstation', 'adsdb', 'customerio', 'slack']
+    DEFAULT_CONFIG = {
+        'latency': 0.05,
+        'error_rate': 0.0,
+        'rate_limit': 0,
+        'page_size': 100,
+        'total': 500,
+    }
+    REAL_URLS = {
+        'usps': 'https://secure.shippingapis.com',
+        'shipstation': 'https://ssapi.shipstation.com',
+        'adsdb': 'https://www.adsdb.io',
+        'customerio': 'https://track.customer.io',
+        'slack': 'https://www.slack.com',
+    }
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, config: typing.Optional[typing.Dict[str, typing.Dict]] = None, verbose: bool = False) -> None:
+        self.config = {}
+        for vendor in self.VENDORS:
+            self.config[vendor] = {**self.DEFAULT_CONFIG, **(config or {}).get(vendor, {})}
+        self.verbose = verbose
+        self.order_numbers: typing.List[str] = []
+        self.counters: typing.Dict[str, typing.Dict[str, int]] = {i: {'requests': 0, 'errors': 0, 'rate_limited': 0} for i in self.VENDORS}
+        self.lock = threading.Lock()
+        self.rate_windows: typing.Dict[str, typing.List[float]] = {i: [] for i in self.VENDORS}
+        self.httpd = FakeVendorHTTPServer((host, port), FakeVendorRequestHandler)
+        self.httpd.vendors = self
+        self.thread: typing.Optional[threading.Thread] = None
+
+    def get_base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def get_url_overrides(self) -> typing.Dict[str, str]:
+        'Get mapping of real vendor URLs to fake ones, compatible with *HttpClient.URL_OVERRIDES*'
+        base_url = self.get_base_url()
+        return {real_url: f'{base_url}/{vendor}' for vendor, real_url in self.REAL_URLS.items()}
+
+    def start(self) -> FakeVendorServer:
+        'Serve in a background daemon thread'
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self.httpd.serve_forever()
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def is_rate_limited(self, vendor: str) -> bool:
+        rate_limit = self.config[vendor]['rate_limit']
+        if not rate_limit:
+            return False
+
+        now = time.time()
+        with self.lock:
+            window = [i for i in self.rate_windows[vendor] if i > now - 1.0]
+            if len(window) >= rate_limit:
+                self.rate_windows[vendor] = window
+                return True
+            window.append(now)
+            self.rate_windows[vendor] = window
+        return False
+
+    def dispatch(self, vendor: str, method: str, path: str, params: typing.Dict, body: typing.Any) -> typing.Tuple[int, typing.Any]:
+        if vendor not in self.config:
+            return 404, {'error': 'Unknown vendor'}
+
+        config = self.config[vendor]
+        with self.lock:
+            self.counters[vendor]['requests'] += 1
+        if self.is_rate_limited(vendor):
+            with self.lock:
+                self.counters[vendor]['rate_limited'] += 1
+            return 429, {'error': 'Rate limit exceeded'}
+
+        if config['latency']:
+            time.sleep(config['latency'] * random.uniform(0.8, 1.2))
+
+        if config['error_rate'] and random.random() < config['error_rate']:
+            with self.lock:
+                self.counters[vendor]['errors'] += 1
+            return 500, {'error': 'Injected error'}
+
+        handler = getattr(self, f'handle_{vendor}')
+        return handler(method, path, params, body)
+
+    @staticmethod
+    def get_paginated(items: typing.List, page: int, page_size: int) -> typing.List:
+        start = (max(page, 1) - 1) * page_size
+        return items[start:start + page_size]
+
+    @staticmethod
+    def get_pages(items: typing.List, page_size: int) -> int:
+        'Amount of pages, at least one even if there are no items'
+        return max((len(items) + page_size - 1) // page_size, 1)
+
+    @staticmethod
+    def get_adsdb_updated_at(account_id: str) -> str:
+        'Stable pseudo-random update time of Adsdb account within last two days, UTC'
+        hours = int(hashlib.md5(account_id.encode()).hexdigest(), 16) % 48
+        return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(time.time() // 3600 * 3600 - hours * 3600))
+
+    @staticmethod
+    def is_delivered(tracking_code: str) -> bool:
+        'Stable pseudo-random delivered state, about 2/3 of codes are delivered'
+        return int(hashlib.md5(tracking_code.encode()).hexdigest(), 16) % 3 != 0
+
+    def handle_usps(self, method: str, path: str, params: typing.Dict, body: typing.Any) -> typing.Tuple[int, typing.Any]:
+        try:
+            request_tree = ElementTree.fromstring(params.get('xml', ''))
+        except ElementTree.ParseError:
+            return 200, '<Error><Number>-2147219040</Number><Description>Invalid XML</Description></Error>'
+
+        response = ['<TrackResponse>']
+        for track_id in request_tree.findall('TrackID'):
+            tracking_code = track_id.get('ID', '')
+            if self.is_delivered(tracking_code):
+                summary = 'Your item was delivered in or at the mailbox at 1:12 pm on June 3, 2019 in NEW YORK, NY 10001.'
+            else:
+                summary = 'Your item departed our USPS facility in NEW YORK NY DISTRIBUTION CENTER on June 2, 2019 at 9:58 pm.'
+            response.append(f'<TrackInfo ID="{tracking_code}"><TrackSummary>{summary}</TrackSummary></TrackInfo>')
+        response.append('</TrackResponse>')
+        return 200, ''.join(response)
+
+    def get_order_numbers(self) -> typing.List[str]:
+        if self.order_numbers:
+            return self.order_numbers
+        return [f'RP{i:08d}__fake{i}' for i in range(1, self.config['shipstation']['total'] + 1)]
+
+    def handle_shipstation(self, method: str, path: str, params: typing.Dict, body: typing.Any) -> typing.Tuple[int, typing.Any]:
+        page_size = self.config['shipstation']['page_size']
+        page = int(params.get('page', 1))
+        order_numbers = self.get_order_numbers()
+        if params.get('orderNumber'):
+            order_numbers = [i for i in order_numbers if i == params['orderNumber']]
+
+        if path == 'orders/createorder':
+            return 200, {'orderId': random.randint(1, 10 ** 8), 'orderNumber': body.get('orderNumber')}
+        if path == 'orders/createorders':
+            results = [{
+                'orderId': random.randint(1, 10 ** 8),
+                'orderNumber': i.get('orderNumber'),
+                'orderKey': i.get('orderKey'),
+                'success': bool(i.get('shipTo', {}).get('street1')),
+                'errorMessage': None if i.get('shipTo', {}).get('street1') else 'Ship to address is required',
+            } for i in body or []]
+            return 200, {'hasErrors': not all(i['success'] for i in results), 'results': results}
+        if path == 'shipments':
+            shipments = [{
+                'orderNumber': i,
+                'shipDate': '2019-06-01T00:00:00.0000000',
+                'trackingNumber': '9400' + hashlib.md5(i.encode()).hexdigest()[:18].upper(),
+            } for i in self.get_paginated(order_numbers, page, page_size)]
+            return 200, {'shipments': shipments, 'total': len(order_numbers), 'page': page, 'pages': self.get_pages(order_numbers, page_size)}
+        if path == 'orders':
+            orders = [{
+                'orderNumber': i,
+                'orderStatus': 'shipped',
+            } for i in self.get_paginated(order_numbers, page, page_size)]
+            return 200, {'orders': orders, 'total': len(order_numbers), 'page': page, 'pages': self.get_pages(order_numbers, page_size)}
+
+        return 404, {'error': 'Not found'}
+
+    def handle_adsdb(self, method: str, path: str, params: typing.Dict, body: typing.Any) -> typing.Tuple[int, typing.Any]:
+        if path == 'api/v1/accounts/get':
+            limit = int(body.get('limit', self.config['adsdb']['page_size']))
+            page = int(body.get('page', 1))
+            ids = [i for i in str(body.get('ids', '')).split(',') if i]
+            if not ids:
+                ids = [str(i) for i in range(1, self.config['adsdb']['total'] + 1)]
+            updated_since = None
+            for rule in (body.get('filters') or {}).get('rules', []):
+                if rule.get('field') == 'accounts.updated_at' and rule.get('op') == 'ge':
+                    updated_since = rule['data']
+            if updated_since:
+                ids = [i for i in ids if self.get_adsdb_updated_at(i) >= updated_since]
+            accounts = [{
+                'id': int(i) if i.isdigit() else i,
+                'account_status': 'Dead' if int(hashlib.md5(i.encode()).hexdigest(), 16) % 10 == 0 else 'Active',
+                'ban_message': 'Facebook Policy',
+                'updated_at': self.get_adsdb_updated_at(i),
+            } for i in self.get_paginated(ids, page, limit)]
+            return 200, {'data': accounts, 'count': len(ids)}
+        if path == 'api/v1/accounts/create-s':
+            return 200, {'account_data': [{'id': random.randint(1, 10 ** 6)} for _ in body or [{}]]}
+        if path == 'api/v1/accounts/update-s':
+            return 200, {'result': True}
+
+        return 404, {'error': 'Not found'}
+
+    def handle_customerio(self, method: str, path: str, params: typing.Dict, body: typing.Any) -> typing.Tuple[int, typing.Any]:
+        if path.startswith('api/v1/customers/'):
+            return 200, {}
+
+        return 404, {'error': 'Not found'}
+
+    def handle_slack(self, method: str, path: str, params: typing.Dict, body: typing.Any) -> typing.Tuple[int, typing.Any]:
+        if path == 'api/chat.postMessage':
+            return 200, {'ok': True, 'channel': 'D00000000', 'ts': str(time.time())}
+
+        return 404, {'ok': False, 'error': 'unknown_method'}
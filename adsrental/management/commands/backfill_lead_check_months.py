@@ -0,0 +1,44 @@
+import argparse
+
+from dateutil import parser as date_parser
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from adsrental.models.lead_history import LeadHistory
+from adsrental.models.lead_check_month import LeadCheckMonth
+
+
+class Command(BaseCommand):
+    '''
+    Pack finalized :model:`adsrental.LeadHistory` days into :model:`adsrental.LeadCheckMonth`.
+
+    Safe to run several times, already packed days are overwritten with the same values.
+    '''
+    help = 'Pack finalized daily lead stats into monthly rows'
+
+    def add_arguments(self, parser: argparse.ArgumentParser) -> None:
+        parser.add_argument('--date', default=None, help='Any date in month to pack, YYYY-MM-DD. Default is all months')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Daily entries packed per transaction')
+
+    def handle(self, *args, **options):
+        lead_histories = LeadHistory.objects.filter(finalized=True)
+        if options['date']:
+            date = date_parser.parse(options['date']).date()
+            lead_histories = LeadHistory.get_queryset_for_month(date.year, date.month).filter(finalized=True)
+
+        batch_size = options['batch_size']
+        last_id = 0
+        total_days = 0
+        total_rows = 0
+        while True:
+            batch = list(lead_histories.filter(id__gt=last_id).order_by('id').only('id', 'lead_id', 'date', *LeadHistory.CHECK_FIELDS)[:batch_size])
+            if not batch:
+                break
+
+            with transaction.atomic():
+                total_rows += LeadCheckMonth.store_lead_histories(batch)
+            last_id = batch[-1].id
+            total_days += len(batch)
+            self.stdout.write(f'Packed {total_days} days')
+
+        self.stdout.write(self.style.SUCCESS(f'Packed {total_days} days into {total_rows} row updates'))
@@ -0,0 +1,153 @@
+import argparse
+import datetime
+import hashlib
+import time
+import typing
+from multiprocessing import Pool
+
+import pytz
+from dateutil import parser as date_parser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction, connection
+from django_bulk_update.helper import bulk_update
+
+from adsrental.models.lead import Lead
+from adsrental.models.lead_history import LeadHistory
+from adsrental.models.lead_check_month import LeadCheckMonth
+from adsrental.models.lead_history_month import LeadHistoryMonth
+from adsrental.models.sync_watermark import SyncWatermark
+
+
+def scan_log_task(task: typing.Tuple[str, str]) -> typing.Tuple[str, int, bool, int]:
+    'Scan one log in worker process'
+    lead_id, log_path = task
+    pings_online, wrong_password, size = LeadHistory.scan_log(log_path)
+    return lead_id, pings_online, wrong_password, size
+
+
+class Command(BaseCommand):
+    '''
+    Calculate :model:`adsrental.LeadHistory` from RaspberryPi logs for a date range, same as *lead_history* cron with *date*.
+
+    Logs of every date are scanned once by a process pool, results are written with one bulk query per date.
+    Every finished date is saved as checkpoint, so *--resume* continues after the last finished date.
+    Checkpoint is kept separately for every date range, *--rpid* and *--force*, so other runs do not skip dates.
+    Created days are added to month totals by hourly *lead_history* cron.
+    Replaced finalized days with *--force* are already in month totals, so totals of their leads
+    are recalculated when every month is finished. Checkpoint waits for this recalculation, so resumed run
+    replaces these days again instead of leaving totals stale.
+    '''
+    help = 'Backfill LeadHistory from RaspberryPi logs for a date range'
+
+    WATERMARK_NAME = 'lead_history_backfill'
+
+    def add_arguments(self, parser: argparse.ArgumentParser) -> None:
+        parser.add_argument('--start', required=True, help='First date, YYYY-MM-DD')
+        parser.add_argument('--end', default=None, help='Last date, YYYY-MM-DD. Default is start date')
+        parser.add_argument('--rpid', default=None, help='Process only one device')
+        parser.add_argument('--processes', type=int, default=4, help='Log scanning processes')
+        parser.add_argument('--force', action='store_true', help='Replace existing entries')
+        parser.add_argument('--resume', action='store_true', help='Start after the last date finished by previous run')
+
+    def get_watermark_name(self, start_date: datetime.date, end_date: datetime.date, rpid: typing.Optional[str], force: bool) -> str:
+        'Get checkpoint name for date range and options, hashed to fit *SyncWatermark.name*'
+        key = f'{start_date}:{end_date}:{rpid or ""}:{force}'
+        return f'{self.WATERMARK_NAME}_{hashlib.md5(key.encode()).hexdigest()[:16]}'
+
+    def get_start_date(self, start_date: datetime.date, watermark_name: str, resume: bool) -> datetime.date:
+        if not resume:
+            return start_date
+
+        checkpoint = SyncWatermark.get_value(watermark_name)
+        if checkpoint and checkpoint.date() >= start_date:
+            self.stdout.write(f'Resuming after {checkpoint.date()}')
+            return checkpoint.date() + datetime.timedelta(days=1)
+        return start_date
+
+    def aggregate_months(self, months_lead_ids: typing.Dict[datetime.date, typing.Set[str]]) -> None:
+        'Recalculate month totals for leads with replaced finalized days'
+        for date_month, lead_ids in sorted(months_lead_ids.items()):
+            LeadHistoryMonth.aggregate_month(Lead.objects.filter(leadid__in=lead_ids), date_month)
+            self.stdout.write(f'{date_month:%Y-%m}: {len(lead_ids)} month totals recalculated')
+        months_lead_ids.clear()
+
+    def backfill_date(self, pool: Pool, leads: typing.List[typing.Tuple[str, str]], date: datetime.date, force: bool) -> typing.Tuple[int, int, int, typing.List[LeadHistory]]:
+        '''
+        Scan logs for *date* and save results.
+        Returns amounts of scanned files, bytes and saved entries, and replaced finalized entries.
+        '''
+        existing_map = {i.lead_id: i for i in LeadHistory.objects.filter(date=date, lead_id__in=[i[0] for i in leads])}
+        tasks = [
+            (lead_id, LeadHistory.get_log_path(rpid, date))
+            for lead_id, rpid in leads
+            if force or lead_id not in existing_map
+        ]
+
+        new_lead_histories = []
+        changed_lead_histories = []
+        files = 0
+        size = 0
+        for lead_id, pings_online, wrong_password, log_size in pool.imap_unordered(scan_log_task, tasks, chunksize=16):
+            if log_size:
+                files += 1
+                size += log_size
+            checks = dict.fromkeys(LeadHistory.CHECK_FIELDS, 0)
+            checks.update(LeadHistory.get_checks_from_log(pings_online, wrong_password))
+            lead_history = existing_map.get(lead_id)
+            if not lead_history:
+                new_lead_histories.append(LeadHistory(lead_id=lead_id, date=date, **checks))
+                continue
+            for field_name, value in checks.items():
+                setattr(lead_history, field_name, value)
+            changed_lead_histories.append(lead_history)
+
+        finalized_lead_histories = [i for i in changed_lead_histories if i.finalized]
+        with transaction.atomic():
+            LeadHistory.objects.bulk_create(new_lead_histories, batch_size=1000)
+            bulk_update(changed_lead_histories, update_fields=LeadHistory.CHECK_FIELDS, batch_size=1000)
+            LeadCheckMonth.store_lead_histories(finalized_lead_histories)
+
+        return files, size, len(new_lead_histories) + len(changed_lead_histories), finalized_lead_histories
+
+    def handle(self, *args, **options):
+        start_date = date_parser.parse(options['start']).date()
+        end_date = date_parser.parse(options['end']).date() if options['end'] else start_date
+        if end_date < start_date:
+            raise CommandError('End date is before start date')
+        watermark_name = self.get_watermark_name(start_date, end_date, options['rpid'], options['force'])
+        start_date = self.get_start_date(start_date, watermark_name, options['resume'])
+
+        leads_queryset = Lead.objects.filter(status__in=Lead.STATUSES_ACTIVE, raspberry_pi__isnull=False)
+        if options['rpid']:
+            leads_queryset = leads_queryset.filter(raspberry_pi__rpid=options['rpid'])
+        leads = list(leads_queryset.values_list('leadid', 'raspberry_pi__rpid'))
+
+        # Forked workers must not share parent DB connection
+        connection.close()
+        total_files = 0
+        total_size = 0
+        total_saved = 0
+        months_lead_ids: typing.Dict[datetime.date, typing.Set[str]] = {}
+        start = time.time()
+        with Pool(processes=max(1, options['processes'])) as pool:
+            date = start_date
+            while date <= end_date:
+                files, size, saved, finalized_lead_histories = self.backfill_date(pool, leads, date, options['force'])
+                if finalized_lead_histories:
+                    months_lead_ids.setdefault(date.replace(day=1), set()).update(i.lead_id for i in finalized_lead_histories)
+                total_files += files
+                total_size += size
+                total_saved += saved
+                elapsed = max(time.time() - start, 0.001)
+                self.stdout.write(f'{date}: {files} logs, {saved} entries saved, {total_files / elapsed:.1f} files/sec, {total_size / elapsed / 1024 / 1024:.2f} MB/sec')
+                date += datetime.timedelta(days=1)
+                if date.day == 1 or date > end_date:
+                    self.aggregate_months(months_lead_ids)
+                if not months_lead_ids:
+                    SyncWatermark.set_value(watermark_name, datetime.datetime.combine(date - datetime.timedelta(days=1), datetime.time.min, tzinfo=pytz.utc))
+
+        elapsed = max(time.time() - start, 0.001)
+        self.stdout.write(self.style.SUCCESS(
+            f'Done: {total_files} logs, {total_size / 1024 / 1024:.2f} MB, {total_saved} entries in {elapsed:.1f}s, '
+            f'{total_files / elapsed:.1f} files/sec, {total_size / elapsed / 1024 / 1024:.2f} MB/sec'
+        ))
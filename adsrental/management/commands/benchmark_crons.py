@@ -0,0 +1,123 @@
+import argparse
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory, override_settings
+from django.db import transaction
+from django.conf import settings
+
+from adsrental.fake_vendors import FakeVendorServer
+from adsrental.models.lead import Lead
+from adsrental.utils import HttpClient
+from adsrental.views.cron.sync_delivered import SyncDeliveredView
+from adsrental.views.cron.sync_from_shipstation import SyncFromShipStationView
+from adsrental.views.cron.sync_adsdb import SyncAdsDBView
+from adsrental.views.cron.sync_offline import SyncOfflineView
+from adsrental.views.cron.slack_daily_account_status import DailyAccountStatusView
+from adsrental.views.cron.customerio_dispatch import CustomerIODispatchView
+from adsrental.views.cron.slack_dispatch import SlackDispatchView
+from adsrental.views.cron.shipstation_dispatch import ShipStationDispatchView
+from adsrental.views.cron.adsdb_dispatch import AdsdbDispatchView
+
+
+class Command(BaseCommand):
+    '''
+    Measure end-to-end cron throughput against local fake vendor servers.
+
+    Every cron runs in a transaction that is rolled back, so DB stays unchanged.
+    '''
+    help = 'Benchmark integration-heavy crons against local fake vendor servers'
+
+    CRONS = {
+        'sync_delivered': (SyncDeliveredView, {'all': 'true'}),
+        'sync_from_shipstation': (SyncFromShipStationView, {'days_ago': '30'}),
+        'sync_adsdb': (SyncAdsDBView, {'execute': 'true'}),
+        'sync_offline': (SyncOfflineView, {}),
+        'slack_daily_account_status': (DailyAccountStatusView, {}),
+        'customerio_dispatch': (CustomerIODispatchView, {}),
+        'slack_dispatch': (SlackDispatchView, {}),
+        'shipstation_dispatch': (ShipStationDispatchView, {}),
+        'adsdb_dispatch': (AdsdbDispatchView, {}),
+    }
+
+    def add_arguments(self, parser: argparse.ArgumentParser) -> None:
+        parser.add_argument('crons', nargs='*', default=list(self.CRONS.keys()), help=f'Crons to run: {", ".join(self.CRONS.keys())}')
+        parser.add_argument('--latency', type=float, default=FakeVendorServer.DEFAULT_CONFIG['latency'], help='Response latency in seconds')
+        parser.add_argument('--error-rate', type=float, default=FakeVendorServer.DEFAULT_CONFIG['error_rate'], help='Share of requests with 500 response')
+        parser.add_argument('--rate-limit', type=int, default=FakeVendorServer.DEFAULT_CONFIG['rate_limit'], help='Max requests per second per vendor')
+        parser.add_argument('--page-size', type=int, default=FakeVendorServer.DEFAULT_CONFIG['page_size'])
+        parser.add_argument('--total', type=int, default=FakeVendorServer.DEFAULT_CONFIG['total'], help='Items in generated lists')
+        parser.add_argument('--repeat', type=int, default=1)
+
+    @staticmethod
+    def count_items(data: dict) -> int:
+        'Count processed items in cron JSON response'
+        return sum(len(i) for i in data.values() if isinstance(i, (list, dict)))
+
+    def run_cron(self, name: str, server: FakeVendorServer) -> dict:
+        view_class, params = self.CRONS[name]
+        request = RequestFactory().get(f'/cron/{name}/', params, HTTP_SECRET=getattr(settings, 'CRON_SECRET', ''))
+        request.user = AnonymousUser()
+        requests_before = {k: v['requests'] for k, v in server.counters.items()}
+
+        error = None
+        response = None
+        start = time.time()
+        with transaction.atomic():
+            try:
+                response = view_class.as_view()(request)
+            except Exception as e:  # pylint: disable=broad-except
+                error = f'{type(e).__name__}: {e}'
+            transaction.set_rollback(True)
+        elapsed = time.time() - start
+
+        vendor_requests = {k: v['requests'] - requests_before[k] for k, v in server.counters.items() if v['requests'] != requests_before[k]}
+        total_requests = sum(vendor_requests.values())
+        items = 0
+        if response is not None and response.get('Content-Type', '').startswith('application/json'):
+            items = self.count_items(json.loads(response.content.decode()))
+        return dict(
+            cron=name,
+            status=response.status_code if response is not None else None,
+            seconds=round(elapsed, 2),
+            items=items,
+            items_per_second=round(items / elapsed, 2) if elapsed else None,
+            vendor_requests=vendor_requests,
+            requests_per_second=round(total_requests / elapsed, 2) if elapsed else None,
+            error=error,
+        )
+
+    def handle(self, *args: str, **options: str) -> None:
+        for name in options['crons']:
+            if name not in self.CRONS:
+                raise CommandError(f'Unknown cron {name}')
+
+        config = dict(
+            latency=options['latency'],
+            error_rate=options['error_rate'],
+            rate_limit=options['rate_limit'],
+            page_size=options['page_size'],
+            total=options['total'],
+        )
+        server = FakeVendorServer(config={vendor: config for vendor in FakeVendorServer.VENDORS}).start()
+        server.order_numbers = list(Lead.objects.filter(shipstation_order_number__isnull=False).values_list('shipstation_order_number', flat=True))
+        HttpClient.URL_OVERRIDES = server.get_url_overrides()
+        self.stdout.write(f'Fake vendors are running on {server.get_base_url()} with {config}')
+
+        try:
+            with override_settings(
+                    CUSTOMERIO_ENABLED=True,
+                    CUSTOMERIO_SITE_ID='fake',
+                    CUSTOMERIO_API_KEY='fake',
+                    SHIPSTATION_API_KEY='fake',
+                    SHIPSTATION_API_SECRET='fake',
+                    SLACK_TOKEN='fake',
+            ):
+                for name in options['crons']:
+                    for _ in range(options['repeat']):
+                        self.stdout.write(json.dumps(self.run_cron(name, server)))
+        finally:
+            HttpClient.URL_OVERRIDES = {}
+            server.stop()
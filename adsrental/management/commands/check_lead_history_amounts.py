@@ -0,0 +1,52 @@
+import argparse
+import time
+import datetime
+
+from dateutil import parser as date_parser
+from django.core.management.base import BaseCommand, CommandError
+
+from adsrental.models.lead_history import LeadHistory
+
+
+class Command(BaseCommand):
+    '''
+    Compare *LeadHistory.calculate_amounts* with *LeadHistory.get_amount_with_note* called for every entry.
+
+    Nothing is saved, use it to verify batch payment calculation on real data.
+    '''
+    help = 'Check that batch LeadHistory payment calculation matches per-entry calculation'
+
+    def add_arguments(self, parser: argparse.ArgumentParser) -> None:
+        parser.add_argument('--date', default=None, help='Any date in month to check, YYYY-MM-DD. Default is current month')
+        parser.add_argument('--lead-id', action='append', dest='lead_ids', default=None, help='Check only given leads, can be repeated')
+        parser.add_argument('--limit', type=int, default=None, help='Max entries to check')
+
+    def handle(self, *args, **options):
+        date = date_parser.parse(options['date']).date() if options['date'] else datetime.date.today()
+        lead_histories = LeadHistory.get_queryset_for_month(date.year, date.month, lead_ids=options['lead_ids']).order_by('lead_id', 'date')
+        if options['limit']:
+            lead_histories = lead_histories[:options['limit']]
+
+        start = time.time()
+        expected = {}
+        for lead_history in lead_histories.select_related('lead'):
+            expected[lead_history.id] = lead_history.get_amount_with_note()
+        single_time = time.time() - start
+
+        start = time.time()
+        batch_lead_histories = LeadHistory.calculate_amounts(lead_histories)
+        batch_time = time.time() - start
+
+        mismatches = 0
+        for lead_history in batch_lead_histories:
+            amount, note = expected[lead_history.id]
+            if (amount, note) == (lead_history.amount, lead_history.note):
+                continue
+            mismatches += 1
+            self.stdout.write(self.style.ERROR(f'{lead_history.lead_id} {lead_history.date}: ${amount} != ${lead_history.amount}'))
+            self.stdout.write(f'  expected: {note!r}\n  got: {lead_history.note!r}')
+
+        self.stdout.write(f'Per entry: {single_time:.2f}s, batch: {batch_time:.2f}s')
+        if mismatches:
+            raise CommandError(f'{mismatches} of {len(batch_lead_histories)} entries do not match')
+        self.stdout.write(self.style.SUCCESS(f'Checked {len(batch_lead_histories)} entries, all match'))
@@ -0,0 +1,48 @@
+import argparse
+import time
+import decimal
+
+from django.core.management.base import BaseCommand
+
+from adsrental.models.lead_account import LeadAccount
+
+
+class Command(BaseCommand):
+    '''
+    Create missing :model:`adsrental.BundlerPayment` entries with *LeadAccount.bulk_generate_payments*.
+
+    Use *--dry-run* to print payments that would be created without saving them.
+    '''
+    help = 'Generate missing bundler payments for lead accounts in bulk'
+
+    def add_arguments(self, parser: argparse.ArgumentParser) -> None:
+        parser.add_argument('--status', action='append', dest='statuses', default=None, help='Lead account status, can be repeated. Default is In-Progress and Banned')
+        parser.add_argument('--bundler-id', action='append', dest='bundler_ids', type=int, default=None, help='Process only given bundlers, can be repeated')
+        parser.add_argument('--lead-account-id', action='append', dest='lead_account_ids', type=int, default=None, help='Process only given lead accounts, can be repeated')
+        parser.add_argument('--batch-size', type=int, default=500, help='Lead accounts per bulk insert')
+        parser.add_argument('--dry-run', action='store_true', help='Print payments that would be created, do not save anything')
+
+    def handle(self, *args, **options):
+        lead_accounts = LeadAccount.objects.filter(
+            status__in=options['statuses'] or [LeadAccount.STATUS_IN_PROGRESS, LeadAccount.STATUS_BANNED],
+            lead__bundler__isnull=False,
+        ).order_by('id')
+        if options['bundler_ids']:
+            lead_accounts = lead_accounts.filter(lead__bundler_id__in=options['bundler_ids'])
+        if options['lead_account_ids']:
+            lead_accounts = lead_accounts.filter(id__in=options['lead_account_ids'])
+
+        start = time.time()
+        bundler_payments = lead_accounts.generate_payments(dry_run=options['dry_run'], batch_size=options['batch_size'])
+        duration = time.time() - start
+
+        totals = {}
+        for bundler_payment in bundler_payments:
+            totals[bundler_payment.payment_type] = totals.get(bundler_payment.payment_type, decimal.Decimal('0.00')) + bundler_payment.payment
+            if options['dry_run']:
+                self.stdout.write(f'+ bundler {bundler_payment.bundler_id} {bundler_payment.lead_account} {bundler_payment.payment_type}: ${bundler_payment.payment}')
+
+        for payment_type, total in sorted(totals.items()):
+            self.stdout.write(f'{payment_type}: ${total}')
+        action = 'Would create' if options['dry_run'] else 'Created'
+        self.stdout.write(self.style.SUCCESS(f'{action} {len(bundler_payments)} payments in {duration:.2f}s'))
@@ -0,0 +1,40 @@
+import argparse
+
+from django.core.management.base import BaseCommand, CommandError
+
+from adsrental.models.bundler_payment_total import BundlerPaymentTotal
+
+
+class Command(BaseCommand):
+    '''
+    Compare :model:`adsrental.BundlerPaymentTotal` ledger with totals calculated from :model:`adsrental.BundlerPayment`
+    and replace it if it drifted, for example after payments were changed with raw queryset updates.
+    '''
+    help = 'Check and rebuild bundler payments ledger'
+
+    def add_arguments(self, parser: argparse.ArgumentParser) -> None:
+        parser.add_argument('--check', action='store_true', help='Only report mismatches, do not rebuild')
+
+    def handle(self, *args, **options):
+        expected = {k: tuple(v) for k, v in BundlerPaymentTotal.get_expected_totals().items() if any(v)}
+        stored = {}
+        for row in BundlerPaymentTotal.objects.values_list('bundler_id', 'date', 'payment_type', 'paid_sum', 'not_paid_sum', 'payments_count'):
+            if any(row[3:]):
+                stored[row[:3]] = row[3:]
+
+        mismatches = 0
+        for key in sorted(set(expected) | set(stored), key=str):
+            if expected.get(key) == stored.get(key):
+                continue
+            mismatches += 1
+            bundler_id, date, payment_type = key
+            self.stdout.write(self.style.ERROR(f'Bundler {bundler_id} {date:%Y-%m} {payment_type}: {stored.get(key)} != {expected.get(key)}'))
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS(f'Checked {len(expected)} totals, all match'))
+            return
+        if options['check']:
+            raise CommandError(f'{mismatches} totals do not match')
+
+        BundlerPaymentTotal.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt ledger, {mismatches} totals fixed'))
@@ -0,0 +1,42 @@
+import argparse
+import json
+
+from django.core.management.base import BaseCommand
+
+from adsrental.fake_vendors import FakeVendorServer
+
+
+class Command(BaseCommand):
+    help = 'Run local fake USPS, ShipStation, Adsdb, customer.io and Slack servers for throughput testing'
+
+    def add_arguments(self, parser: argparse.ArgumentParser) -> None:
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=FakeVendorServer.DEFAULT_CONFIG['latency'], help='Response latency in seconds')
+        parser.add_argument('--error-rate', type=float, default=FakeVendorServer.DEFAULT_CONFIG['error_rate'], help='Share of requests with 500 response')
+        parser.add_argument('--rate-limit', type=int, default=FakeVendorServer.DEFAULT_CONFIG['rate_limit'], help='Max requests per second per vendor')
+        parser.add_argument('--page-size', type=int, default=FakeVendorServer.DEFAULT_CONFIG['page_size'])
+        parser.add_argument('--total', type=int, default=FakeVendorServer.DEFAULT_CONFIG['total'], help='Items in generated lists')
+        parser.add_argument('--config', type=json.loads, default={}, help='Per vendor JSON config, e.g. \'{"usps": {"latency": 1}}\'')
+        parser.add_argument('--verbose', action='store_true')
+
+    def handle(self, *args: str, **options: str) -> None:
+        default_config = dict(
+            latency=options['latency'],
+            error_rate=options['error_rate'],
+            rate_limit=options['rate_limit'],
+            page_size=options['page_size'],
+            total=options['total'],
+        )
+        config = {}
+        for vendor in FakeVendorServer.VENDORS:
+            config[vendor] = {**default_config, **options['config'].get(vendor, {})}
+
+        server = FakeVendorServer(host=options['host'], port=options['port'], config=config, verbose=options['verbose'])
+        self.stdout.write(f'Serving fake vendors on {server.get_base_url()}')
+        self.stdout.write('Add to settings to use them:')
+        self.stdout.write(f'HTTP_CLIENT_URL_OVERRIDES = {json.dumps(server.get_url_overrides(), indent=4)}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.stop()
@@ -72,12 +72,12 @@ class Command(BaseCommand):
         pool = ThreadPool(processes=threads)
         results = pool.map(self.runner, raspberry_pis_limited)
         self.logger.info(f'Upserting results...')
+        dead_raspberry_pis = []
         for raspberry_pi, proxy_delay, check_date in results:
             raspberry_pi.proxy_delay = proxy_delay
             raspberry_pi.proxy_delay_datetime = check_date
             if fix_dead and proxy_delay > 800.0:
-                raspberry_pi.reassign_proxy()
-                self.logger.info(f'{raspberry_pi} switched to {raspberry_pi.get_proxy_hostname_display()}')
+                dead_raspberry_pis.append(raspberry_pi)
 
             if restart_dead and proxy_delay > 800.0 and not raspberry_pi.restart_required:
                 raspberry_pi.reset_cache()
@@ -85,4 +85,8 @@ class Command(BaseCommand):
                 raspberry_pi.save()
                 self.logger.info(f'{raspberry_pi} will restart shortly')
             raspberry_pi.save()
+
+        if dead_raspberry_pis:
+            for reassignment in RaspberryPi.bulk_reassign_proxy(dead_raspberry_pis):
+                self.logger.info(f'{reassignment.raspberry_pi} switched to {reassignment.raspberry_pi.get_proxy_hostname_display()}')
         self.logger.info(f'Done')
@@ -0,0 +1,49 @@
+# Generated by Django 2.2.4 on 2026-10-19 10:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adsrental', '0255_lead_has_active_accounts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProxyReassignment',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('old_proxy_hostname', models.CharField(blank=True, db_index=True, help_text='Proxykeeper tunnel was moved from', max_length=50, null=True)),
+                ('new_proxy_hostname', models.CharField(db_index=True, help_text='Proxykeeper tunnel was moved to', max_length=50)),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('raspberry_pi', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='adsrental.RaspberryPi')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProxykeeperStat',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('proxy_hostname', models.CharField(choices=[('178.128.1.68', 'Proxykeeper'), ('138.197.219.240', 'Proxykeeper2'), ('138.197.197.65', 'Proxykeeper3'), ('157.230.146.152', 'Proxykeeper4'), ('157.230.155.97', 'Proxykeeper5'), ('134.209.52.3', 'Proxykeeper6'), ('68.183.163.172', 'Proxykeeper7')], max_length=50, unique=True)),
+                ('tunnels_total', models.IntegerField(default=0, help_text='Proxy tunnel devices assigned to this host')),
+                ('tunnels_active', models.IntegerField(default=0, help_text='Devices with active lead')),
+                ('tunnels_online', models.IntegerField(default=0)),
+                ('tunnels_offline', models.IntegerField(default=0)),
+                ('tunnels_dead', models.IntegerField(default=0, help_text='Devices with unreachable tunnel on last check')),
+                ('delay_p50', models.FloatField(blank=True, help_text='Median proxy delay of reachable tunnels', null=True)),
+                ('delay_p90', models.FloatField(blank=True, null=True)),
+                ('delay_p99', models.FloatField(blank=True, null=True)),
+                ('ports_used', models.IntegerField(default=0, help_text='Tunnel port pairs allocated on this host')),
+                ('port_utilization', models.FloatField(default=0.0, help_text='Percent of tunnel port pairs used')),
+                ('reassigned_from_last_24_hours', models.IntegerField(default=0)),
+                ('reassigned_from_last_7_days', models.IntegerField(default=0)),
+                ('reassigned_from_last_30_days', models.IntegerField(default=0)),
+                ('reassigned_to_last_24_hours', models.IntegerField(default=0)),
+                ('reassigned_to_last_7_days', models.IntegerField(default=0)),
+                ('reassigned_to_last_30_days', models.IntegerField(default=0)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
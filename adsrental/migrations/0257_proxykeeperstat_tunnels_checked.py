@@ -0,0 +1,18 @@
+# Generated by Django 2.2.4 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adsrental', '0256_proxykeeperstat_proxyreassignment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proxykeeperstat',
+            name='tunnels_checked',
+            field=models.IntegerField(default=0, help_text='Devices with tunnel checked since last reassignment'),
+        ),
+    ]
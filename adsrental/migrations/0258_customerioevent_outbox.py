@@ -0,0 +1,59 @@
+# Generated by Django 2.2.4 on 2026-10-19 14:00
+
+from django.db import migrations, models
+
+
+def set_existing_statuses(apps, schema_editor):
+    CustomerIOEvent = apps.get_model('adsrental', 'CustomerIOEvent')
+    CustomerIOEvent.objects.filter(sent=False).update(status='Skipped')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adsrental', '0257_proxykeeperstat_tunnels_checked'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customerioevent',
+            name='status',
+            field=models.CharField(choices=[('Pending', 'Pending'), ('Sending', 'Sending'), ('Sent', 'Sent'), ('Failed', 'Failed'), ('Skipped', 'Skipped')], db_index=True, default='Sent', help_text='Delivery status. Skipped if lead or customer.io is disabled.', max_length=10),
+        ),
+        migrations.RunPython(set_existing_statuses, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='customerioevent',
+            name='status',
+            field=models.CharField(choices=[('Pending', 'Pending'), ('Sending', 'Sending'), ('Sent', 'Sent'), ('Failed', 'Failed'), ('Skipped', 'Skipped')], db_index=True, default='Pending', help_text='Delivery status. Skipped if lead or customer.io is disabled.', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='customerioevent',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0, help_text='Delivery attempts made'),
+        ),
+        migrations.AddField(
+            model_name='customerioevent',
+            name='next_attempt',
+            field=models.DateTimeField(blank=True, db_index=True, help_text='Do not deliver before this date', null=True),
+        ),
+        migrations.AddField(
+            model_name='customerioevent',
+            name='last_error',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customerioevent',
+            name='idempotency_key',
+            field=models.CharField(blank=True, help_text='Sent to customer.io as event id to avoid duplicates', max_length=26, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='customerioevent',
+            name='dispatch_id',
+            field=models.CharField(blank=True, db_index=True, help_text='Set by dispatcher that claimed this event', max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='customerioevent',
+            name='sent_date',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
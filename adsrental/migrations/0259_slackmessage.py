@@ -0,0 +1,31 @@
+# Generated by Django 2.2.4 on 2026-10-19 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adsrental', '0258_customerioevent_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlackMessage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('to', models.CharField(db_index=True, help_text='Slack user tag or channel', max_length=255)),
+                ('message', models.TextField()),
+                ('digest_key', models.CharField(blank=True, db_index=True, help_text='Similar messages have the same key and can be digested', max_length=255, null=True)),
+                ('digest_title', models.CharField(blank=True, help_text='Summary text for digest', max_length=255, null=True)),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Sending', 'Sending'), ('Sent', 'Sent'), ('Failed', 'Failed')], db_index=True, default='Pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt', models.DateTimeField(blank=True, db_index=True, help_text='Do not deliver before this date', null=True)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('dispatch_id', models.CharField(blank=True, db_index=True, help_text='Set by dispatcher that claimed this message', max_length=32, null=True)),
+                ('thread_ts', models.CharField(blank=True, help_text='Slack timestamp of digest message if this message was digested', max_length=32, null=True)),
+                ('sent_date', models.DateTimeField(blank=True, null=True)),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 2.2.4 on 2026-10-19 16:00
+
+import re
+import zlib
+import hashlib
+from xml.etree import ElementTree
+
+from dateutil import parser
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def parse_xml(tracking_info_xml):
+    try:
+        tree = ElementTree.fromstring(tracking_info_xml)
+    except ElementTree.ParseError:
+        return 'Unknown', None, None
+
+    track_info = tree.find('TrackInfo')
+    track_summary = track_info.find('TrackSummary') if track_info is not None else None
+    if track_summary is None or not track_summary.text:
+        return 'Unknown', None, None
+
+    last_event = track_summary.text
+    summary = last_event.lower()
+    if 'was delivered' in summary:
+        delivery_date = None
+        dates = re.findall(r'\S+ \d{1,2}, \d{4}', last_event)
+        if dates:
+            try:
+                delivery_date = parser.parse(dates[0]).date()
+            except ValueError:
+                pass
+        return 'Delivered', last_event, delivery_date
+    if 'return to sender' in summary or 'returned to sender' in summary:
+        return 'Returned', last_event, None
+    return 'In Transit', last_event, None
+
+
+def move_tracking_info(apps, schema_editor):
+    Lead = apps.get_model('adsrental', 'Lead')
+    ShipmentTracking = apps.get_model('adsrental', 'ShipmentTracking')
+    shipment_trackings = []
+    for lead_id, tracking_code, tracking_info in Lead.objects.filter(
+            tracking_info__isnull=False,
+            usps_tracking_code__isnull=False,
+    ).values_list('leadid', 'usps_tracking_code', 'tracking_info').iterator():
+        status, last_event, delivery_date = parse_xml(tracking_info)
+        shipment_trackings.append(ShipmentTracking(
+            lead_id=lead_id,
+            tracking_code=tracking_code,
+            status=status,
+            last_event=last_event,
+            delivery_date=delivery_date,
+            raw_data=zlib.compress(tracking_info.encode()),
+            payload_hash=hashlib.md5(tracking_info.encode()).hexdigest(),
+        ))
+        if len(shipment_trackings) >= 1000:
+            ShipmentTracking.objects.bulk_create(shipment_trackings)
+            shipment_trackings = []
+    ShipmentTracking.objects.bulk_create(shipment_trackings)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adsrental', '0259_slackmessage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShipmentTracking',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tracking_code', models.CharField(db_index=True, help_text='USPS tracking code this data belongs to', max_length=255)),
+                ('status', models.CharField(choices=[('Unknown', 'Unknown'), ('In Transit', 'In Transit'), ('Delivered', 'Delivered'), ('Returned', 'Returned')], db_index=True, default='Unknown', max_length=20)),
+                ('last_event', models.TextField(blank=True, help_text='Latest tracking summary', null=True)),
+                ('delivery_date', models.DateField(blank=True, null=True)),
+                ('raw_data', models.BinaryField(blank=True, help_text='Compressed raw response from secure.shippingapis.com', null=True)),
+                ('payload_hash', models.CharField(blank=True, help_text='MD5 of raw response, used to skip unchanged updates', max_length=32, null=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('lead', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='shipment_tracking', to='adsrental.Lead')),
+            ],
+        ),
+        migrations.RunPython(move_tracking_info, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='lead',
+            name='tracking_info',
+        ),
+    ]
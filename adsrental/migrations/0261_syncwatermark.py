@@ -0,0 +1,22 @@
+# Generated by Django 2.2.4 on 2026-10-19 17:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adsrental', '0260_shipmenttracking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncWatermark',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.DateTimeField(help_text='Next sync requests changes made after this date')),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
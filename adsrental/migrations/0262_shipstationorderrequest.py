@@ -0,0 +1,31 @@
+# Generated by Django 2.2.4 on 2026-10-19 18:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adsrental', '0261_syncwatermark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShipStationOrderRequest',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_key', models.CharField(db_index=True, help_text='Lead shipstation_order_number at the moment of request, used as idempotent order key', max_length=255)),
+                ('order_status', models.CharField(default='awaiting_shipment', help_text='Order status set on ShipStation', max_length=50)),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Sending', 'Sending'), ('Sent', 'Sent'), ('Failed', 'Failed')], db_index=True, default='Pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0, help_text='Submit attempts made')),
+                ('next_attempt', models.DateTimeField(blank=True, db_index=True, help_text='Do not submit before this date', null=True)),
+                ('last_error', models.TextField(blank=True, help_text='Error returned by ShipStation for this order', null=True)),
+                ('dispatch_id', models.CharField(blank=True, db_index=True, help_text='Set by dispatcher that claimed this request', max_length=32, null=True)),
+                ('shipstation_order_id', models.BigIntegerField(blank=True, help_text='Order ID returned by ShipStation', null=True)),
+                ('sent_date', models.DateTimeField(blank=True, null=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('lead', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='adsrental.Lead')),
+            ],
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 2.2.4 on 2026-10-19 19:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adsrental', '0262_shipstationorderrequest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='leadaccount',
+            name='adsdb_sync_status',
+            field=models.CharField(blank=True, choices=[('Pending', 'Pending'), ('Synced', 'Synced'), ('Failed', 'Failed')], db_index=True, help_text='Status of last push to Adsdb', max_length=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='leadaccount',
+            name='adsdb_sync_date',
+            field=models.DateTimeField(blank=True, help_text='Date of last successful push to Adsdb', null=True),
+        ),
+        migrations.CreateModel(
+            name='AdsdbPush',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Sending', 'Sending'), ('Sent', 'Sent'), ('Failed', 'Failed'), ('Skipped', 'Skipped')], db_index=True, default='Pending', help_text='Skipped if lead account does not meet sync conditions anymore', max_length=10)),
+                ('updates', models.PositiveIntegerField(default=1, help_text='Amount of coalesced updates')),
+                ('requested', models.DateTimeField(db_index=True, default=django.utils.timezone.now, help_text='Date of last coalesced update')),
+                ('attempts', models.PositiveIntegerField(default=0, help_text='Send attempts made')),
+                ('next_attempt', models.DateTimeField(blank=True, db_index=True, help_text='Do not send before this date', null=True)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('dispatch_id', models.CharField(blank=True, db_index=True, help_text='Set by dispatcher that claimed this push', max_length=32, null=True)),
+                ('request_data', models.TextField(blank=True, help_text='Last sent payload', null=True)),
+                ('response', models.TextField(blank=True, help_text='Last Adsdb response', null=True)),
+                ('sent_date', models.DateTimeField(blank=True, null=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('lead_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='adsrental.LeadAccount')),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 2.2.4 on 2026-10-19 20:00
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adsrental', '0263_adsdbpush'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InstanceSyncRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(choices=[('Vultr', 'Vultr'), ('EC2', 'EC2')], db_index=True, max_length=10)),
+                ('started', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('duration', models.FloatField(default=0.0, help_text='Run duration in seconds')),
+                ('api_calls', models.PositiveIntegerField(default=0, help_text='Requests made to provider API')),
+                ('instances_total', models.PositiveIntegerField(default=0, help_text='Instances listed by provider')),
+                ('instances_created', models.PositiveIntegerField(default=0)),
+                ('instances_updated', models.PositiveIntegerField(default=0)),
+                ('instances_deleted', models.PositiveIntegerField(default=0)),
+                ('instances_unchanged', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True, help_text='Set if sync failed, DB is not changed in this case', null=True)),
+            ],
+        ),
+    ]
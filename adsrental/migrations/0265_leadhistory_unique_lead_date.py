@@ -0,0 +1,44 @@
+# Generated by Django 2.2.4 on 2026-10-19 21:00
+
+from django.db import migrations
+from django.db.models import Count, Min, Sum
+
+CHECK_FIELDS = [
+    'checks_offline',
+    'checks_online',
+    'checks_wrong_password',
+    'checks_wrong_password_facebook',
+    'checks_wrong_password_google',
+    'checks_wrong_password_amazon',
+    'checks_sec_checkpoint_facebook',
+    'checks_sec_checkpoint_google',
+    'checks_sec_checkpoint_amazon',
+]
+
+
+def merge_duplicates(apps, schema_editor):
+    'Sum checks of duplicated (lead, date) entries into the oldest one and remove the rest'
+    LeadHistory = apps.get_model('adsrental', 'LeadHistory')
+    duplicates = LeadHistory.objects.values('lead_id', 'date').annotate(
+        entries=Count('id'),
+        first_id=Min('id'),
+        **{field: Sum(field) for field in CHECK_FIELDS}
+    ).filter(entries__gt=1).order_by()
+    for row in duplicates:
+        LeadHistory.objects.filter(id=row['first_id']).update(**{field: row[field] for field in CHECK_FIELDS})
+        LeadHistory.objects.filter(lead_id=row['lead_id'], date=row['date']).exclude(id=row['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adsrental', '0264_instancesyncrun'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='leadhistory',
+            unique_together={('lead', 'date')},
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.4 on 2026-10-19 22:00
+
+import datetime
+
+from django.db import migrations, models
+
+
+def mark_finalized(apps, schema_editor):
+    'Past days are already included in LeadHistoryMonth totals by aggregate cron'
+    LeadHistory = apps.get_model('adsrental', 'LeadHistory')
+    LeadHistory.objects.filter(date__lt=datetime.date.today()).update(finalized=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adsrental', '0265_leadhistory_unique_lead_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='leadhistory',
+            name='finalized',
+            field=models.BooleanField(db_index=True, default=False, help_text='Day is over and its amount is added to LeadHistoryMonth totals'),
+        ),
+        migrations.RunPython(mark_finalized, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.4 on 2026-10-19 23:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adsrental', '0266_leadhistory_finalized'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeadCheckMonth',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(db_index=True, help_text='First day of month')),
+                ('days', models.PositiveIntegerField(default=0, help_text='Bitmap of packed days, lowest bit is first day of month')),
+                ('checks', models.BinaryField(help_text='Daily counters, one byte per day for every counter in LeadHistory.CHECK_FIELDS')),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('lead', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='adsrental.Lead')),
+            ],
+            options={
+                'unique_together': {('lead', 'date')},
+            },
+        ),
+    ]
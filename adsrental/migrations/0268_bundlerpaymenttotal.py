@@ -0,0 +1,54 @@
+# Generated by Django 2.2.4 on 2026-10-19 23:30
+
+import decimal
+
+from django.db import migrations, models
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def fill_bundler_payment_totals(apps, schema_editor):
+    BundlerPayment = apps.get_model('adsrental', 'BundlerPayment')
+    BundlerPaymentTotal = apps.get_model('adsrental', 'BundlerPaymentTotal')
+    totals = {}
+    for bundler_id, payment_datetime, payment_type, payment, paid in BundlerPayment.objects.filter(
+            bundler__isnull=False,
+    ).values_list('bundler_id', 'datetime', 'payment_type', 'payment', 'paid').iterator():
+        if timezone.is_aware(payment_datetime):
+            payment_datetime = timezone.localtime(payment_datetime)
+        key = (bundler_id, payment_datetime.date().replace(day=1), payment_type)
+        total = totals.setdefault(key, [decimal.Decimal('0.00'), decimal.Decimal('0.00'), 0])
+        total[0 if paid else 1] += payment
+        total[2] += 1
+
+    BundlerPaymentTotal.objects.bulk_create([
+        BundlerPaymentTotal(bundler_id=bundler_id, date=date, payment_type=payment_type, paid_sum=paid_sum, not_paid_sum=not_paid_sum, payments_count=payments_count)
+        for (bundler_id, date, payment_type), (paid_sum, not_paid_sum, payments_count) in totals.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adsrental', '0267_leadcheckmonth'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BundlerPaymentTotal',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(db_index=True, help_text='First day of month of payment datetime')),
+                ('payment_type', models.CharField(db_index=True, max_length=50)),
+                ('paid_sum', models.DecimalField(decimal_places=2, default=decimal.Decimal('0.00'), max_digits=12)),
+                ('not_paid_sum', models.DecimalField(decimal_places=2, default=decimal.Decimal('0.00'), max_digits=12)),
+                ('payments_count', models.IntegerField(default=0)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('bundler', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='adsrental.Bundler')),
+            ],
+            options={
+                'unique_together': {('bundler', 'date', 'payment_type')},
+            },
+        ),
+        migrations.RunPython(fill_bundler_payment_totals, migrations.RunPython.noop),
+    ]
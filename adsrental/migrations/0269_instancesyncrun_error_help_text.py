@@ -0,0 +1,18 @@
+# Generated by Django 2.2.4 on 2026-10-20 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adsrental', '0268_bundlerpaymenttotal'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='instancesyncrun',
+            name='error',
+            field=models.TextField(blank=True, help_text='Set if sync failed or some changes were skipped as unsafe', null=True),
+        ),
+    ]
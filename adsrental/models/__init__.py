@@ -15,3 +15,13 @@ from adsrental.models.bundler_payment import BundlerPayment  # noqa: F401
 from adsrental.models.lead_account_issue import LeadAccountIssue  # noqa: F401
 from adsrental.models.bundler_team import BundlerTeam  # noqa: F401
 from adsrental.models.lead_account_issue_image import LeadAccountIssueImage  # noqa: F401
+from adsrental.models.proxy_reassignment import ProxyReassignment  # noqa: F401
+from adsrental.models.proxykeeper_stat import ProxykeeperStat  # noqa: F401
+from adsrental.models.slack_message import SlackMessage  # noqa: F401
+from adsrental.models.shipment_tracking import ShipmentTracking  # noqa: F401
+from adsrental.models.sync_watermark import SyncWatermark  # noqa: F401
+from adsrental.models.shipstation_order_request import ShipStationOrderRequest  # noqa: F401
+from adsrental.models.adsdb_push import AdsdbPush  # noqa: F401
+from adsrental.models.instance_sync_run import InstanceSyncRun  # noqa: F401
+from adsrental.models.lead_check_month import LeadCheckMonth  # noqa: F401
+from adsrental.models.bundler_payment_total import BundlerPaymentTotal  # noqa: F401
@@ -0,0 +1,51 @@
+from django.db import models
+from django.utils import timezone
+
+from adsrental.models.mixins import OutboxMixin
+
+
+class AdsdbPush(models.Model, OutboxMixin):
+    '''
+    Pending push of :model:`adsrental.LeadAccount` data to Adsdb.
+
+    Works as an outbox: *LeadAccount.sync_to_adsdb* creates *Pending* push, *adsdb_dispatch* cron sends them.
+    There is at most one pending push per lead account, so repeated updates are coalesced. Payload is built
+    from current lead account data at the moment of sending, and push waits *COALESCE_SECONDS* after last update.
+    '''
+    STATUS_PENDING = 'Pending'
+    STATUS_SENDING = 'Sending'
+    STATUS_SENT = 'Sent'
+    STATUS_FAILED = 'Failed'
+    STATUS_SKIPPED = 'Skipped'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENDING, 'Sending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+        (STATUS_SKIPPED, 'Skipped'),
+    ]
+
+    MAX_ATTEMPTS = 5
+    BACKOFF_SECONDS = 60
+    SENDING_TIMEOUT_MINUTES = 10
+    COALESCE_SECONDS = 30
+
+    lead_account = models.ForeignKey('adsrental.LeadAccount', on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True, help_text='Skipped if lead account does not meet sync conditions anymore')
+    updates = models.PositiveIntegerField(default=1, help_text='Amount of coalesced updates')
+    requested = models.DateTimeField(default=timezone.now, db_index=True, help_text='Date of last coalesced update')
+    attempts = models.PositiveIntegerField(default=0, help_text='Send attempts made')
+    next_attempt = models.DateTimeField(null=True, blank=True, db_index=True, help_text='Do not send before this date')
+    last_error = models.TextField(null=True, blank=True)
+    dispatch_id = models.CharField(max_length=32, null=True, blank=True, db_index=True, help_text='Set by dispatcher that claimed this push')
+    request_data = models.TextField(null=True, blank=True, help_text='Last sent payload')
+    response = models.TextField(null=True, blank=True, help_text='Last Adsdb response')
+    sent_date = models.DateTimeField(null=True, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f'{self.lead_account_id} {self.status}'
+
+    def mark_skipped(self) -> None:
+        self.status = self.STATUS_SKIPPED
+        self.dispatch_id = None
@@ -1,7 +1,9 @@
 import decimal
 import datetime
+import typing
 
 from django.db import models
+from django.db.models import Count
 from django.utils import timezone
 
 from adsrental.models.bundler_payment import BundlerPayment
@@ -74,18 +76,44 @@ class Bundler(models.Model):
     def get_by_adsdb_id(cls, adsdb_id: str) -> 'Bundler':
         return cls.objects.filter(adsdb_id=adsdb_id).first()
 
-    def is_chargeback_enabled(self, lead_account):
+    @classmethod
+    def get_chargeback_counts(cls, bundler_ids: typing.Iterable[int]) -> typing.Dict[typing.Tuple[int, typing.Optional[int]], int]:
+        '''
+        Get amount of payments in chargeback rolling window for *is_chargeback_enabled* with one query.
+
+        Keys are (bundler_id, lead_account_id) and (bundler_id, None) for bundler total.
+        '''
+        now = timezone.localtime(timezone.now())
+        result: typing.Dict[typing.Tuple[int, typing.Optional[int]], int] = {}
+        for row in BundlerPayment.objects.filter(
+                created__gt=now - datetime.timedelta(days=cls.CHARGEBACK_ROLLING_WINDOW_DAYS),
+                bundler_id__in=bundler_ids,
+        ).values('bundler_id', 'lead_account_id').annotate(count=Count('id')).order_by():
+            result[(row['bundler_id'], None)] = result.get((row['bundler_id'], None), 0) + row['count']
+            if row['lead_account_id'] is not None:
+                result[(row['bundler_id'], row['lead_account_id'])] = row['count']
+        return result
+
+    def is_chargeback_enabled(self, lead_account, chargeback_counts=None):
+        'If *chargeback_counts* from *get_chargeback_counts* are given, no query is made'
+        if chargeback_counts is not None:
+            chargeback_count = chargeback_counts.get((self.id, None), 0) - chargeback_counts.get((self.id, lead_account.id), 0)
+            return chargeback_count <= self.chargeback_streak
+
         now = timezone.localtime(timezone.now())
         chargeback_count = BundlerPayment.objects.filter(
             created__gt=now - datetime.timedelta(days=self.CHARGEBACK_ROLLING_WINDOW_DAYS), bundler=self
         ).exclude(lead_account=lead_account).count()
         return chargeback_count <= self.chargeback_streak
 
-    def get_chargeback(self, lead_account) -> decimal.Decimal:
+    def get_chargeback(self, lead_account, chargeback_enabled=None) -> decimal.Decimal:
+        'Get chargeback amount, *chargeback_enabled* can be precalculated to skip *is_chargeback_enabled* query'
         if not lead_account.charge_back:
             return decimal.Decimal('0.00')
 
-        if not self.is_chargeback_enabled(lead_account):
+        if chargeback_enabled is None:
+            chargeback_enabled = self.is_chargeback_enabled(lead_account)
+        if not chargeback_enabled:
             return decimal.Decimal('0.00')
 
         active_days = lead_account.get_active_days()
@@ -3,16 +3,44 @@ from __future__ import annotations
 import datetime
 import typing
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, Q
 from django.apps import apps
 from django.utils import timezone
 
 
 if typing.TYPE_CHECKING:
     from adsrental.models.bundler import Bundler
+    from adsrental.models.lead_account import LeadAccount
+    from adsrental.models.raspberry_pi import RaspberryPi
 
 
 class BundlerLeadStat(models.Model):
+    '''
+    Lead account counters for :model:`adsrental.Bundler`, shown on leaderboard and in admin.
+
+    Counters are kept up to date by *update_counters* on lead account changes and by *update_online_counters*
+    on ping flush. Time windows and changes made outside of these hooks are reconciled hourly
+    by *bundler_lead_stat* cron with *calculate_all*.
+    '''
+    COUNTER_FIELDS = (
+        'in_progress_total',
+        'in_progress_offline',
+        'in_progress_wrong_pw',
+        'in_progress_security_checkpoint',
+        'in_progress_total_issue',
+        'autobans_total',
+        'autobans_last_30_days',
+        'bans_total',
+        'bans_last_30_days',
+        'qualified_total',
+        'qualified_today',
+        'qualified_yesterday',
+        'delivered_last_14_days',
+        'delivered_not_connected_last_14_days',
+    )
+    ONLINE_WATERMARK = 'bundler_lead_stat_online'
+
     bundler = models.ForeignKey('Bundler', on_delete=models.deletion.CASCADE)
     in_progress_total = models.IntegerField(default=0)
     in_progress_offline = models.IntegerField(default=0)
@@ -40,58 +68,259 @@ class BundlerLeadStat(models.Model):
         return self.bundler.name
 
     @classmethod
-    def calculate(cls, bundler: Bundler) -> None:
-        obj = cls(bundler=bundler)
+    def get_dates(cls) -> typing.Dict[str, datetime.datetime]:
+        'Get window boundaries for counters'
+        now = timezone.localtime(timezone.now())
+        today_start = now.replace(hour=0, minute=0, second=0)
+        return dict(
+            last_30_days_start=now - datetime.timedelta(days=30),
+            last_14_days_start=now - datetime.timedelta(days=14),
+            delivered_end=now - datetime.timedelta(days=2),
+            today_start=today_start,
+            yesterday_start=today_start - datetime.timedelta(days=1),
+        )
+
+    @staticmethod
+    def is_online(raspberry_pi: typing.Optional[RaspberryPi], now: datetime.datetime) -> bool:
+        'Same rules as *RaspberryPi.online*, but for given moment'
+        if raspberry_pi is None or raspberry_pi.first_seen is None or raspberry_pi.last_seen is None:
+            return False
+        return raspberry_pi.last_seen > now - datetime.timedelta(minutes=raspberry_pi.online_minutes_ttl)
+
+    @classmethod
+    def get_counters(cls, bundler_ids: typing.Optional[typing.List[int]] = None, now: typing.Optional[datetime.datetime] = None) -> typing.Dict[int, typing.Dict[str, int]]:
+        '''
+        Get counters for every bundler with one grouped query.
+        RaspberryPi is offline by the same rules as *RaspberryPi.online*.
+        '''
         LeadAccount = apps.get_model('adsrental', 'LeadAccount')
+        RaspberryPi = apps.get_model('adsrental', 'RaspberryPi')
+        dates = cls.get_dates()
+        online_start = (now or timezone.now()) - datetime.timedelta(minutes=RaspberryPi.online_minutes_ttl)
+
+        in_progress = Q(status=LeadAccount.STATUS_IN_PROGRESS)
+        has_issue = Q(wrong_password_date__isnull=False) | Q(security_checkpoint_date__isnull=False)
+        offline = Q(lead__raspberry_pi__isnull=False) & (
+            Q(lead__raspberry_pi__first_seen__isnull=True) |
+            Q(lead__raspberry_pi__last_seen__isnull=True) |
+            Q(lead__raspberry_pi__last_seen__lte=online_start)
+        )
+        auto_banned = Q(ban_reason__in=LeadAccount.AUTO_BAN_REASONS)
+        banned = Q(ban_reason__isnull=False) & ~Q(ban_reason='')
+        banned_last_30_days = Q(banned_date__gt=dates['last_30_days_start'])
+        delivered_last_14_days = Q(
+            lead__delivery_date__lte=dates['delivered_end'].date(),
+            lead__delivery_date__gte=dates['last_14_days_start'].date(),
+        ) & ~Q(status=LeadAccount.STATUS_AVAILABLE)
+
         lead_accounts = LeadAccount.objects.filter(
-            lead__bundler=obj.bundler,
+            lead__bundler__isnull=False,
             account_type__in=LeadAccount.ACCOUNT_TYPES_FACEBOOK,
-        ).prefetch_related('lead', 'lead__raspberry_pi')
-        now = timezone.localtime(timezone.now())
-        last_30_days_start = now - datetime.timedelta(days=30)
-        last_14_days_start = now - datetime.timedelta(days=14)
-        delivered_last_14_days_lead_accounts = lead_accounts.filter(
-            lead__delivery_date__lte=now - datetime.timedelta(days=2),
-            lead__delivery_date__gte=last_14_days_start,
-        ).exclude(
-            status=LeadAccount.STATUS_AVAILABLE,
         )
-        obj.delivered_last_14_days = delivered_last_14_days_lead_accounts.count()
-        obj.delivered_not_connected_last_14_days = delivered_last_14_days_lead_accounts.filter(
-            in_progress_date__isnull=True,
-            status=LeadAccount.STATUS_QUALIFIED,
-        ).count()
+        if bundler_ids is not None:
+            lead_accounts = lead_accounts.filter(lead__bundler_id__in=bundler_ids)
+
+        rows = lead_accounts.values('lead__bundler_id').annotate(
+            in_progress_total=Count('id', filter=in_progress),
+            in_progress_offline=Count('id', filter=in_progress & offline),
+            in_progress_wrong_pw=Count('id', filter=in_progress & Q(wrong_password_date__isnull=False)),
+            in_progress_security_checkpoint=Count('id', filter=in_progress & Q(security_checkpoint_date__isnull=False)),
+            in_progress_total_issue=Count('id', filter=in_progress & Q(lead__raspberry_pi__isnull=False) & (offline | has_issue)),
+            autobans_total=Count('id', filter=banned & auto_banned),
+            autobans_last_30_days=Count('id', filter=banned & auto_banned & banned_last_30_days),
+            bans_total=Count('id', filter=banned),
+            bans_last_30_days=Count('id', filter=banned & banned_last_30_days),
+            qualified_total=Count('id', filter=Q(qualified_date__isnull=False)),
+            qualified_today=Count('id', filter=Q(qualified_date__gt=dates['today_start'])),
+            qualified_yesterday=Count('id', filter=Q(qualified_date__gt=dates['yesterday_start'], qualified_date__lte=dates['today_start'])),
+            delivered_last_14_days=Count('id', filter=delivered_last_14_days),
+            delivered_not_connected_last_14_days=Count('id', filter=delivered_last_14_days & Q(
+                in_progress_date__isnull=True,
+                status=LeadAccount.STATUS_QUALIFIED,
+            )),
+        ).order_by()
+
+        result = {}
+        for row in rows:
+            bundler_id = row.pop('lead__bundler_id')
+            result[bundler_id] = row
+        return result
+
+    @classmethod
+    def get_lead_account_counters(cls, lead_account: LeadAccount, online: typing.Optional[bool] = None) -> typing.Dict[str, int]:
+        '''
+        Get counters single lead account adds to its bundler stat, same rules as *get_counters*.
+        If *online* is not set, it is taken from lead RaspberryPi.
+        '''
+        counters = dict.fromkeys(cls.COUNTER_FIELDS, 0)
+        if lead_account.account_type not in lead_account.ACCOUNT_TYPES_FACEBOOK:
+            return counters
+
+        dates = cls.get_dates()
+        lead = lead_account.lead
+        raspberry_pi = lead.raspberry_pi
+        if online is None:
+            online = cls.is_online(raspberry_pi, timezone.now())
+        offline = raspberry_pi is not None and not online
+        wrong_pw = lead_account.wrong_password_date is not None
+        security_checkpoint = lead_account.security_checkpoint_date is not None
+        if lead_account.status == lead_account.STATUS_IN_PROGRESS:
+            counters['in_progress_total'] = 1
+            counters['in_progress_offline'] = int(offline)
+            counters['in_progress_wrong_pw'] = int(wrong_pw)
+            counters['in_progress_security_checkpoint'] = int(security_checkpoint)
+            counters['in_progress_total_issue'] = int(raspberry_pi is not None and (offline or wrong_pw or security_checkpoint))
+
+        if lead_account.ban_reason:
+            banned_last_30_days = lead_account.banned_date is not None and lead_account.banned_date > dates['last_30_days_start']
+            counters['bans_total'] = 1
+            counters['bans_last_30_days'] = int(banned_last_30_days)
+            if lead_account.ban_reason in lead_account.AUTO_BAN_REASONS:
+                counters['autobans_total'] = 1
+                counters['autobans_last_30_days'] = int(banned_last_30_days)
+
+        if lead_account.qualified_date:
+            counters['qualified_total'] = 1
+            if lead_account.qualified_date > dates['today_start']:
+                counters['qualified_today'] = 1
+            elif lead_account.qualified_date > dates['yesterday_start']:
+                counters['qualified_yesterday'] = 1
+
+        if (
+                lead.delivery_date and
+                dates['last_14_days_start'].date() <= lead.delivery_date <= dates['delivered_end'].date() and
+                lead_account.status != lead_account.STATUS_AVAILABLE
+        ):
+            counters['delivered_last_14_days'] = 1
+            if lead_account.in_progress_date is None and lead_account.status == lead_account.STATUS_QUALIFIED:
+                counters['delivered_not_connected_last_14_days'] = 1
+
+        return counters
+
+    @classmethod
+    def add_counters(cls, bundler_id: int, diff: typing.Dict[str, int]) -> None:
+        'Add values to bundler stat counters with atomic increments'
+        diff = {k: v for k, v in diff.items() if v}
+        if not diff:
+            return
+        cls.objects.filter(bundler_id=bundler_id).update(
+            updated=timezone.now(),
+            **{k: F(k) + v for k, v in diff.items()}
+        )
+
+    @classmethod
+    def update_counters(cls, lead_account: LeadAccount, old_counters: typing.Dict[str, int]) -> None:
+        '''
+        Apply lead account change to bundler stat. *old_counters* should be taken
+        with *get_lead_account_counters* before change.
+        '''
+        bundler_id = lead_account.lead.bundler_id
+        if not bundler_id:
+            return
+        new_counters = cls.get_lead_account_counters(lead_account)
+        cls.add_counters(bundler_id, {k: new_counters[k] - old_counters[k] for k in cls.COUNTER_FIELDS})
+
+    @classmethod
+    def bulk_update_counters(cls, lead_accounts: typing.List[LeadAccount], old_counters: typing.Dict[int, typing.Dict[str, int]]) -> None:
+        '''
+        Same as *update_counters* for many lead accounts, diffs are summed with one update per bundler.
+        *old_counters* are taken with *get_lead_account_counters* by lead account id before change.
+        '''
+        diffs: typing.Dict[int, typing.Dict[str, int]] = {}
         for lead_account in lead_accounts:
-            lead = lead_account.lead
-            raspberry_pi = lead.raspberry_pi
-            if lead_account.status == LeadAccount.STATUS_IN_PROGRESS:
-                obj.in_progress_total += 1
-                if lead_account.is_wrong_password():
-                    obj.in_progress_wrong_pw += 1
-                if lead_account.is_security_checkpoint_reported():
-                    obj.in_progress_security_checkpoint += 1
-                if raspberry_pi:
-                    if not raspberry_pi.online():
-                        obj.in_progress_offline += 1
-                    if not raspberry_pi.online() or lead_account.is_wrong_password() or lead_account.is_security_checkpoint_reported():
-                        obj.in_progress_total_issue += 1
-
-            if lead_account.ban_reason:
-                if lead_account.ban_reason in LeadAccount.AUTO_BAN_REASONS:
-                    obj.autobans_total += 1
-                    if lead_account.banned_date and lead_account.banned_date > last_30_days_start:
-                        obj.autobans_last_30_days += 1
-
-                obj.bans_total += 1
-                if lead_account.banned_date and lead_account.banned_date > last_30_days_start:
-                    obj.bans_last_30_days += 1
-
-            if lead_account.qualified_date:
-                obj.qualified_total += 1
-                if lead_account.qualified_date > now.replace(hour=0, minute=0, second=0):
-                    obj.qualified_today += 1
-                elif lead_account.qualified_date > now.replace(hour=0, minute=0, second=0) - datetime.timedelta(days=1):
-                    obj.qualified_yesterday += 1
-
-        cls.objects.filter(bundler=bundler).delete()
-        obj.save()
+            bundler_id = lead_account.lead.bundler_id
+            if not bundler_id:
+                continue
+            new_counters = cls.get_lead_account_counters(lead_account)
+            diff = diffs.setdefault(bundler_id, dict.fromkeys(cls.COUNTER_FIELDS, 0))
+            for key in cls.COUNTER_FIELDS:
+                diff[key] += new_counters[key] - old_counters[lead_account.id][key]
+
+        for bundler_id, diff in diffs.items():
+            cls.add_counters(bundler_id, diff)
+
+    @classmethod
+    def update_online_counters(
+            cls,
+            raspberry_pis: typing.List[RaspberryPi],
+            was_online: typing.Dict[str, bool],
+            previous_flush: datetime.datetime,
+            now: datetime.datetime,
+    ) -> typing.Dict[str, int]:
+        '''
+        Apply RaspberryPi online/offline transitions between previous ping flush and now.
+
+        *raspberry_pis* are devices that pinged in this flush, *was_online* is their state by RPID at *previous_flush*.
+        Devices that did not ping are offline now if their *last_seen* crossed online threshold since previous flush.
+        '''
+        RaspberryPi = apps.get_model('adsrental', 'RaspberryPi')
+        LeadAccount = apps.get_model('adsrental', 'LeadAccount')
+        transitions = {}
+        for raspberry_pi in raspberry_pis:
+            online = cls.is_online(raspberry_pi, now)
+            if online != was_online.get(raspberry_pi.rpid, False):
+                transitions[raspberry_pi.rpid] = online
+
+        online_ttl = datetime.timedelta(minutes=RaspberryPi.online_minutes_ttl)
+        for rpid in RaspberryPi.objects.filter(
+                first_seen__isnull=False,
+                last_seen__gt=previous_flush - online_ttl,
+                last_seen__lte=now - online_ttl,
+        ).exclude(
+            rpid__in=[i.rpid for i in raspberry_pis],
+        ).values_list('rpid', flat=True):
+            transitions[rpid] = False
+
+        if not transitions:
+            return dict(online=0, offline=0)
+
+        diffs = {}
+        for lead_account in LeadAccount.objects.filter(
+                lead__raspberry_pi_id__in=transitions.keys(),
+                lead__bundler__isnull=False,
+                account_type__in=LeadAccount.ACCOUNT_TYPES_FACEBOOK,
+                status=LeadAccount.STATUS_IN_PROGRESS,
+        ).select_related('lead', 'lead__raspberry_pi'):
+            online = transitions[lead_account.lead.raspberry_pi_id]
+            old_counters = cls.get_lead_account_counters(lead_account, online=not online)
+            new_counters = cls.get_lead_account_counters(lead_account, online=online)
+            diff = diffs.setdefault(lead_account.lead.bundler_id, dict.fromkeys(cls.COUNTER_FIELDS, 0))
+            for key in cls.COUNTER_FIELDS:
+                diff[key] += new_counters[key] - old_counters[key]
+
+        for bundler_id, diff in diffs.items():
+            cls.add_counters(bundler_id, diff)
+
+        online_total = len([i for i in transitions.values() if i])
+        return dict(online=online_total, offline=len(transitions) - online_total)
+
+    @classmethod
+    def calculate_all(cls, bundlers: typing.Optional[models.query.QuerySet] = None) -> typing.List[BundlerLeadStat]:
+        '''
+        Recalculate stats for all bundlers, or only for *bundlers* if given.
+        Stat rows are replaced in one transaction, query count does not depend on amount of bundlers.
+
+        Full recalculation also moves *ONLINE_WATERMARK*, so next ping flush applies only transitions after it.
+        '''
+        Bundler = apps.get_model('adsrental', 'Bundler')
+        SyncWatermark = apps.get_model('adsrental', 'SyncWatermark')
+        now = timezone.now()
+        bundlers_filtered = bundlers is not None
+        if bundlers is None:
+            bundlers = Bundler.objects.all()
+        bundler_ids = list(bundlers.values_list('id', flat=True))
+        counters = cls.get_counters(bundler_ids if bundlers_filtered else None, now=now)
+        objs = [cls(bundler_id=bundler_id, **counters.get(bundler_id, {})) for bundler_id in bundler_ids]
+        with transaction.atomic():
+            if bundlers_filtered:
+                cls.objects.filter(bundler_id__in=bundler_ids).delete()
+            else:
+                cls.objects.all().delete()
+                SyncWatermark.set_value(cls.ONLINE_WATERMARK, now)
+            cls.objects.bulk_create(objs, batch_size=500)
+        return objs
+
+    @classmethod
+    def calculate(cls, bundler: Bundler) -> None:
+        Bundler = apps.get_model('adsrental', 'Bundler')
+        cls.calculate_all(Bundler.objects.filter(id=bundler.id))
@@ -1,8 +1,11 @@
 import decimal
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete
 from django.utils import timezone
 
+from adsrental.models.bundler_payment_total import BundlerPaymentTotal
+
 
 class BundlerPayment(models.Model):
     PAYMENT_TYPE_ACCOUNT_MAIN = 'account'
@@ -57,3 +60,20 @@ class BundlerPayment(models.Model):
 
     def __str__(self):
         return f'Bundler {self.bundler} {self.payment_type} payment for ${self.payment}'
+
+    def save(self, *args, **kwargs):  # pylint: disable=arguments-differ
+        'Save and update :model:`adsrental.BundlerPaymentTotal` in one transaction'
+        with transaction.atomic():
+            old_bundler_payment = BundlerPayment.objects.select_for_update().filter(pk=self.pk).first() if self.pk else None
+            super(BundlerPayment, self).save(*args, **kwargs)
+            diffs = BundlerPaymentTotal.get_diffs([BundlerPaymentTotal.get_payment_row(self)])
+            if old_bundler_payment:
+                BundlerPaymentTotal.get_diffs([BundlerPaymentTotal.get_payment_row(old_bundler_payment)], sign=-1, diffs=diffs)
+            BundlerPaymentTotal.apply_diffs(diffs)
+
+
+def remove_bundler_payment_total(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    BundlerPaymentTotal.remove_payments([instance])
+
+
+post_delete.connect(remove_bundler_payment_total, sender=BundlerPayment)
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import datetime
+import decimal
+import typing
+
+from django.db import models, transaction, connection
+from django.apps import apps
+from django.utils import timezone
+
+if typing.TYPE_CHECKING:
+    from adsrental.models.bundler_payment import BundlerPayment
+
+
+KeyType = typing.Tuple[int, datetime.date, str]
+
+
+class BundlerPaymentTotal(models.Model):
+    '''
+    Ledger of :model:`adsrental.BundlerPayment` totals for one bundler, month and payment type.
+
+    Updated in the same transaction as payments: on *BundlerPayment.save* and delete, by *LeadAccount.bulk_generate_payments*
+    and by *set_paid* when payments are marked as paid, so payment reports read totals without scanning payments.
+    Payments without bundler are not counted. Use *rebuild_bundler_payment_totals* command to check and fix drift.
+    '''
+    SUM_FIELDS = ['paid_sum', 'not_paid_sum', 'payments_count']
+    UPSERT_BATCH_SIZE = 500
+
+    bundler = models.ForeignKey('adsrental.Bundler', on_delete=models.CASCADE)
+    date = models.DateField(db_index=True, help_text='First day of month of payment datetime')
+    payment_type = models.CharField(max_length=50, db_index=True)
+    paid_sum = models.DecimalField(max_digits=12, decimal_places=2, default=decimal.Decimal('0.00'))
+    not_paid_sum = models.DecimalField(max_digits=12, decimal_places=2, default=decimal.Decimal('0.00'))
+    payments_count = models.IntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = (
+            ('bundler', 'date', 'payment_type'),
+        )
+
+    def __str__(self) -> str:
+        return f'{self.bundler_id} {self.date} {self.payment_type}'
+
+    @staticmethod
+    def get_period(value: typing.Union[datetime.datetime, datetime.date]) -> datetime.date:
+        'Get first day of month for payment datetime in local timezone'
+        if isinstance(value, datetime.datetime):
+            if timezone.is_aware(value):
+                value = timezone.localtime(value)
+            value = value.date()
+        return value.replace(day=1)
+
+    @classmethod
+    def get_diffs(
+            cls,
+            rows: typing.Iterable[typing.Tuple[typing.Optional[int], typing.Union[datetime.datetime, datetime.date], str, decimal.Decimal, bool]],
+            sign: int = 1,
+            diffs: typing.Optional[typing.Dict[KeyType, typing.List]] = None,
+    ) -> typing.Dict[KeyType, typing.List]:
+        'Group (bundler_id, datetime, payment_type, payment, paid) rows to [paid_sum, not_paid_sum, payments_count] by key'
+        if diffs is None:
+            diffs = {}
+        for bundler_id, payment_datetime, payment_type, payment, paid in rows:
+            if not bundler_id:
+                continue
+            diff = diffs.setdefault((bundler_id, cls.get_period(payment_datetime), payment_type), [decimal.Decimal('0.00'), decimal.Decimal('0.00'), 0])
+            diff[0 if paid else 1] += sign * decimal.Decimal(payment)
+            diff[2] += sign
+        return diffs
+
+    @staticmethod
+    def get_payment_row(bundler_payment: BundlerPayment) -> typing.Tuple:
+        return (bundler_payment.bundler_id, bundler_payment.datetime, bundler_payment.payment_type, bundler_payment.payment, bundler_payment.paid)
+
+    @classmethod
+    def get_upsert_sql(cls, rows_count: int) -> str:
+        '''
+        Get multi-row insert that adds diffs to existing (bundler, date, payment_type) rows instead of failing on duplicate.
+        Uses ON DUPLICATE KEY UPDATE on MySQL and ON CONFLICT on other backends.
+        '''
+        quote_name = connection.ops.quote_name
+        key_columns = [cls._meta.get_field(i).column for i in ('bundler', 'date', 'payment_type')]
+        sum_columns = [cls._meta.get_field(i).column for i in cls.SUM_FIELDS]
+        updated_column = cls._meta.get_field('updated').column
+        columns = key_columns + sum_columns + [updated_column]
+        placeholders = '({})'.format(', '.join(['%s'] * len(columns)))
+        sql = 'INSERT INTO {table} ({columns}) VALUES {values}'.format(
+            table=quote_name(cls._meta.db_table),
+            columns=', '.join(quote_name(i) for i in columns),
+            values=', '.join([placeholders] * rows_count),
+        )
+        if connection.vendor == 'mysql':
+            updates = ['{0} = {0} + VALUES({0})'.format(quote_name(i)) for i in sum_columns]
+            updates.append('{0} = VALUES({0})'.format(quote_name(updated_column)))
+            return '{} ON DUPLICATE KEY UPDATE {}'.format(sql, ', '.join(updates))
+
+        updates = ['{0} = {1}.{0} + excluded.{0}'.format(quote_name(i), quote_name(cls._meta.db_table)) for i in sum_columns]
+        updates.append('{0} = excluded.{0}'.format(quote_name(updated_column)))
+        return '{} ON CONFLICT ({}) DO UPDATE SET {}'.format(
+            sql,
+            ', '.join(quote_name(i) for i in key_columns),
+            ', '.join(updates),
+        )
+
+    @classmethod
+    def apply_diffs(cls, diffs: typing.Dict[KeyType, typing.List]) -> None:
+        '''
+        Add diffs to ledger rows, missing rows are created.
+        Increments are applied atomically by DB with one upsert per *UPSERT_BATCH_SIZE* keys,
+        so concurrent first payments for the same key do not fail on unique constraint.
+        '''
+        diffs = {k: v for k, v in diffs.items() if any(v)}
+        if not diffs:
+            return
+
+        now = cls._meta.get_field('updated').get_db_prep_value(timezone.now(), connection)
+        rows = []
+        for (bundler_id, date, payment_type), values in sorted(diffs.items()):
+            row = [
+                bundler_id,
+                cls._meta.get_field('date').get_db_prep_value(date, connection),
+                payment_type,
+            ]
+            for field_name, value in zip(cls.SUM_FIELDS, values):
+                row.append(cls._meta.get_field(field_name).get_db_prep_save(value, connection))
+            row.append(now)
+            rows.append(row)
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            for index in range(0, len(rows), cls.UPSERT_BATCH_SIZE):
+                batch = rows[index:index + cls.UPSERT_BATCH_SIZE]
+                cursor.execute(cls.get_upsert_sql(len(batch)), [value for row in batch for value in row])
+
+    @classmethod
+    def add_payments(cls, bundler_payments: typing.Iterable[BundlerPayment]) -> None:
+        'Add new payments to ledger'
+        cls.apply_diffs(cls.get_diffs([cls.get_payment_row(i) for i in bundler_payments]))
+
+    @classmethod
+    def remove_payments(cls, bundler_payments: typing.Iterable[BundlerPayment]) -> None:
+        'Remove deleted payments from ledger'
+        cls.apply_diffs(cls.get_diffs([cls.get_payment_row(i) for i in bundler_payments], sign=-1))
+
+    @classmethod
+    def set_paid(cls, bundler_payments: models.query.QuerySet, paid: bool, **kwargs: typing.Any) -> int:
+        '''
+        Same as *bundler_payments.update(paid=paid, **kwargs)*, but moves changed payments between
+        paid and not paid totals in the same transaction.
+        '''
+        with transaction.atomic():
+            rows = list(bundler_payments.exclude(paid=paid).values_list('bundler_id', 'datetime', 'payment_type', 'payment', 'paid'))
+            diffs = cls.get_diffs(rows, sign=-1)
+            cls.get_diffs([(*i[:4], paid) for i in rows], diffs=diffs)
+            result = bundler_payments.update(paid=paid, **kwargs)
+            cls.apply_diffs(diffs)
+        return result
+
+    @classmethod
+    def get_expected_totals(cls) -> typing.Dict[KeyType, typing.List]:
+        'Calculate ledger from all payments'
+        BundlerPayment = apps.get_model('adsrental', 'BundlerPayment')
+        return cls.get_diffs(
+            BundlerPayment.objects.filter(bundler__isnull=False).values_list('bundler_id', 'datetime', 'payment_type', 'payment', 'paid').iterator()
+        )
+
+    @classmethod
+    def rebuild(cls) -> None:
+        'Replace ledger with totals calculated from all payments'
+        with transaction.atomic():
+            totals = cls.get_expected_totals()
+            cls.objects.all().delete()
+            cls.objects.bulk_create([
+                cls(bundler_id=bundler_id, date=date, payment_type=payment_type, paid_sum=paid_sum, not_paid_sum=not_paid_sum, payments_count=payments_count)
+                for (bundler_id, date, payment_type), (paid_sum, not_paid_sum, payments_count) in totals.items()
+            ], batch_size=1000)
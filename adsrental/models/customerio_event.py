@@ -1,12 +1,33 @@
 from django.db import models
 
-from adsrental.models.mixins import FulltextSearchMixin
+from adsrental.models.mixins import FulltextSearchMixin, OutboxMixin
 
 
-class CustomerIOEvent(models.Model, FulltextSearchMixin):
+class CustomerIOEvent(models.Model, FulltextSearchMixin, OutboxMixin):
     '''
     Stores a single event for CustomerIO entry. Related to :model:`adsrental.Lead`.
+
+    Works as an outbox: event is created as *Pending* and delivered by *customerio_dispatch* cron in batches.
+    Failed deliveries are retried with backoff up to *MAX_ATTEMPTS* times. *idempotency_key* is sent as event id,
+    so customer.io ignores duplicates if event is delivered twice.
     '''
+    STATUS_PENDING = 'Pending'
+    STATUS_SENDING = 'Sending'
+    STATUS_SENT = 'Sent'
+    STATUS_FAILED = 'Failed'
+    STATUS_SKIPPED = 'Skipped'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENDING, 'Sending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+        (STATUS_SKIPPED, 'Skipped'),
+    ]
+
+    MAX_ATTEMPTS = 8
+    BACKOFF_SECONDS = 60
+    SENDING_TIMEOUT_MINUTES = 10
+
     NAME_SHIPPED = 'shipped'
     NAME_DELIVERED = 'delivered'
     NAME_OFFLINE = 'offline'
@@ -30,4 +51,15 @@ class CustomerIOEvent(models.Model, FulltextSearchMixin):
     name = models.CharField(max_length=255, choices=NAME_CHOICES, help_text='Event name. Used in customer.io filters.')
     kwargs = models.TextField(blank=True, null=True, help_text='Extra data sent to event, like hours_offline')
     sent = models.BooleanField(default=True, help_text='Is published to customer.io or not.')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True, help_text='Delivery status. Skipped if lead or customer.io is disabled.')
+    attempts = models.PositiveIntegerField(default=0, help_text='Delivery attempts made')
+    next_attempt = models.DateTimeField(null=True, blank=True, db_index=True, help_text='Do not deliver before this date')
+    last_error = models.TextField(null=True, blank=True)
+    idempotency_key = models.CharField(max_length=26, unique=True, null=True, blank=True, help_text='Sent to customer.io as event id to avoid duplicates')
+    dispatch_id = models.CharField(max_length=32, null=True, blank=True, db_index=True, help_text='Set by dispatcher that claimed this event')
+    sent_date = models.DateTimeField(null=True, blank=True)
     created = models.DateTimeField(auto_now_add=True)
+
+    def mark_sent(self) -> None:
+        super(CustomerIOEvent, self).mark_sent()
+        self.sent = True
@@ -12,10 +12,12 @@ from django.db import models
 from django.conf import settings
 from django.apps import apps
 from django.utils import timezone
+from django.db.models.signals import post_init, post_save
 from django_bulk_update.manager import BulkUpdateManager
 import paramiko
 
 from adsrental.utils import BotoResource
+from adsrental.models.signals import reset_device_config_cache, snapshot_device_config_key
 
 
 if typing.TYPE_CHECKING:
@@ -615,3 +617,7 @@ class EC2Instance(models.Model):
             return True
 
         return False
+
+
+post_init.connect(snapshot_device_config_key, sender=EC2Instance)
+post_save.connect(reset_device_config_cache, sender=EC2Instance)
@@ -0,0 +1,38 @@
+import typing
+
+from django.db import models
+from django.utils import timezone
+
+
+class InstanceSyncRun(models.Model):
+    '''
+    Statistics of a single fleet sync run between cloud provider and local DB,
+    for example :model:`adsrental.VultrInstance` sync.
+    Helps to see how many API calls and DB writes every sync needs as fleet grows.
+    '''
+    PROVIDER_VULTR = 'Vultr'
+    PROVIDER_EC2 = 'EC2'
+    PROVIDER_CHOICES = [
+        (PROVIDER_VULTR, 'Vultr'),
+        (PROVIDER_EC2, 'EC2'),
+    ]
+
+    provider = models.CharField(max_length=10, choices=PROVIDER_CHOICES, db_index=True)
+    started = models.DateTimeField(default=timezone.now, db_index=True)
+    duration = models.FloatField(default=0.0, help_text='Run duration in seconds')
+    api_calls = models.PositiveIntegerField(default=0, help_text='Requests made to provider API')
+    instances_total = models.PositiveIntegerField(default=0, help_text='Instances listed by provider')
+    instances_created = models.PositiveIntegerField(default=0)
+    instances_updated = models.PositiveIntegerField(default=0)
+    instances_deleted = models.PositiveIntegerField(default=0)
+    instances_unchanged = models.PositiveIntegerField(default=0)
+    error = models.TextField(null=True, blank=True, help_text='Set if sync failed or some changes were skipped as unsafe')
+
+    def __str__(self) -> str:
+        return f'{self.provider} {self.started}'
+
+    def finish(self, error: typing.Optional[str] = None) -> None:
+        'Set duration and save'
+        self.error = error
+        self.duration = (timezone.now() - self.started).total_seconds()
+        self.save()
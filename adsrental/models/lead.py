@@ -12,16 +12,21 @@ from django.utils import timezone
 from django.db import models
 from django.conf import settings
 from django.contrib.contenttypes.fields import GenericRelation
+from django.db.models.signals import post_init, post_save
 from django_bulk_update.manager import BulkUpdateManager
 
 from adsrental.models.raspberry_pi import RaspberryPi
 from adsrental.models.lead_change import LeadChange
 from adsrental.models.mixins import FulltextSearchMixin, CommentsMixin
 from adsrental.models.comment import Comment
-from adsrental.utils import CustomerIOClient, ShipStationClient
+from adsrental.models.shipment_tracking import ShipmentTracking
+from adsrental.models.shipstation_order_request import ShipStationOrderRequest
+from adsrental.utils import CustomerIOClient, ShipStationClient, HttpClient, USPSTrackingClient
 from adsrental.models.signals import (
     slack_new_tracking_number,
-    slack_pii_delivered
+    slack_pii_delivered,
+    reset_device_config_cache,
+    snapshot_device_config_key,
 )
 
 
@@ -183,7 +188,6 @@ class Lead(models.Model, FulltextSearchMixin, CommentsMixin):
     extra_photo_id = models.FileField(blank=True, null=True, help_text='Extra photo uploaded by user on registration.')
     isp = models.CharField(max_length=255, blank=True, null=True, help_text='Internet Service Provider')
     splashtop_id = models.CharField(max_length=255, blank=True, null=True, help_text='Splashtop ID reported by user.')
-    tracking_info = models.TextField(blank=True, null=True, help_text='Raw response from secure.shippingapis.com')
     has_active_accounts = models.BooleanField(default=True, help_text='Lead has active lead accounts.')
     pi_sent = models.DateTimeField(null=True, blank=True)
     created = models.DateTimeField(auto_now_add=True)
@@ -384,13 +388,19 @@ class Lead(models.Model, FulltextSearchMixin, CommentsMixin):
         return True
 
     def add_shipstation_order(self) -> bool:
-        'Create shipstation order if does not exist.'
+        'Queue shipstation order creation if order does not exist.'
         if not settings.MANAGE_SHIPSTATION:
             return False
 
-        shipstation_client = ShipStationClient()
-        if shipstation_client.get_lead_order_data(self):
+        if ShipStationOrderRequest.objects.filter(lead=self, order_key=self.shipstation_order_number).exclude(status=ShipStationOrderRequest.STATUS_FAILED).exists():
             return False
+
+        shipstation_client = ShipStationClient()
+        if self.shipstation_order_number:
+            if self.shipstation_order_status:
+                return False
+            if shipstation_client.get_lead_order_data(self):
+                return False
         shipstation_client.add_lead_order(self)
         return True
 
@@ -402,10 +412,14 @@ class Lead(models.Model, FulltextSearchMixin, CommentsMixin):
         'Use only ascii characters for name to send to shipstation, for example.'
         return self.name().encode('ascii', errors='replace').decode()
 
-    def update_from_shipstation(self, data: typing.Optional[typing.Dict] = None) -> None:
-        'Set tracking number if item was sent, set ship_date if empty.'
+    def update_from_shipstation(self, data: typing.Optional[typing.Dict] = None, save: bool = True) -> bool:
+        '''
+        Set tracking number if item was sent, set ship_date if empty.
+
+        If *save* is False, changes are not saved, so caller can bulk update them. Returns True if lead was changed.
+        '''
         if data is None:
-            data = requests.get(
+            data = HttpClient('shipstation').get(
                 'https://ssapi.shipstation.com/shipments',
                 # params={'shipDateStart': '2017-12-30'},
                 params={'orderNumber': self.shipstation_order_number},
@@ -414,30 +428,34 @@ class Lead(models.Model, FulltextSearchMixin, CommentsMixin):
             data = data[0] if data else {}
 
         if not data:
-            return
+            return False
 
+        changed = False
         new_ship_date = data.get('shipDate')
         new_tracking_number = data.get('trackingNumber')
 
         if not self.ship_date and isinstance(new_ship_date, str):
             self.ship_date = parser.parse(new_ship_date).date()
-            self.save()
+            changed = True
 
         if data and isinstance(new_tracking_number, str) and self.usps_tracking_code != new_tracking_number:
             self.usps_tracking_code = new_tracking_number
-            self.tracking_info = None
+            ShipmentTracking.objects.filter(lead=self).delete()
             self.pi_delivered = False
             CustomerIOClient().send_lead_event(self, CustomerIOClient.EVENT_SHIPPED, tracking_code=self.usps_tracking_code)
             # self.pi_delivered = True
-            self.save()
             slack_new_tracking_number(self)
+            changed = True
+
+        if changed and save:
+            self.save()
+        return changed
 
     def update_pi_delivered(self, pi_delivered: bool, tracking_info_xml: str) -> None:
-        'Set pi_delivered and tracking_info'
+        'Set pi_delivered and delivery_date'
         if pi_delivered is None:
             return
 
-        self.tracking_info = tracking_info_xml
         self.pi_delivered = pi_delivered
 
         if pi_delivered:
@@ -456,17 +474,26 @@ class Lead(models.Model, FulltextSearchMixin, CommentsMixin):
         if not self.usps_tracking_code:
             return None
 
-        xml = '<TrackRequest USERID="039ADCRU4974"><TrackID ID="{}"></TrackID></TrackRequest>'.format(self.usps_tracking_code)
-        url = 'https://secure.shippingapis.com/ShippingAPI.dll'
+        return USPSTrackingClient().get_tracking_info([self.usps_tracking_code]).get(self.usps_tracking_code)
+
+    def get_shipment_tracking(self) -> typing.Optional[ShipmentTracking]:
+        'Get saved USPS tracking data for current tracking code'
         try:
-            response = requests.get(url, params={
-                'API': 'TrackV2',
-                'xml': xml,
-            })
-        except requests.exceptions.ConnectionError:
+            shipment_tracking = self.shipment_tracking
+        except ShipmentTracking.DoesNotExist:
+            return None
+
+        if shipment_tracking.tracking_code != self.usps_tracking_code:
             return None
+        return shipment_tracking
 
-        return response.text
+    def is_tracking_terminal(self) -> bool:
+        'Check if saved tracking info for current tracking code will not change anymore, so USPS does not have to be asked again.'
+        if not self.usps_tracking_code:
+            return False
+
+        shipment_tracking = self.get_shipment_tracking()
+        return shipment_tracking is not None and shipment_tracking.is_terminal()
 
     def get_pi_delivered_from_xml(self, tracking_info_xml: str) -> typing.Optional[bool]:
         'Check XML string secure.shippingapis.com if device had been delivered.'
@@ -514,9 +541,11 @@ class Lead(models.Model, FulltextSearchMixin, CommentsMixin):
         return self.status == Lead.STATUS_BANNED
 
     def sync_to_adsdb(self) -> bool:
+        'Queue push to ADSDB for all active lead accounts'
         result = False
         for lead_account in self.lead_accounts.filter(active=True):
-            result = lead_account.sync_to_adsdb()
+            adsdb_push, _ = lead_account.sync_to_adsdb()
+            result = result or adsdb_push is not None
 
         return result
 
@@ -562,3 +591,7 @@ class ReadOnlyLead(Lead):
         proxy = True
         verbose_name = 'Read-only Lead'
         verbose_name_plural = 'Read-only Leads'
+
+
+post_init.connect(snapshot_device_config_key, sender=Lead)
+post_save.connect(reset_device_config_cache, sender=Lead)
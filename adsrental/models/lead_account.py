@@ -5,25 +5,31 @@ import decimal
 import typing
 import datetime
 
-import requests
 from django.utils import timezone
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.utils import dateformat
 from django.contrib.contenttypes.fields import GenericRelation
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import post_init, post_save
 from django_bulk_update.query import BulkUpdateQuerySet
+from django_bulk_update.helper import bulk_update
 
 from adsrental.models.mixins import FulltextSearchMixin, CommentsMixin
 from adsrental.models.raspberry_pi import RaspberryPi
 from adsrental.models.lead import Lead
 from adsrental.models.comment import Comment
 from adsrental.models.lead_change import LeadChange
+from adsrental.models.bundler import Bundler
 from adsrental.models.bundler_payment import BundlerPayment
-from adsrental.utils import CustomerIOClient, AdsdbClient
+from adsrental.models.bundler_payment_total import BundlerPaymentTotal
+from adsrental.models.adsdb_push import AdsdbPush
+from adsrental.models.bundler_lead_stat import BundlerLeadStat
+from adsrental.utils import CustomerIOClient, AdsdbClient, DeviceConfigCacheHelper
+from adsrental.models.signals import reset_device_config_cache, snapshot_device_config_key
 
 if typing.TYPE_CHECKING:
     from adsrental.models.user import User
-    from adsrental.models.bundler import Bundler
 
 
 class LeadAccountQuerySet(BulkUpdateQuerySet):
@@ -48,6 +54,87 @@ class LeadAccountQuerySet(BulkUpdateQuerySet):
 
         return self
 
+    def get_adsdb_data_changed(self, updated_since, **kwargs):
+        'Get only adsdb accounts changed after *updated_since*. Returns lead accounts that have changes.'
+        adsdb_accounts = AdsdbClient().get_changed_accounts(updated_since, **kwargs)
+        adsdb_accounts_map = {}
+        for adsdb_account in adsdb_accounts:
+            adsdb_accounts_map[str(adsdb_account['id'])] = adsdb_account
+        lead_accounts = self.filter(adsdb_account_id__in=adsdb_accounts_map.keys())
+        for lead_account in lead_accounts:
+            lead_account.adsdb_account = adsdb_accounts_map.get(lead_account.adsdb_account_id, None)
+
+        return lead_accounts
+
+    def generate_payments(self, dry_run: bool = False, batch_size: int = 500) -> typing.List[BundlerPayment]:
+        'Same as *LeadAccount.bulk_generate_payments* for every lead account in queryset.'
+        return LeadAccount.bulk_generate_payments(list(self.select_related('lead')), dry_run=dry_run, batch_size=batch_size)
+
+    def bulk_ban(self, edited_by: User, reason: typing.Optional[str] = None, note: typing.Optional[str] = None, reasons: typing.Optional[typing.Dict[int, str]] = None) -> typing.List[LeadAccount]:
+        '''
+        Same as *LeadAccount.ban* for every lead account in queryset, but status changes, comments and
+        :model:`adsrental.LeadChange` are written in bulk in one transaction together with :model:`adsrental.BundlerLeadStat` counters.
+        customer.io events are queued after commit.
+
+        *reasons* - ban reason by lead account id, *reason* is used for missing ones
+
+        Returns banned lead accounts.
+        '''
+        now = timezone.localtime(timezone.now())
+        lead_accounts = [i for i in self.select_related('lead', 'lead__raspberry_pi') if i.status != LeadAccount.STATUS_BANNED]
+        if not lead_accounts:
+            return []
+
+        bundler_lead_stat_counters = {i.id: BundlerLeadStat.get_lead_account_counters(i) for i in lead_accounts}
+
+        comment_user = edited_by if edited_by and edited_by.is_authenticated else None
+        content_type = ContentType.objects.get_for_model(LeadAccount)
+        comments: typing.Dict[int, typing.List[Comment]] = {}
+        lead_changes = []
+        for lead_account in lead_accounts:
+            old_value = lead_account.status
+            lead_account.ban_reason = (reasons or {}).get(lead_account.id, reason)
+            lead_account.banned_date = now
+            lead_account.ban_note = note
+            lead_account.old_status = old_value
+            lead_account.status = LeadAccount.STATUS_BANNED
+            lead_account.updated = now
+            comments[lead_account.id] = [
+                Comment(content_type=content_type, object_id=str(lead_account.id), user=comment_user, text=f'Status changed from {old_value} to {lead_account.status}'),
+                Comment(content_type=content_type, object_id=str(lead_account.id), user=comment_user, text='Bundler payments generated'),
+            ]
+            lead_changes.append(LeadChange(lead=lead_account.lead, lead_account=lead_account, field=LeadChange.FIELD_STATUS, value=lead_account.status, old_value=old_value, edited_by=edited_by))
+
+        with transaction.atomic():
+            LeadAccount.bulk_generate_payments(lead_accounts)
+            Comment.objects.bulk_create([i for items in comments.values() for i in items])
+            LeadChange.objects.bulk_create(lead_changes)
+            for lead_account in lead_accounts:
+                lead_account.prepend_comments_cache(comments[lead_account.id])
+            bulk_update(lead_accounts, update_fields=['ban_reason', 'banned_date', 'ban_note', 'old_status', 'status', 'comments_cache', 'updated'])
+            BundlerLeadStat.bulk_update_counters(lead_accounts, bundler_lead_stat_counters)
+
+        active_accounts_map: typing.Dict[str, typing.List[LeadAccount]] = {}
+        for active_account in LeadAccount.objects.filter(
+                lead_id__in=set(i.lead_id for i in lead_accounts),
+                active=True,
+                status__in=LeadAccount.STATUSES_ACTIVE,
+        ):
+            active_accounts_map.setdefault(active_account.lead_id, []).append(active_account)
+
+        customerio_client = CustomerIOClient()
+        for lead_account in lead_accounts:
+            active_accounts = active_accounts_map.get(lead_account.lead_id)
+            if active_accounts:
+                active_accounts_str = '{} account{}'.format(
+                    ' and '.join([i.account_type for i in active_accounts]),
+                    's' if len(active_accounts) > 1 else '',
+                )
+                customerio_client.send_lead_event(lead_account.lead, CustomerIOClient.EVENT_BANNED_HAS_ACCOUNTS, account_type=lead_account.account_type, active_accounts=active_accounts_str)
+
+        DeviceConfigCacheHelper().delete_many([i.lead.raspberry_pi_id for i in lead_accounts])
+        return lead_accounts
+
 
 class LeadAccountManager(models.Manager.from_queryset(LeadAccountQuerySet)):
     pass
@@ -72,6 +159,15 @@ class LeadAccount(models.Model, FulltextSearchMixin, CommentsMixin):
     AUTO_BAN_DAYS_NO_ACTIVE_ACCOUNTS = 4
     MAX_WRONG_PASSWORD_CHANGE_COUNTER = 3
 
+    ADSDB_SYNC_STATUS_PENDING = 'Pending'
+    ADSDB_SYNC_STATUS_SYNCED = 'Synced'
+    ADSDB_SYNC_STATUS_FAILED = 'Failed'
+    ADSDB_SYNC_STATUS_CHOICES = [
+        (ADSDB_SYNC_STATUS_PENDING, 'Pending'),
+        (ADSDB_SYNC_STATUS_SYNCED, 'Synced'),
+        (ADSDB_SYNC_STATUS_FAILED, 'Failed'),
+    ]
+
     STATUS_QUALIFIED = 'Qualified'
     STATUS_DISQUALIFIED = 'Disqualified'
     STATUS_SCREENSHOT_DISQUALIFIED = 'Screenshot Disqualified'
@@ -188,6 +284,8 @@ class LeadAccount(models.Model, FulltextSearchMixin, CommentsMixin):
     bundler_paid = models.BooleanField(default=False, help_text='Is revenue paid to bundler.')
     adsdb_account_id = models.CharField(max_length=255, unique=True, blank=True, null=True, help_text='Corresponding Account ID in Adsdb database. used for syncing between databases.')
     sync_with_adsdb = models.BooleanField(default=False)
+    adsdb_sync_status = models.CharField(max_length=10, choices=ADSDB_SYNC_STATUS_CHOICES, null=True, blank=True, db_index=True, help_text='Status of last push to Adsdb')
+    adsdb_sync_date = models.DateTimeField(null=True, blank=True, help_text='Date of last successful push to Adsdb')
     active = models.BooleanField(default=True, help_text='If false, entry considered as deleted')
     primary = models.BooleanField(default=False, help_text='First added account for this lead')
     billed = models.BooleanField(default=False, help_text='Did lead receive his payment.')
@@ -206,6 +304,32 @@ class LeadAccount(models.Model, FulltextSearchMixin, CommentsMixin):
 
     objects = LeadAccountManager()
 
+    @classmethod
+    def from_db(cls, db: str, field_names: typing.List[str], values: typing.List[typing.Any]) -> LeadAccount:
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_adsdb_account_id = instance.__dict__.get('adsdb_account_id')  # pylint: disable=protected-access
+        return instance
+
+    def save(self, *args: typing.Any, **kwargs: typing.Any) -> None:  # pylint: disable=arguments-differ
+        '''
+        *adsdb_account_id* is assigned by Adsdb dispatcher with a targeted update,
+        so full save of instance loaded before that does not write it unless it was changed on instance.
+        '''
+        if (
+                not self._state.adding and
+                kwargs.get('update_fields') is None and
+                not kwargs.get('force_insert') and
+                hasattr(self, '_loaded_adsdb_account_id') and
+                self.adsdb_account_id == self._loaded_adsdb_account_id
+        ):
+            deferred_fields = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                i.name for i in self._meta.concrete_fields
+                if not i.primary_key and i.name != 'adsdb_account_id' and i.attname not in deferred_fields
+            ]
+        super().save(*args, **kwargs)
+        self._loaded_adsdb_account_id = self.adsdb_account_id
+
     def get_bundler(self) -> Bundler:
         return self.lead.bundler
 
@@ -239,7 +363,7 @@ class LeadAccount(models.Model, FulltextSearchMixin, CommentsMixin):
 
     def get_bundler_payment(self, bundler: Bundler) -> decimal.Decimal:
         result = decimal.Decimal('0.00')
-        if self.status == LeadAccount.STATUS_IN_PROGRESS and self.lead.raspberry_pi and not self.bundler_paid:
+        if self.status == LeadAccount.STATUS_IN_PROGRESS and self.lead.raspberry_pi_id and not self.bundler_paid:
             if self.account_type == LeadAccount.ACCOUNT_TYPE_FACEBOOK:
                 result += bundler.facebook_payment
             elif self.account_type == LeadAccount.ACCOUNT_TYPE_FACEBOOK_SCREENSHOT:
@@ -255,15 +379,16 @@ class LeadAccount(models.Model, FulltextSearchMixin, CommentsMixin):
 
         return result
 
-    def get_bundler_chargeback(self, bundler: Bundler) -> decimal.Decimal:
+    def is_chargeback_applicable(self, bundler: Bundler) -> bool:
+        'Check if bundler should be charged back for this banned lead account'
         if not self.bundler_paid:
-            return decimal.Decimal('0.00')
+            return False
 
         if not bundler.enable_chargeback or not self.in_progress_date or not self.banned_date:
-            return decimal.Decimal('0.00')
+            return False
 
         if self.in_progress_date < self.banned_date - datetime.timedelta(days=self.CHARGE_BACK_DAYS_OLD):
-            return decimal.Decimal('0.00')
+            return False
 
         if self.ban_reason not in (
                 LeadAccount.BAN_REASON_QUIT,
@@ -274,13 +399,25 @@ class LeadAccount(models.Model, FulltextSearchMixin, CommentsMixin):
                 LeadAccount.BAN_REASON_BAD_AD_ACCOUNT,
                 LeadAccount.BAN_REASON_DUPLICATE,
         ):
+            return False
+
+        return True
+
+    def get_bundler_chargeback(self, bundler: Bundler, save: bool = True, chargeback_enabled: typing.Optional[bool] = None) -> decimal.Decimal:
+        '''
+        Get chargeback amount and mark lead account as charged back.
+
+        If *save* is False, *charge_back* is set but not saved, so caller can bulk update it.
+        '''
+        if not self.is_chargeback_applicable(bundler):
             return decimal.Decimal('0.00')
 
         if not self.charge_back:
             self.charge_back = True
-            self.save()
+            if save:
+                self.save()
 
-        return - bundler.get_chargeback(self)
+        return - bundler.get_chargeback(self, chargeback_enabled=chargeback_enabled)
 
     def get_active_days(self):
         if not self.qualified_date:
@@ -294,7 +431,7 @@ class LeadAccount(models.Model, FulltextSearchMixin, CommentsMixin):
 
     def get_parent_bundler_payment(self, bundler: Bundler) -> decimal.Decimal:
         result = decimal.Decimal('0.00')
-        if bundler.parent_bundler and self.status == LeadAccount.STATUS_IN_PROGRESS and not self.bundler_paid:
+        if bundler.parent_bundler_id and self.status == LeadAccount.STATUS_IN_PROGRESS and not self.bundler_paid:
             if self.account_type == LeadAccount.ACCOUNT_TYPE_FACEBOOK:
                 result += bundler.facebook_parent_payment
             elif self.account_type == LeadAccount.ACCOUNT_TYPE_FACEBOOK_SCREENSHOT:
@@ -308,7 +445,7 @@ class LeadAccount(models.Model, FulltextSearchMixin, CommentsMixin):
 
     def get_second_parent_bundler_payment(self, bundler: Bundler) -> decimal.Decimal:
         result = decimal.Decimal('0.00')
-        if bundler.second_parent_bundler and self.status == LeadAccount.STATUS_IN_PROGRESS and not self.bundler_paid:
+        if bundler.second_parent_bundler_id and self.status == LeadAccount.STATUS_IN_PROGRESS and not self.bundler_paid:
             if self.account_type == self.ACCOUNT_TYPE_FACEBOOK:
                 result += bundler.facebook_second_parent_payment
             elif self.account_type == self.ACCOUNT_TYPE_FACEBOOK_SCREENSHOT:
@@ -322,7 +459,7 @@ class LeadAccount(models.Model, FulltextSearchMixin, CommentsMixin):
 
     def get_third_parent_bundler_payment(self, bundler: Bundler) -> decimal.Decimal:
         result = decimal.Decimal('0.00')
-        if bundler.third_parent_bundler and self.status == LeadAccount.STATUS_IN_PROGRESS and not self.bundler_paid:
+        if bundler.third_parent_bundler_id and self.status == LeadAccount.STATUS_IN_PROGRESS and not self.bundler_paid:
             if self.account_type == self.ACCOUNT_TYPE_FACEBOOK:
                 result += bundler.facebook_third_parent_payment
             elif self.account_type == self.ACCOUNT_TYPE_FACEBOOK_SCREENSHOT:
@@ -356,18 +493,17 @@ class LeadAccount(models.Model, FulltextSearchMixin, CommentsMixin):
 
         raise ValueError()
 
-    def sync_to_adsdb(self) -> typing.Tuple[typing.Optional[typing.Dict], typing.Dict]:
-        'Send lead account info to ADSDB'
-
+    def get_adsdb_push_data(self) -> typing.Optional[typing.Dict]:
+        'Get lead account info for ADSDB or None if lead account should not be synced'
         lead = self.get_lead()
         # if self.account_type == self.ACCOUNT_TYPE_GOOGLE:
-        #     return False, {}
+        #     return None
         if self.account_type == self.ACCOUNT_TYPE_AMAZON:
-            return None, {}
+            return None
         if self.status != self.STATUS_IN_PROGRESS:
-            return None, {}
+            return None
         if self.touch_count < lead.ADSDB_SYNC_MIN_TOUCH_COUNT and self.account_type in LeadAccount.ACCOUNT_TYPES_FACEBOOK:
-            return None, {}
+            return None
 
         bundler_adsdb_id = lead.bundler and lead.bundler.adsdb_id
         ec2_instance = lead.get_ec2_instance()
@@ -395,50 +531,31 @@ class LeadAccount(models.Model, FulltextSearchMixin, CommentsMixin):
             data['category_id'] = 1
             data['ad_manager_type_2'] = 7
 
-        auth = requests.auth.HTTPBasicAuth(settings.ADSDB_USERNAME, settings.ADSDB_PASSWORD)
+        return data
 
-        if not self.adsdb_account_id:
-            url = 'https://www.adsdb.io/api/v1/accounts/create-s'
-            response = requests.post(
-                url,
-                json=[data],
-                auth=auth,
-            )
-            try:
-                response_json = response.json()
-            except ValueError:
-                return ({'error': True, 'url': url, 'data': [data], 'text': response.text, 'status': response.status_code}, data)
-            if response.status_code == 200:
-                adsdb_account_id = response_json.get('account_data')[0]['id']
-                conflicting = LeadAccount.objects.filter(adsdb_account_id=adsdb_account_id).exclude(id=self.id)
-                if not conflicting:
-                    self.adsdb_account_id = adsdb_account_id
-                    self.save()
-            if response.status_code == 409:
-                adsdb_account_id = response_json.get('account_data')[0]['conflict_id']
-                conflicting = LeadAccount.objects.filter(adsdb_account_id=adsdb_account_id).exclude(id=self.id)
-                if not conflicting:
-                    self.adsdb_account_id = adsdb_account_id
-                    self.save()
-            return (response_json, data)
-
-        request_data = {
-            'account_id': int(self.adsdb_account_id),
-            'data': data,
-        }
-
-        url = 'https://www.adsdb.io/api/v1/accounts/update-s'
-        response = requests.post(
-            url,
-            json=request_data,
-            auth=auth,
-        )
-        try:
-            response_json = response.json()
-        except ValueError:
-            return ({'error': True, 'url': url, 'data': request_data, 'text': response.text, 'status': response.status_code}, request_data)
+    def sync_to_adsdb(self) -> typing.Tuple[typing.Optional[AdsdbPush], typing.Dict]:
+        '''
+        Queue lead account info push to ADSDB, pushed by *adsdb_dispatch* cron.
+        If push for this lead account is already pending, it is reused, so updates are coalesced.
+
+        Returns queued :model:`adsrental.AdsdbPush` and current data, or None if lead account should not be synced.
+        '''
+        data = self.get_adsdb_push_data()
+        if data is None:
+            return None, {}
 
-        return (response_json, request_data)
+        adsdb_push = AdsdbPush.objects.filter(lead_account=self, status=AdsdbPush.STATUS_PENDING).first()
+        if adsdb_push:
+            adsdb_push.updates += 1
+            adsdb_push.requested = timezone.now()
+            adsdb_push.save()
+        else:
+            adsdb_push = AdsdbPush.objects.create(lead_account=self)
+
+        if self.adsdb_sync_status != self.ADSDB_SYNC_STATUS_PENDING:
+            self.adsdb_sync_status = self.ADSDB_SYNC_STATUS_PENDING
+            LeadAccount.objects.filter(id=self.id).update(adsdb_sync_status=self.adsdb_sync_status)
+        return adsdb_push, data
 
     def set_correct_password(self, new_password: str, edited_by: User) -> None:
         'Change password, marks as correct, create LeadChange instance.'
@@ -474,63 +591,85 @@ class LeadAccount(models.Model, FulltextSearchMixin, CommentsMixin):
         self.add_comment(f'Security checkpoint reported as resolved', edited_by)
         LeadChange(lead=self.lead, lead_account=self, field=LeadChange.FIELD_SECURITY_CHECKPOINT, value='False', old_value=old_value, edited_by=edited_by).save()
 
-    def generate_payments(self):
-        bundler = self.get_bundler()
-        payment_datetime = self.in_progress_date or timezone.now()
+    def generate_payments(self) -> typing.List[BundlerPayment]:
+        'Create missing bundler payments for lead account. Returns created payments.'
+        return LeadAccount.bulk_generate_payments([self])
+
+    @classmethod
+    def bulk_generate_payments(cls, lead_accounts: typing.Sequence[LeadAccount], dry_run: bool = False, batch_size: int = 500) -> typing.List[BundlerPayment]:
+        '''
+        Create missing :model:`adsrental.BundlerPayment` entries for every lead account: main, parents split and chargeback.
+
+        Bundlers, existing payments and chargeback counters are prefetched, payments are calculated in memory
+        and new ones are created with *bulk_create* in chunks of *batch_size* together with :model:`adsrental.BundlerPaymentTotal` update.
+        Payment with the same bundler, lead account and type is never created twice.
+
+        If *dry_run* is set, nothing is saved. Returns created payments, or payments that would be created.
+        '''
+        lead_accounts = [i for i in lead_accounts if i.lead.bundler_id]
+        if not lead_accounts:
+            return []
+
+        bundlers = Bundler.objects.in_bulk(set(i.lead.bundler_id for i in lead_accounts))
+        chargeback_counts: typing.Optional[typing.Dict[typing.Tuple[int, typing.Optional[int]], int]] = None
+        if any(i.is_chargeback_applicable(bundlers[i.lead.bundler_id]) for i in lead_accounts):
+            chargeback_counts = Bundler.get_chargeback_counts(bundlers.keys())
+
         result = []
-        payment = self.get_bundler_payment(bundler)
-
-        if payment:
-            entry, _ = BundlerPayment.objects.get_or_create(
-                bundler=bundler,
-                lead_account=self,
-                payment_type=BundlerPayment.PAYMENT_TYPE_ACCOUNT_MAIN,
-                defaults=dict(payment=payment, datetime=payment_datetime)
-            )
-            result.append(entry)
-
-        parent_payment = self.get_parent_bundler_payment(bundler)
-        if parent_payment:
-            parent_bundler = bundler.parent_bundler  # pylint: disable=no-member
-            entry, _ = BundlerPayment.objects.get_or_create(
-                bundler=parent_bundler,
-                lead_account=self,
-                payment_type=BundlerPayment.PAYMENT_TYPE_ACCOUNT_PARENT,
-                defaults=dict(payment=parent_payment, datetime=payment_datetime)
-            )
-            result.append(entry)
-
-        second_parent_payment = self.get_second_parent_bundler_payment(bundler)
-        if second_parent_payment:
-            second_parent_bundler = bundler.second_parent_bundler  # pylint: disable=no-member
-            entry, _ = BundlerPayment.objects.get_or_create(
-                bundler=second_parent_bundler,
-                lead_account=self,
-                payment_type=BundlerPayment.PAYMENT_TYPE_ACCOUNT_SECOND_PARENT,
-                defaults=dict(payment=second_parent_payment, datetime=payment_datetime)
-            )
-            result.append(entry)
-
-        third_parent_payment = self.get_third_parent_bundler_payment(bundler)
-        if third_parent_payment:
-            third_parent_bundler = bundler.third_parent_bundler  # pylint: disable=no-member
-            entry, _ = BundlerPayment.objects.get_or_create(
-                bundler=third_parent_bundler,
-                lead_account=self,
-                payment_type=BundlerPayment.PAYMENT_TYPE_ACCOUNT_THIRD_PARENT,
-                defaults=dict(payment=third_parent_payment, datetime=payment_datetime)
-            )
-            result.append(entry)
-
-        chargeback = self.get_bundler_chargeback(bundler)
-        if chargeback:
-            entry, _ = BundlerPayment.objects.get_or_create(
-                bundler=bundler,
-                lead_account=self,
-                payment_type=BundlerPayment.PAYMENT_TYPE_ACCOUNT_CHARGEBACK,
-                defaults=dict(payment=chargeback, datetime=self.banned_date)
-            )
-            result.append(entry)
+        charged_back_lead_accounts = []
+        with transaction.atomic():
+            for start in range(0, len(lead_accounts), batch_size):
+                batch = lead_accounts[start:start + batch_size]
+                existing_keys = set(BundlerPayment.objects.filter(
+                    lead_account_id__in=[i.id for i in batch],
+                ).values_list('bundler_id', 'lead_account_id', 'payment_type'))
+
+                new_payments = []
+                for lead_account in batch:
+                    bundler = bundlers[lead_account.lead.bundler_id]
+                    payment_datetime = lead_account.in_progress_date or timezone.now()
+                    payments = [
+                        (bundler.id, BundlerPayment.PAYMENT_TYPE_ACCOUNT_MAIN, lead_account.get_bundler_payment(bundler), payment_datetime),
+                        (bundler.parent_bundler_id, BundlerPayment.PAYMENT_TYPE_ACCOUNT_PARENT, lead_account.get_parent_bundler_payment(bundler), payment_datetime),
+                        (bundler.second_parent_bundler_id, BundlerPayment.PAYMENT_TYPE_ACCOUNT_SECOND_PARENT, lead_account.get_second_parent_bundler_payment(bundler), payment_datetime),
+                        (bundler.third_parent_bundler_id, BundlerPayment.PAYMENT_TYPE_ACCOUNT_THIRD_PARENT, lead_account.get_third_parent_bundler_payment(bundler), payment_datetime),
+                    ]
+                    if lead_account.is_chargeback_applicable(bundler):
+                        charge_back = lead_account.charge_back
+                        chargeback = lead_account.get_bundler_chargeback(
+                            bundler,
+                            save=False,
+                            chargeback_enabled=bundler.is_chargeback_enabled(lead_account, chargeback_counts),
+                        )
+                        if not charge_back:
+                            charged_back_lead_accounts.append(lead_account)
+                        payments.append((bundler.id, BundlerPayment.PAYMENT_TYPE_ACCOUNT_CHARGEBACK, chargeback, lead_account.banned_date))
+
+                    for bundler_id, payment_type, payment, payment_datetime in payments:
+                        if not payment:
+                            continue
+                        key = (bundler_id, lead_account.id, payment_type)
+                        if key in existing_keys:
+                            continue
+                        existing_keys.add(key)
+                        new_payments.append(BundlerPayment(
+                            bundler_id=bundler_id,
+                            lead_account=lead_account,
+                            payment_type=payment_type,
+                            payment=payment,
+                            datetime=payment_datetime,
+                        ))
+                        if chargeback_counts is not None:
+                            chargeback_counts[(bundler_id, None)] = chargeback_counts.get((bundler_id, None), 0) + 1
+                            chargeback_counts[(bundler_id, lead_account.id)] = chargeback_counts.get((bundler_id, lead_account.id), 0) + 1
+
+                if not dry_run:
+                    BundlerPayment.objects.bulk_create(new_payments)
+                    BundlerPaymentTotal.add_payments(new_payments)
+                result.extend(new_payments)
+
+            if not dry_run:
+                bulk_update(charged_back_lead_accounts, update_fields=['charge_back'])
 
         return result
 
@@ -549,6 +688,7 @@ class LeadAccount(models.Model, FulltextSearchMixin, CommentsMixin):
         if self.status != Lead.STATUS_BANNED:
             self.old_status = self.status
 
+        bundler_lead_stat_counters = BundlerLeadStat.get_lead_account_counters(self)
         self.status = value
 
         self.add_comment(f'Status changed from {old_value} to {self.status}', edited_by)
@@ -558,6 +698,7 @@ class LeadAccount(models.Model, FulltextSearchMixin, CommentsMixin):
             self.add_comment(f'Bundler payments generated', edited_by)
 
         self.save()
+        BundlerLeadStat.update_counters(self, bundler_lead_stat_counters)
         LeadChange(lead=self.lead, lead_account=self, field=LeadChange.FIELD_STATUS, value=value, old_value=old_value, edited_by=edited_by).save()
         return True
 
@@ -566,11 +707,13 @@ class LeadAccount(models.Model, FulltextSearchMixin, CommentsMixin):
         if self.status == LeadAccount.STATUS_BANNED:
             return False
         now = timezone.localtime(timezone.now())
+        bundler_lead_stat_counters = BundlerLeadStat.get_lead_account_counters(self)
         self.ban_reason = reason
         self.banned_date = now
         self.ban_note = note
 
         self.save()
+        BundlerLeadStat.update_counters(self, bundler_lead_stat_counters)
 
         result = self.set_status(LeadAccount.STATUS_BANNED, edited_by)
         active_accounts = LeadAccount.get_active_lead_accounts(self.lead)
@@ -593,9 +736,11 @@ class LeadAccount(models.Model, FulltextSearchMixin, CommentsMixin):
 
     def unban(self, edited_by: User) -> bool:
         'Restores lead account previous status before banned.'
+        bundler_lead_stat_counters = BundlerLeadStat.get_lead_account_counters(self)
         self.ban_reason = None
         self.ban_note = None
         self.save()
+        BundlerLeadStat.update_counters(self, bundler_lead_stat_counters)
         result = self.set_status(self.old_status or LeadAccount.STATUS_QUALIFIED, edited_by)
         if result:
             self.lead.unban(edited_by)
@@ -620,10 +765,12 @@ class LeadAccount(models.Model, FulltextSearchMixin, CommentsMixin):
         result = self.set_status(new_status, edited_by)
         if result:
             self.lead.qualify(edited_by)
+            bundler_lead_stat_counters = BundlerLeadStat.get_lead_account_counters(self)
             if not self.qualified_date:
                 self.qualified_date = timezone.now()
                 self.add_comment('Qualified', edited_by)
             self.save()
+            BundlerLeadStat.update_counters(self, bundler_lead_stat_counters)
 
         return result
 
@@ -689,3 +836,7 @@ class ReadOnlyLeadAccount(LeadAccount):
         proxy = True
         verbose_name = 'Read-only Lead Account'
         verbose_name_plural = 'Read-only Lead Accounts'
+
+
+post_init.connect(snapshot_device_config_key, sender=LeadAccount)
+post_save.connect(reset_device_config_cache, sender=LeadAccount)
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import calendar
+import datetime
+import typing
+
+from django.db import models
+from django_bulk_update.helper import bulk_update
+
+from adsrental.models.lead_history import LeadHistory
+
+
+class LeadCheckMonth(models.Model):
+    '''
+    Daily check counters of :model:`adsrental.LeadHistory` for one lead and month packed into one row.
+
+    Every counter from *LeadHistory.CHECK_FIELDS* is stored as one byte per day of month,
+    so month-level reads get one small row per lead instead of a row per day.
+    Days are packed when they are finalized, see *LeadHistoryMonth.apply_finalized_days*.
+    '''
+    DAYS = 31
+    MAX_VALUE = 255
+    BULK_BATCH_SIZE = 1000
+
+    lead = models.ForeignKey('adsrental.Lead', on_delete=models.CASCADE)
+    date = models.DateField(db_index=True, help_text='First day of month')
+    days = models.PositiveIntegerField(default=0, help_text='Bitmap of packed days, lowest bit is first day of month')
+    checks = models.BinaryField(help_text='Daily counters, one byte per day for every counter in LeadHistory.CHECK_FIELDS')
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = (
+            ('lead', 'date'),
+        )
+
+    def __str__(self) -> str:
+        return f'{self.lead_id} {self.date}'
+
+    def get_checks_data(self) -> bytearray:
+        if not self.checks:
+            return bytearray(len(LeadHistory.CHECK_FIELDS) * self.DAYS)
+        return bytearray(self.checks)
+
+    def has_day(self, day: int) -> bool:
+        return bool(self.days >> (day - 1) & 1)
+
+    def get_day_numbers(self) -> typing.List[int]:
+        'Get days of month that have packed stats'
+        return [day for day in range(1, self.DAYS + 1) if self.has_day(day)]
+
+    def get_counter(self, field_name: str) -> typing.List[int]:
+        'Get values of one counter for every day of month, index 0 is first day'
+        offset = LeadHistory.CHECK_FIELDS.index(field_name) * self.DAYS
+        return list(self.get_checks_data()[offset:offset + self.DAYS])
+
+    def get_day_checks(self, day: int) -> typing.Dict[str, int]:
+        'Get all counters for day of month'
+        checks_data = self.get_checks_data()
+        return {
+            field_name: checks_data[index * self.DAYS + day - 1]
+            for index, field_name in enumerate(LeadHistory.CHECK_FIELDS)
+        }
+
+    def set_day_checks(self, day: int, checks: typing.Dict[str, int]) -> None:
+        'Pack counters for day of month, values above *MAX_VALUE* are capped'
+        checks_data = self.get_checks_data()
+        for index, field_name in enumerate(LeadHistory.CHECK_FIELDS):
+            checks_data[index * self.DAYS + day - 1] = max(0, min(checks.get(field_name, 0), self.MAX_VALUE))
+        self.checks = bytes(checks_data)
+        self.days |= 1 << (day - 1)
+
+    def to_lead_histories(self) -> typing.List[LeadHistory]:
+        'Get unsaved finalized :model:`adsrental.LeadHistory` for every packed day'
+        result = []
+        for day in self.get_day_numbers():
+            result.append(LeadHistory(
+                lead_id=self.lead_id,
+                date=self.date.replace(day=day),
+                finalized=True,
+                **self.get_day_checks(day),
+            ))
+        return result
+
+    @classmethod
+    def store_lead_histories(cls, lead_histories: typing.Iterable[LeadHistory]) -> int:
+        'Pack counters of *lead_histories* into month rows, creating missing ones. Returns amount of saved rows.'
+        lead_histories = list(lead_histories)
+        if not lead_histories:
+            return 0
+
+        lead_ids = {i.lead_id for i in lead_histories}
+        dates = {i.date.replace(day=1) for i in lead_histories}
+        items_map = {}
+        for item in cls.objects.filter(lead_id__in=lead_ids, date__in=dates):
+            items_map[(item.lead_id, item.date)] = item
+
+        new_items = {}
+        changed_items = {}
+        for lead_history in lead_histories:
+            key = (lead_history.lead_id, lead_history.date.replace(day=1))
+            item = items_map.get(key)
+            if not item:
+                item = cls(lead_id=key[0], date=key[1])
+                items_map[key] = item
+                new_items[key] = item
+            elif key not in new_items:
+                changed_items[key] = item
+            item.set_day_checks(lead_history.date.day, {i: getattr(lead_history, i) for i in LeadHistory.CHECK_FIELDS})
+
+        cls.objects.bulk_create(new_items.values(), batch_size=cls.BULK_BATCH_SIZE)
+        bulk_update(list(changed_items.values()), update_fields=['days', 'checks'], batch_size=cls.BULK_BATCH_SIZE)
+        return len(new_items) + len(changed_items)
+
+    @classmethod
+    def get_lead_histories(cls, lead_ids: typing.Iterable[str], date: datetime.date) -> typing.List[LeadHistory]:
+        '''
+        Get :model:`adsrental.LeadHistory` of *lead_ids* for month of *date* ordered by date.
+        Finalized days are decoded from packed rows, only days that are not packed yet are read from daily table.
+        Leads with finalized days missing in packed row, for example before *backfill_lead_check_months* run,
+        get these days from daily table as well.
+        '''
+        lead_ids = list(lead_ids)
+        if not lead_ids:
+            return []
+
+        date_month = date.replace(day=1)
+        month_days = calendar.monthrange(date_month.year, date_month.month)[1]
+        today = datetime.date.today()
+        finalized_days = month_days
+        if (today.year, today.month) == (date_month.year, date_month.month):
+            finalized_days = today.day - 1
+        elif today < date_month:
+            finalized_days = 0
+        finalized_days_mask = (1 << finalized_days) - 1
+
+        result = []
+        packed_keys = set()
+        complete_lead_ids = set()
+        for item in cls.objects.filter(lead_id__in=lead_ids, date=date_month):
+            if item.days & finalized_days_mask == finalized_days_mask:
+                complete_lead_ids.add(item.lead_id)
+            for lead_history in item.to_lead_histories():
+                packed_keys.add((lead_history.lead_id, lead_history.date))
+                result.append(lead_history)
+
+        incomplete_lead_ids = [i for i in lead_ids if i not in complete_lead_ids]
+        for lead_history in LeadHistory.get_queryset_for_month(date_month.year, date_month.month, lead_ids=lead_ids).filter(
+                models.Q(finalized=False) | models.Q(lead_id__in=incomplete_lead_ids),
+        ):
+            if (lead_history.lead_id, lead_history.date) not in packed_keys:
+                result.append(lead_history)
+
+        result.sort(key=lambda x: (x.date, x.lead_id))
+        return result
@@ -1,16 +1,21 @@
 'LeadHistory class'
+from __future__ import annotations
+
+import os
 import datetime
 import decimal
 import typing
 
 from dateutil.relativedelta import relativedelta
-from django.db import models
+from django.db import models, connection, transaction
+from django.db.models import Count, Q
 from django.conf import settings
 from django.utils import timezone
 from django_bulk_update.manager import BulkUpdateManager
 
 from adsrental.models.lead import Lead
 from adsrental.models.lead_account import LeadAccount
+from adsrental.models.raspberry_pi import RaspberryPi
 
 
 class LeadHistory(models.Model):
@@ -21,6 +26,22 @@ class LeadHistory(models.Model):
     ONLINE_CHECKS_MIN = 3
     WRONG_PASSWORD_CHECKS_MIN = 21
     SEC_CHECKPOINT_CHECKS_MIN = 21
+    CHECK_FIELDS = [
+        'checks_offline',
+        'checks_online',
+        'checks_wrong_password',
+        'checks_wrong_password_facebook',
+        'checks_wrong_password_google',
+        'checks_wrong_password_amazon',
+        'checks_sec_checkpoint_facebook',
+        'checks_sec_checkpoint_google',
+        'checks_sec_checkpoint_amazon',
+    ]
+    UPSERT_BATCH_SIZE = 500
+    CHECKS_PER_DAY = 24
+    LOG_PINGS_PER_CHECK = 20
+    LOG_ONLINE_MARKER = b'"result": true'
+    LOG_WRONG_PASSWORD_MARKER = b'Wrong password'
 
     MAX_PAYMENT = decimal.Decimal('25.00')
     NEW_MAX_PAYMENT = decimal.Decimal('15.00')
@@ -31,6 +52,9 @@ class LeadHistory(models.Model):
     class Meta:
         verbose_name = 'Lead Timestamp'
         verbose_name_plural = 'Lead Timestamps'
+        unique_together = (
+            ('lead', 'date'),
+        )
 
     lead = models.ForeignKey(Lead, on_delete=models.CASCADE)
     date = models.DateField(db_index=True)
@@ -45,6 +69,7 @@ class LeadHistory(models.Model):
     checks_sec_checkpoint_amazon = models.IntegerField(default=0)
     amount = models.DecimalField(default=decimal.Decimal('0.00'), max_digits=8, decimal_places=4, help_text='Sum to be paid to lead')
     note = models.TextField(blank=True, null=True, help_text='Note about payment calc')
+    finalized = models.BooleanField(default=False, db_index=True, help_text='Day is over and its amount is added to LeadHistoryMonth totals')
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
@@ -80,16 +105,147 @@ class LeadHistory(models.Model):
                 if lead_account.account_type == LeadAccount.ACCOUNT_TYPE_AMAZON:
                     self.checks_sec_checkpoint_amazon += 1
 
+    @classmethod
+    def get_checks_for_leads(cls, leads: models.query.QuerySet) -> typing.Dict[str, typing.Dict[str, int]]:
+        '''
+        Get check increments for every lead in *leads* with two queries, same as *check_lead* does for one entry.
+        Lead accounts with wrong password or security checkpoint are counted by DB grouped by lead and account type.
+        '''
+        result = {}
+        online_dt = timezone.now() - datetime.timedelta(minutes=RaspberryPi.online_minutes_ttl)
+        for lead_id, status, raspberry_pi_id, first_seen, last_seen in leads.values_list(
+                'leadid', 'status', 'raspberry_pi_id', 'raspberry_pi__first_seen', 'raspberry_pi__last_seen'):
+            checks = dict.fromkeys(cls.CHECK_FIELDS, 0)
+            result[lead_id] = checks
+            if not Lead.is_status_active(status) or raspberry_pi_id is None:
+                checks['checks_offline'] = 1
+                continue
+
+            if first_seen is not None and last_seen is not None and last_seen > online_dt:
+                checks['checks_online'] = 1
+            else:
+                checks['checks_offline'] = 1
+
+        lead_accounts_stats = LeadAccount.objects.filter(
+            lead__in=leads.filter(status__in=Lead.STATUSES_ACTIVE, raspberry_pi__isnull=False).values('pk'),
+        ).filter(
+            Q(wrong_password_date__isnull=False) | Q(security_checkpoint_date__isnull=False),
+        ).values('lead_id', 'account_type').annotate(
+            wrong_password=Count('id', filter=Q(wrong_password_date__isnull=False)),
+            sec_checkpoint=Count('id', filter=Q(security_checkpoint_date__isnull=False)),
+        ).order_by()
+        for row in lead_accounts_stats:
+            checks = result.get(row['lead_id'])
+            if checks is None:
+                continue
+            suffix = None
+            if row['account_type'] == LeadAccount.ACCOUNT_TYPE_GOOGLE:
+                suffix = 'google'
+            if row['account_type'] in LeadAccount.ACCOUNT_TYPES_FACEBOOK:
+                suffix = 'facebook'
+            if row['account_type'] == LeadAccount.ACCOUNT_TYPE_AMAZON:
+                suffix = 'amazon'
+            if suffix is None:
+                continue
+            checks[f'checks_wrong_password_{suffix}'] += row['wrong_password']
+            checks['checks_wrong_password'] += row['wrong_password']
+            checks[f'checks_sec_checkpoint_{suffix}'] += row['sec_checkpoint']
+
+        return result
+
+    @staticmethod
+    def get_log_path(rpid: str, date: datetime.date) -> str:
+        'Get path to RaspberryPi log for given date'
+        return os.path.join(settings.RASPBERRY_PI_LOG_PATH, rpid, '{}.log'.format(date.strftime('%Y%m%d')))
+
+    @classmethod
+    def scan_log(cls, log_path: str) -> typing.Tuple[int, bool, int]:
+        'Read log once line by line. Returns amount of online pings, wrong password flag and bytes read.'
+        pings_online = 0
+        wrong_password = False
+        size = 0
+        if not os.path.exists(log_path):
+            return pings_online, wrong_password, size
+
+        with open(log_path, 'rb') as log_file:
+            for line in log_file:
+                size += len(line)
+                pings_online += line.count(cls.LOG_ONLINE_MARKER)
+                if not wrong_password and cls.LOG_WRONG_PASSWORD_MARKER in line:
+                    wrong_password = True
+
+        return pings_online, wrong_password, size
+
+    @classmethod
+    def get_checks_from_log(cls, pings_online: int, wrong_password: bool) -> typing.Dict[str, int]:
+        'Get day checks from log scan result. Does not check wrong password per account type and potentially inaccurate.'
+        checks_online = min(pings_online // cls.LOG_PINGS_PER_CHECK, cls.CHECKS_PER_DAY)
+        return dict(
+            checks_online=checks_online,
+            checks_offline=cls.CHECKS_PER_DAY - checks_online,
+            checks_wrong_password=1 if wrong_password else 0,
+        )
+
+    @classmethod
+    def get_upsert_sql(cls, rows_count: int) -> str:
+        '''
+        Get multi-row insert that adds check increments to existing (lead, date) rows instead of failing on duplicate.
+        Uses ON DUPLICATE KEY UPDATE on MySQL and ON CONFLICT on other backends.
+        '''
+        quote_name = connection.ops.quote_name
+        fields = ['lead', 'date'] + cls.CHECK_FIELDS + ['amount', 'finalized', 'created', 'updated']
+        columns = [cls._meta.get_field(i).column for i in fields]
+        check_columns = [cls._meta.get_field(i).column for i in cls.CHECK_FIELDS]
+        updated_column = cls._meta.get_field('updated').column
+        placeholders = '({})'.format(', '.join(['%s'] * len(columns)))
+        sql = 'INSERT INTO {table} ({columns}) VALUES {values}'.format(
+            table=quote_name(cls._meta.db_table),
+            columns=', '.join(quote_name(i) for i in columns),
+            values=', '.join([placeholders] * rows_count),
+        )
+        if connection.vendor == 'mysql':
+            updates = ['{0} = {0} + VALUES({0})'.format(quote_name(i)) for i in check_columns]
+            updates.append('{0} = VALUES({0})'.format(quote_name(updated_column)))
+            return '{} ON DUPLICATE KEY UPDATE {}'.format(sql, ', '.join(updates))
+
+        updates = ['{0} = {1}.{0} + excluded.{0}'.format(quote_name(i), quote_name(cls._meta.db_table)) for i in check_columns]
+        updates.append('{0} = excluded.{0}'.format(quote_name(updated_column)))
+        return '{} ON CONFLICT ({}, {}) DO UPDATE SET {}'.format(
+            sql,
+            quote_name(cls._meta.get_field('lead').column),
+            quote_name(cls._meta.get_field('date').column),
+            ', '.join(updates),
+        )
+
+    @classmethod
+    def upsert_for_leads(cls, leads: models.query.QuerySet, date: typing.Optional[datetime.date] = None) -> int:
+        '''
+        Create or update stats for all *leads* for *date*, today by default.
+        Increments are applied atomically by DB with one statement per *UPSERT_BATCH_SIZE* leads,
+        so concurrent runs cannot create duplicates or lose checks. Returns amount of leads processed.
+        '''
+        if date is None:
+            date = datetime.date.today()
+        now = cls._meta.get_field('updated').get_db_prep_value(timezone.now(), connection)
+        date = cls._meta.get_field('date').get_db_prep_value(date, connection)
+        amount = cls._meta.get_field('amount').get_db_prep_save(decimal.Decimal('0.00'), connection)
+        finalized = cls._meta.get_field('finalized').get_db_prep_save(False, connection)
+        checks_map = cls.get_checks_for_leads(leads)
+        rows = []
+        for lead_id, checks in checks_map.items():
+            rows.append([lead_id, date] + [checks[i] for i in cls.CHECK_FIELDS] + [amount, finalized, now, now])
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            for index in range(0, len(rows), cls.UPSERT_BATCH_SIZE):
+                batch = rows[index:index + cls.UPSERT_BATCH_SIZE]
+                cursor.execute(cls.get_upsert_sql(len(batch)), [value for row in batch for value in row])
+
+        return len(rows)
+
     @classmethod
     def upsert_for_lead(cls, lead: Lead) -> None:
         'Create or update stats for this entry'
-        today = datetime.date.today()
-        lead_history = cls.objects.filter(lead=lead, date=today).first()
-        if not lead_history:
-            lead_history = cls(lead=lead, date=today)
-
-        lead_history.check_lead()
-        lead_history.save()
+        cls.upsert_for_leads(Lead.objects.filter(pk=lead.pk))
 
     def is_online(self) -> bool:
         'Check iff device was online for more than 12 checks.'
@@ -119,6 +275,25 @@ class LeadHistory(models.Model):
 
         return False
 
+    @classmethod
+    def get_online_filter(cls) -> Q:
+        'Same as *is_online* for querysets'
+        return Q(checks_online__gt=cls.ONLINE_CHECKS_MIN)
+
+    @classmethod
+    def get_wrong_password_filter(cls) -> Q:
+        'Same as *is_wrong_password* for querysets'
+        return Q(checks_wrong_password_facebook__gte=cls.WRONG_PASSWORD_CHECKS_MIN)
+
+    @classmethod
+    def get_sec_checkpoint_filter(cls) -> Q:
+        'Same as *is_sec_checkpoint* for querysets'
+        return (
+            Q(checks_sec_checkpoint_facebook__gte=cls.SEC_CHECKPOINT_CHECKS_MIN) |
+            Q(checks_sec_checkpoint_google__gte=cls.SEC_CHECKPOINT_CHECKS_MIN) |
+            Q(checks_sec_checkpoint_amazon__gte=cls.SEC_CHECKPOINT_CHECKS_MIN)
+        )
+
     def is_sec_checkpoint(self) -> bool:
         'Check if security checkpoint for this day was reported at least 3 times.'
         if self.checks_sec_checkpoint_facebook >= self.SEC_CHECKPOINT_CHECKS_MIN:
@@ -147,18 +322,49 @@ class LeadHistory(models.Model):
     def get_first_day(self) -> datetime.date:
         return self.date.replace(day=1)
 
-    def get_amount_with_note(self) -> typing.Tuple[decimal.Decimal, str]:
+    @classmethod
+    def calculate_amounts(cls, lead_histories: typing.Iterable[LeadHistory]) -> typing.List[LeadHistory]:
+        '''
+        Set *amount* and *note* for all *lead_histories*, can contain entries of many leads for any dates.
+        Leads and their active lead accounts are loaded once for all entries, so result is the same as calling
+        *get_amount_with_note* for every entry, but with two queries in total.
+        '''
+        lead_histories = list(lead_histories)
+        lead_ids = {i.lead_id for i in lead_histories}
+        missing_lead_ids = {i.lead_id for i in lead_histories if not cls.lead.is_cached(i)}
+        leads_map = {}
+        if missing_lead_ids:
+            leads_map = Lead.objects.in_bulk(missing_lead_ids)
+
+        lead_accounts_map: typing.Dict[str, typing.List[LeadAccount]] = {}
+        for lead_account in LeadAccount.objects.filter(lead_id__in=lead_ids, active=True).order_by('id'):
+            lead_accounts_map.setdefault(lead_account.lead_id, []).append(lead_account)
+
+        for lead_history in lead_histories:
+            if lead_history.lead_id in leads_map:
+                lead_history.lead = leads_map[lead_history.lead_id]
+            lead_history.amount, lead_history.note = lead_history.get_amount_with_note(lead_accounts_map.get(lead_history.lead_id, []))
+
+        return lead_histories
+
+    def get_amount_with_note(self, lead_accounts: typing.Optional[typing.Iterable[LeadAccount]] = None) -> typing.Tuple[decimal.Decimal, str]:
+        '''
+        Calculate payment to lead for this day with explanation.
+        *lead_accounts* are active lead accounts of lead, queried if not provided. Use *calculate_amounts* for many entries.
+        '''
         result = decimal.Decimal('0.00')
         if not self.is_online():
             return result, 'Account is offline (${})'.format(result)
 
-        raspberry_pi = self.lead.raspberry_pi
-        if not raspberry_pi:
+        if not self.lead.raspberry_pi_id:
             return result, 'RaspberryPi does not exist (${})'.format(result)
 
+        if lead_accounts is None:
+            lead_accounts = self.lead.lead_accounts.filter(active=True)
+
         days_in_month = (self.get_last_day() - self.get_first_day()).days + 1
         note = []
-        for lead_account in self.lead.lead_accounts.filter(active=True):
+        for lead_account in lead_accounts:
             if not lead_account.in_progress_date:
                 note.append('{type} account is not in-progress yet ($0.00)'.format(
                     type=lead_account.get_account_type_display(),
@@ -4,13 +4,15 @@ import datetime
 import decimal
 import typing
 
+from dateutil.relativedelta import relativedelta
 from django.utils import timezone
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 from django_bulk_update.manager import BulkUpdateManager
 from django_bulk_update.helper import bulk_update
 
 from adsrental.models.lead_history import LeadHistory
+from adsrental.models.lead_check_month import LeadCheckMonth
 from adsrental.models.mixins import FulltextSearchMixin
 from adsrental.models.lead import Lead
 from adsrental.models.lead_account import LeadAccount
@@ -20,6 +22,9 @@ class LeadHistoryMonth(models.Model, FulltextSearchMixin):
     '''
     Aggregated monthly stats for :model:`adsrental.Lead`.
     Used to calculate payments to leads.
+
+    Totals include only finalized days. They are updated hourly by *apply_finalized_days* when a day is over,
+    and fully recalculated by *aggregate_month*.
     '''
     class Meta:
         verbose_name = 'Lead History Month'
@@ -29,6 +34,18 @@ class LeadHistoryMonth(models.Model, FulltextSearchMixin):
     NEW_MAX_PAYMENT = decimal.Decimal('15.00')
     AMAZON_MAX_PAYMENT = decimal.Decimal('10.00')
     MOVE_AMOUNT = decimal.Decimal('5.00')
+    AGGREGATE_CHUNK_SIZE = 500
+    BULK_BATCH_SIZE = 1000
+    FINALIZE_BATCH_SIZE = 5000
+    TOTALS_FIELDS = [
+        'days_offline',
+        'days_online',
+        'days_wrong_password',
+        'days_sec_checkpoint',
+        'amount',
+        'amount_moved',
+        'move_to_next_month',
+    ]
     NEW_FACEBOOK_MAX_PAYMENT_DATE = datetime.datetime(2018, 3, 19, tzinfo=timezone.get_default_timezone())
     NEW_GOOGLE_MAX_PAYMENT_DATE = datetime.datetime(2018, 3, 29, tzinfo=timezone.get_default_timezone())
 
@@ -50,49 +67,252 @@ class LeadHistoryMonth(models.Model, FulltextSearchMixin):
 
     objects = BulkUpdateManager()
 
-    def aggregate(self) -> None:
+    @staticmethod
+    def get_finalized_before() -> datetime.date:
+        'Daily stats for dates before this one will not change anymore and are included in totals'
+        return datetime.date.today()
+
+    def add_day(self, lead_history: LeadHistory) -> None:
+        'Add finalized day with calculated amount to totals'
+        self.amount += lead_history.amount
+        if lead_history.is_wrong_password():
+            self.days_wrong_password += 1
+        if lead_history.is_sec_checkpoint():
+            self.days_sec_checkpoint += 1
+        if lead_history.is_online():
+            self.days_online += 1
+        else:
+            self.days_offline += 1
+
+    def set_move_to_next_month(self) -> None:
+        if self.amount < self.MOVE_AMOUNT and self.amount != self.amount_moved:
+            self.move_to_next_month = True
+        else:
+            self.move_to_next_month = False
+
+    def set_totals(self, lead_histories: typing.Iterable[LeadHistory], amount_moved: typing.Optional[decimal.Decimal]) -> None:
+        '''
+        Set day counters and amount from daily entries with calculated amounts.
+        *amount_moved* is previous month amount if it was moved to this month, None otherwise.
+        '''
         self.days_offline = 0
         self.days_online = 0
         self.days_wrong_password = 0
         self.days_sec_checkpoint = 0
+        self.amount = decimal.Decimal('0.00')
+        for lead_history in lead_histories:
+            self.add_day(lead_history)
+
+        if amount_moved is not None:
+            self.amount += amount_moved
+            self.amount_moved = amount_moved
+
+        self.set_move_to_next_month()
+
+    def aggregate(self) -> None:
+        'Recalculate totals from finalized days of this month'
+        finalized_before = self.get_finalized_before()
         lead_histories = LeadHistory.objects.filter(
             lead=self.lead,
             date__gte=self.get_first_day(),
             date__lte=self.get_last_day(),
-        ).prefetch_related(
+        ).select_related(
             'lead',
-            'lead__raspberry_pi',
-            'lead__lead_accounts',
         )
+        lead_histories = LeadHistory.calculate_amounts(lead_histories)
+        finalized_lead_histories = [i for i in lead_histories if i.date < finalized_before]
+        for lead_history in finalized_lead_histories:
+            lead_history.finalized = True
+        bulk_update(lead_histories, update_fields=['amount', 'note', 'finalized'])
+        LeadCheckMonth.store_lead_histories(finalized_lead_histories)
 
-        total_amount = decimal.Decimal('0.00')
-        for lead_history in lead_histories:
-            amount, note = lead_history.get_amount_with_note()
-            lead_history.amount = amount
-            lead_history.note = note
-            total_amount += amount
-            if lead_history.is_wrong_password():
-                self.days_wrong_password += 1
-            if lead_history.is_sec_checkpoint():
-                self.days_sec_checkpoint += 1
-            if lead_history.is_online():
-                self.days_online += 1
-            else:
-                self.days_offline += 1
-
-        bulk_update(lead_histories, update_fields=['amount', 'note'])
-
-        self.amount = total_amount
-
+        amount_moved = None
         prev_history = LeadHistoryMonth.objects.filter(lead=self.lead, date__lt=self.get_first_day()).order_by('-date').first()
         if prev_history and prev_history.move_to_next_month:
-            self.amount += prev_history.amount
-            self.amount_moved = prev_history.amount
+            amount_moved = prev_history.amount
 
-        if self.amount < self.MOVE_AMOUNT and self.amount != self.amount_moved:
-            self.move_to_next_month = True
-        else:
-            self.move_to_next_month = False
+        self.set_totals(finalized_lead_histories, amount_moved)
+
+    @classmethod
+    def get_amounts_moved(cls, leads: models.query.QuerySet, date_month: datetime.date) -> typing.Dict[str, typing.Optional[decimal.Decimal]]:
+        'Get map of lead ID to previous month amount if it was moved to *date_month*, None otherwise, with one query'
+        prev_months = cls.objects.filter(lead=models.OuterRef('pk'), date__lt=date_month).order_by('-date')
+        lead_rows = leads.annotate(
+            prev_amount=models.Subquery(prev_months.values('amount')[:1]),
+            prev_move_to_next_month=models.Subquery(prev_months.values('move_to_next_month')[:1]),
+        ).values_list('leadid', 'prev_amount', 'prev_move_to_next_month')
+        return {
+            lead_id: prev_amount if prev_move_to_next_month else None
+            for lead_id, prev_amount, prev_move_to_next_month in lead_rows
+        }
+
+    @classmethod
+    def aggregate_month(cls, leads: models.query.QuerySet, date: datetime.date, save: bool = True) -> typing.List[LeadHistoryMonth]:
+        '''
+        Aggregate month of *date* for all *leads*, same as *aggregate* for every lead.
+
+        Leads are processed in chunks of *AGGREGATE_CHUNK_SIZE*. For every chunk daily entries are loaded
+        and calculated at once, previous month balances come from one query, and
+        :model:`adsrental.LeadHistory` and :model:`adsrental.LeadHistoryMonth` are saved in bulk.
+        If *save* is not set, nothing is saved. Returns calculated entries for all leads.
+        '''
+        date_month = date.replace(day=1)
+        amounts_moved = list(cls.get_amounts_moved(leads, date_month).items())
+
+        result = []
+        for index in range(0, len(amounts_moved), cls.AGGREGATE_CHUNK_SIZE):
+            chunk = dict(amounts_moved[index:index + cls.AGGREGATE_CHUNK_SIZE])
+            result.extend(cls.aggregate_month_chunk(date_month, chunk, save=save))
+
+        return result
+
+    @classmethod
+    def aggregate_month_chunk(
+            cls,
+            date_month: datetime.date,
+            amounts_moved: typing.Dict[str, typing.Optional[decimal.Decimal]],
+            save: bool = True,
+    ) -> typing.List[LeadHistoryMonth]:
+        'Aggregate *date_month* for leads in *amounts_moved*, a map of lead ID to amount moved from previous month'
+        lead_ids = list(amounts_moved.keys())
+        month = cls(date=date_month)
+        finalized_before = cls.get_finalized_before()
+        lead_histories = LeadHistory.objects.filter(
+            lead_id__in=lead_ids,
+            date__gte=month.get_first_day(),
+            date__lte=month.get_last_day(),
+        ).select_related(
+            'lead',
+        )
+        lead_histories = LeadHistory.calculate_amounts(lead_histories)
+        lead_histories_map: typing.Dict[str, typing.List[LeadHistory]] = {}
+        for lead_history in lead_histories:
+            if lead_history.date < finalized_before:
+                lead_history.finalized = True
+                lead_histories_map.setdefault(lead_history.lead_id, []).append(lead_history)
+
+        items_map = {}
+        for item in cls.objects.filter(lead_id__in=lead_ids, date=date_month).order_by('-id'):
+            items_map[item.lead_id] = item
+
+        now = timezone.now()
+        items = []
+        new_items = []
+        changed_items = []
+        for lead_id in lead_ids:
+            item = items_map.get(lead_id)
+            if not item:
+                item = cls(lead_id=lead_id, date=date_month)
+            item.set_totals(lead_histories_map.get(lead_id, []), amounts_moved[lead_id])
+            items.append(item)
+            if item.id:
+                item.updated = now
+                changed_items.append(item)
+            elif item.amount:
+                new_items.append(item)
+
+        if not save:
+            return items
+
+        with transaction.atomic():
+            bulk_update(lead_histories, update_fields=['amount', 'note', 'finalized'], batch_size=cls.BULK_BATCH_SIZE)
+            LeadCheckMonth.store_lead_histories(i for items in lead_histories_map.values() for i in items)
+            cls.objects.bulk_create(new_items, batch_size=cls.BULK_BATCH_SIZE)
+            bulk_update(changed_items, update_fields=cls.TOTALS_FIELDS + ['updated'], batch_size=cls.BULK_BATCH_SIZE)
+
+        return items
+
+    @classmethod
+    def apply_finalized_days(cls) -> int:
+        '''
+        Add days finalized since previous run to month totals, so totals stay current without full recalculation.
+        Every :model:`adsrental.LeadHistory` is added once, in batches of *FINALIZE_BATCH_SIZE* locked rows.
+        Returns amount of added days.
+        '''
+        finalized_before = cls.get_finalized_before()
+        result = 0
+        while True:
+            with transaction.atomic():
+                lead_histories = list(LeadHistory.objects.select_for_update().filter(
+                    finalized=False,
+                    date__lt=finalized_before,
+                ).order_by('date', 'id')[:cls.FINALIZE_BATCH_SIZE])
+                if not lead_histories:
+                    return result
+
+                cls.apply_days(lead_histories)
+                result += len(lead_histories)
+
+    @classmethod
+    def apply_days(cls, lead_histories: typing.List[LeadHistory]) -> None:
+        '''
+        Calculate amounts for *lead_histories*, mark them as finalized, pack them to :model:`adsrental.LeadCheckMonth`
+        and update month totals.
+        Day counters and amount are set from all finalized days of the month with one grouped query,
+        so days finalized again after forced recalculation are not counted twice
+        and amount is not affected by rounding of stored month amount.
+        '''
+        LeadHistory.calculate_amounts(lead_histories)
+        for lead_history in lead_histories:
+            lead_history.finalized = True
+        bulk_update(lead_histories, update_fields=['amount', 'note', 'finalized'], batch_size=cls.BULK_BATCH_SIZE)
+        LeadCheckMonth.store_lead_histories(lead_histories)
+
+        keys = {(i.lead_id, i.date.replace(day=1)) for i in lead_histories}
+        lead_ids = {i[0] for i in keys}
+        dates = sorted({i[1] for i in keys})
+
+        items_map = {}
+        for item in cls.objects.select_for_update().filter(lead_id__in=lead_ids, date__in=dates).order_by('-id'):
+            items_map[(item.lead_id, item.date)] = item
+
+        new_items = []
+        for date_month in dates:
+            month_lead_ids = [lead_id for lead_id, i in keys if i == date_month]
+            amounts_moved = cls.get_amounts_moved(Lead.objects.filter(leadid__in=month_lead_ids), date_month)
+            for lead_id in month_lead_ids:
+                prev_item = items_map.get((lead_id, date_month - relativedelta(months=1)))
+                if prev_item:
+                    amounts_moved[lead_id] = prev_item.amount if prev_item.move_to_next_month else None
+                if (lead_id, date_month) not in items_map:
+                    item = cls(lead_id=lead_id, date=date_month)
+                    items_map[(lead_id, date_month)] = item
+                    new_items.append(item)
+
+            month = cls(date=date_month)
+            online = LeadHistory.get_online_filter()
+            totals_map = {i['lead_id']: i for i in LeadHistory.objects.filter(
+                lead_id__in=month_lead_ids,
+                date__gte=month.get_first_day(),
+                date__lte=month.get_last_day(),
+                finalized=True,
+            ).values('lead_id').annotate(
+                amount_total=models.Sum('amount'),
+                days_online_total=models.Count('id', filter=online),
+                days_offline_total=models.Count('id', filter=~online),
+                days_wrong_password_total=models.Count('id', filter=LeadHistory.get_wrong_password_filter()),
+                days_sec_checkpoint_total=models.Count('id', filter=LeadHistory.get_sec_checkpoint_filter()),
+            ).order_by()}
+            for lead_id in month_lead_ids:
+                item = items_map[(lead_id, date_month)]
+                totals = totals_map.get(lead_id, {})
+                item.days_online = totals.get('days_online_total', 0)
+                item.days_offline = totals.get('days_offline_total', 0)
+                item.days_wrong_password = totals.get('days_wrong_password_total', 0)
+                item.days_sec_checkpoint = totals.get('days_sec_checkpoint_total', 0)
+                item.amount = totals.get('amount_total') or decimal.Decimal('0.00')
+                amount_moved = amounts_moved.get(lead_id)
+                if amount_moved is not None:
+                    item.amount += amount_moved
+                    item.amount_moved = amount_moved
+                item.set_move_to_next_month()
+
+        now = timezone.now()
+        changed_items = [i for i in items_map.values() if i.id]
+        for item in changed_items:
+            item.updated = now
+        cls.objects.bulk_create(new_items, batch_size=cls.BULK_BATCH_SIZE)
+        bulk_update(changed_items, update_fields=cls.TOTALS_FIELDS + ['updated'], batch_size=cls.BULK_BATCH_SIZE)
 
     @classmethod
     def get_or_create(cls, lead: Lead, date: datetime.date) -> LeadHistoryMonth:
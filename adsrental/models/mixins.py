@@ -1,5 +1,6 @@
 
 import re
+import random
 import datetime
 import typing
 import json
@@ -76,18 +77,35 @@ class CommentsMixin():
             res.append(item)
         return res
 
+    COMMENTS_CACHE_SIZE = 50
+
+    @staticmethod
+    def get_comment_cache_item(comment):
+        return dict(
+            created=comment.created.strftime(settings.SYSTEM_DATETIME_FORMAT),
+            text=comment.text,
+            username=comment.get_username(),
+            is_admin=comment.user.is_superuser if comment.user else False,
+            response=comment.response,
+        )
+
     def get_comments_cache(self):
         result = []
-        for comment in self.comments.all().select_related('user').order_by('-created')[:50]:
-            result.append(dict(
-                created=comment.created.strftime(settings.SYSTEM_DATETIME_FORMAT),
-                text=comment.text,
-                username=comment.get_username(),
-                is_admin=comment.user.is_superuser if comment.user else False,
-                response=comment.response,
-            ))
+        for comment in self.comments.all().select_related('user').order_by('-created')[:self.COMMENTS_CACHE_SIZE]:
+            result.append(self.get_comment_cache_item(comment))
         return result
 
+    def prepend_comments_cache(self, new_comments):
+        'Update comments cache with just created comments without extra query, if cache is valid. Does not save.'
+        try:
+            comments = json.loads(self.comments_cache)
+        except (ValueError, TypeError):
+            self.comments_cache = json.dumps(self.get_comments_cache())
+            return
+
+        new_items = [self.get_comment_cache_item(i) for i in reversed(new_comments)]
+        self.comments_cache = json.dumps((new_items + comments)[:self.COMMENTS_CACHE_SIZE])
+
     def add_comment(self, message, user=None):
         'Add a comment to the model'
         comment_user = None
@@ -96,3 +114,42 @@ class CommentsMixin():
         self.comments.create(user=comment_user, text=message)
         self.comments_cache = json.dumps(self.get_comments_cache())
         self.save()
+
+
+class OutboxMixin():
+    '''
+    Delivery state of queued outbound requests.
+    Model has *status*, *attempts*, *next_attempt*, *last_error*, *dispatch_id* and *sent_date* fields
+    and *STATUS_PENDING*, *STATUS_SENT* and *STATUS_FAILED* statuses.
+    Failed deliveries are retried with jittered exponential backoff up to *MAX_ATTEMPTS* times.
+    '''
+    MAX_ATTEMPTS = 5
+    BACKOFF_SECONDS = 60
+
+    def get_backoff(self) -> datetime.timedelta:
+        'Get delay before next attempt, doubled after every failure with jitter'
+        seconds = self.BACKOFF_SECONDS * 2 ** max(self.attempts - 1, 0)
+        return datetime.timedelta(seconds=seconds * random.uniform(0.8, 1.2))
+
+    def mark_sent(self) -> None:
+        self.status = self.STATUS_SENT
+        self.sent_date = timezone.now()
+        self.last_error = None
+        self.dispatch_id = None
+
+    def mark_failed(self, error: str, retry: bool = True, retry_after: typing.Optional[int] = None) -> None:
+        '''
+        Schedule next attempt or give up after MAX_ATTEMPTS. Gives up right away if *retry* is not set.
+        *retry_after* - delay in seconds requested by vendor rate limit, attempts limit is not applied in this case.
+        '''
+        self.last_error = error
+        self.dispatch_id = None
+        if not retry or retry_after is None and self.attempts >= self.MAX_ATTEMPTS:
+            self.status = self.STATUS_FAILED
+            return
+
+        self.status = self.STATUS_PENDING
+        if retry_after is not None:
+            self.next_attempt = timezone.now() + datetime.timedelta(seconds=retry_after)
+        else:
+            self.next_attempt = timezone.now() + self.get_backoff()
@@ -0,0 +1,15 @@
+from django.db import models
+
+
+class ProxyReassignment(models.Model):
+    '''
+    Created every time :model:`adsrental.RaspberryPi` proxy tunnel is moved to another proxykeeper.
+    Used to calculate reassignments stats in :model:`adsrental.ProxykeeperStat`.
+    '''
+    raspberry_pi = models.ForeignKey('adsrental.RaspberryPi', on_delete=models.CASCADE)
+    old_proxy_hostname = models.CharField(max_length=50, null=True, blank=True, db_index=True, help_text='Proxykeeper tunnel was moved from')
+    new_proxy_hostname = models.CharField(max_length=50, db_index=True, help_text='Proxykeeper tunnel was moved to')
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self) -> str:
+        return f'{self.raspberry_pi_id} moved from {self.old_proxy_hostname} to {self.new_proxy_hostname}'
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import datetime
+import typing
+
+from django.db import models, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from adsrental.models.raspberry_pi import RaspberryPi
+from adsrental.models.lead import Lead
+from adsrental.models.proxy_reassignment import ProxyReassignment
+
+
+class ProxykeeperStat(models.Model):
+    '''
+    Precalculated capacity stats for a single proxykeeper host from *RaspberryPi.PROXY_HOSTNAME_CHOICES*.
+    Recalculated for all hosts at once by cron, so admin does not have to count :model:`adsrental.RaspberryPi` per request.
+    '''
+    DEAD_DELAY = 800.0
+    FAILOVER_MIN_DEAD = 10
+    FAILOVER_DEAD_RATIO = 0.8
+    PORTS_CAPACITY = (RaspberryPi.TUNNEL_PORT_END - RaspberryPi.TUNNEL_PORT_START) // 2
+
+    proxy_hostname = models.CharField(choices=RaspberryPi.PROXY_HOSTNAME_CHOICES, max_length=50, unique=True)
+    tunnels_total = models.IntegerField(default=0, help_text='Proxy tunnel devices assigned to this host')
+    tunnels_active = models.IntegerField(default=0, help_text='Devices with active lead')
+    tunnels_online = models.IntegerField(default=0)
+    tunnels_offline = models.IntegerField(default=0)
+    tunnels_checked = models.IntegerField(default=0, help_text='Devices with tunnel checked since last reassignment')
+    tunnels_dead = models.IntegerField(default=0, help_text='Devices with unreachable tunnel on last check')
+    delay_p50 = models.FloatField(null=True, blank=True, help_text='Median proxy delay of reachable tunnels')
+    delay_p90 = models.FloatField(null=True, blank=True)
+    delay_p99 = models.FloatField(null=True, blank=True)
+    ports_used = models.IntegerField(default=0, help_text='Tunnel port pairs allocated on this host')
+    port_utilization = models.FloatField(default=0.0, help_text='Percent of tunnel port pairs used')
+    reassigned_from_last_24_hours = models.IntegerField(default=0)
+    reassigned_from_last_7_days = models.IntegerField(default=0)
+    reassigned_from_last_30_days = models.IntegerField(default=0)
+    reassigned_to_last_24_hours = models.IntegerField(default=0)
+    reassigned_to_last_7_days = models.IntegerField(default=0)
+    reassigned_to_last_30_days = models.IntegerField(default=0)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return self.get_proxy_hostname_display()
+
+    def is_dead(self) -> bool:
+        'Check if most of checked tunnels to this proxykeeper are unreachable'
+        if self.tunnels_dead < self.FAILOVER_MIN_DEAD:
+            return False
+
+        return self.tunnels_dead >= self.tunnels_checked * self.FAILOVER_DEAD_RATIO
+
+    @classmethod
+    def get_dead_hostnames(cls) -> typing.List[str]:
+        '''
+        Get proxykeepers that should be failed over.
+
+        If more than half of proxykeepers look dead, problem is most likely on our side, so nothing is returned.
+        '''
+        stats = list(cls.objects.all())
+        result = [i.proxy_hostname for i in stats if i.is_dead()]
+        if len(result) * 2 > len(stats):
+            return []
+
+        return result
+
+    @staticmethod
+    def get_percentile(values: typing.List[float], percent: int) -> typing.Optional[float]:
+        'Get nearest-rank percentile from sorted list'
+        if not values:
+            return None
+
+        index = max(0, min(len(values) - 1, (len(values) * percent + 99) // 100 - 1))
+        return round(values[index], 2)
+
+    @classmethod
+    def calculate_all(cls) -> typing.List[ProxykeeperStat]:
+        'Calculate stats for all proxykeepers with a few grouped queries and replace existing rows.'
+        now = timezone.localtime(timezone.now())
+        online_dt = RaspberryPi.get_last_seen_online_dt(now)
+        stats = {}
+        for proxy_hostname, _ in RaspberryPi.PROXY_HOSTNAME_CHOICES:
+            stats[proxy_hostname] = cls(proxy_hostname=proxy_hostname)
+
+        raspberry_pis = RaspberryPi.objects.filter(is_proxy_tunnel=True)
+        for row in raspberry_pis.values('proxy_hostname').annotate(
+                tunnels_total=Count('rpid'),
+                tunnels_active=Count('rpid', filter=Q(lead__status__in=Lead.STATUSES_ACTIVE)),
+                tunnels_online=Count('rpid', filter=Q(last_seen__gte=online_dt)),
+                tunnels_checked=Count('rpid', filter=Q(proxy_delay__isnull=False)),
+                tunnels_dead=Count('rpid', filter=Q(proxy_delay__gte=cls.DEAD_DELAY)),
+                ports_used=Count('tunnel_port'),
+        ).order_by():
+            proxy_hostname = row.pop('proxy_hostname')
+            if proxy_hostname not in stats:
+                continue
+            obj = stats[proxy_hostname]
+            for key, value in row.items():
+                setattr(obj, key, value)
+            obj.tunnels_offline = obj.tunnels_total - obj.tunnels_online
+            obj.port_utilization = round(obj.ports_used * 100 / cls.PORTS_CAPACITY, 2)
+
+        delays: typing.Dict[str, typing.List[float]] = {}
+        for proxy_hostname, proxy_delay in raspberry_pis.filter(
+                proxy_delay__isnull=False,
+                proxy_delay__lt=cls.DEAD_DELAY,
+        ).values_list('proxy_hostname', 'proxy_delay'):
+            delays.setdefault(proxy_hostname, []).append(proxy_delay)
+        for proxy_hostname, values in delays.items():
+            if proxy_hostname not in stats:
+                continue
+            values.sort()
+            stats[proxy_hostname].delay_p50 = cls.get_percentile(values, 50)
+            stats[proxy_hostname].delay_p90 = cls.get_percentile(values, 90)
+            stats[proxy_hostname].delay_p99 = cls.get_percentile(values, 99)
+
+        reassignments = ProxyReassignment.objects.filter(created__gte=now - datetime.timedelta(days=30))
+        for direction in ('from', 'to'):
+            group_field = 'old_proxy_hostname' if direction == 'from' else 'new_proxy_hostname'
+            for row in reassignments.values(group_field).annotate(
+                    last_24_hours=Count('id', filter=Q(created__gte=now - datetime.timedelta(hours=24))),
+                    last_7_days=Count('id', filter=Q(created__gte=now - datetime.timedelta(days=7))),
+                    last_30_days=Count('id'),
+            ).order_by():
+                obj = stats.get(row[group_field])
+                if not obj:
+                    continue
+                setattr(obj, f'reassigned_{direction}_last_24_hours', row['last_24_hours'])
+                setattr(obj, f'reassigned_{direction}_last_7_days', row['last_7_days'])
+                setattr(obj, f'reassigned_{direction}_last_30_days', row['last_30_days'])
+
+        result = list(stats.values())
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(result)
+
+        return result
@@ -8,13 +8,17 @@ import random
 
 import requests
 from django.utils import timezone
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Count
+from django.db.models.signals import post_init, post_save
 from django.conf import settings
 from django_bulk_update.manager import BulkUpdateManager
+from django_bulk_update.helper import bulk_update
 
 from adsrental.models.raspberry_pi_session import RaspberryPiSession
-from adsrental.utils import PingCacheHelper
+from adsrental.models.proxy_reassignment import ProxyReassignment
+from adsrental.utils import PingCacheHelper, DeviceConfigCacheHelper, HttpClient
+from adsrental.models.signals import reset_device_config_cache, snapshot_device_config_key
 from adsrental.models.user import User
 
 
@@ -341,7 +345,7 @@ class RaspberryPi(models.Model):
         return f'socks5://{self.TUNNEL_USER}:{self.TUNNEL_PASSWORD}@{self.proxy_hostname}:{self.rtunnel_port}'
 
     def check_proxy_tunnel(self) -> requests.Response:
-        return requests.get(
+        return HttpClient('proxy_tunnel', retries=0, circuit_breaker=False, keep_alive=False).get(
             'https://google.com',
             proxies=dict(
                 http=self.get_proxy_connection_string(),
@@ -351,13 +355,74 @@ class RaspberryPi(models.Model):
         )
 
     def reassign_proxy(self) -> None:
+        old_proxy_hostname = self.proxy_hostname
         self.reset_cache()
         self.assign_proxy_hostname()
+        ProxyReassignment(raspberry_pi=self, old_proxy_hostname=old_proxy_hostname, new_proxy_hostname=self.proxy_hostname).save()
         self.assign_tunnel_ports()
         self.new_config_required = True
         self.proxy_delay = None
         self.proxy_delay_datetime = None
 
+    @classmethod
+    def bulk_reassign_proxy(cls, raspberry_pis: typing.List[RaspberryPi], exclude_hostnames: typing.Iterable[str] = ()) -> typing.List[ProxyReassignment]:
+        '''
+        Move all given proxy tunnels to the least loaded proxykeepers except *exclude_hostnames* in one transaction.
+
+        Cached pings are flushed to DB and deleted, so next ping from each device is built from DB
+        and responds with *new_config*.
+        '''
+        exclude_hostnames = set(exclude_hostnames)
+        hostname_counts = {}
+        for proxy_hostname, _ in cls.PROXY_HOSTNAME_CHOICES:
+            if proxy_hostname not in exclude_hostnames:
+                hostname_counts[proxy_hostname] = 0
+        if not hostname_counts or not raspberry_pis:
+            return []
+
+        for row in cls.objects.filter(
+                lead__status='In-Progress',
+                is_proxy_tunnel=True,
+                proxy_hostname__in=hostname_counts.keys(),
+        ).values('proxy_hostname').annotate(count=Count('rpid')).order_by():
+            hostname_counts[row['proxy_hostname']] = row['count']
+
+        used_ports = set(cls.objects.filter(tunnel_port__isnull=False).values_list('tunnel_port', flat=True))
+        ping_cache_helper = PingCacheHelper()
+        ping_data_map = ping_cache_helper.get_many([i.rpid for i in raspberry_pis])
+
+        reassignments = []
+        for raspberry_pi in raspberry_pis:
+            ping_data = ping_data_map.get(raspberry_pi.rpid)
+            if ping_data:
+                raspberry_pi.process_ping_data(ping_data)
+
+            proxy_hostname = min(hostname_counts, key=hostname_counts.get)
+            hostname_counts[proxy_hostname] += 1
+            reassignments.append(ProxyReassignment(raspberry_pi=raspberry_pi, old_proxy_hostname=raspberry_pi.proxy_hostname, new_proxy_hostname=proxy_hostname))
+
+            tunnel_port = random.randint(cls.TUNNEL_PORT_START, cls.TUNNEL_PORT_END) // 2 * 2
+            while tunnel_port in used_ports:
+                tunnel_port = random.randint(cls.TUNNEL_PORT_START, cls.TUNNEL_PORT_END) // 2 * 2
+            used_ports.add(tunnel_port)
+
+            raspberry_pi.proxy_hostname = proxy_hostname
+            raspberry_pi.tunnel_port, raspberry_pi.rtunnel_port = tunnel_port, tunnel_port + 1
+            raspberry_pi.new_config_required = True
+            raspberry_pi.proxy_delay = None
+            raspberry_pi.proxy_delay_datetime = None
+
+        with transaction.atomic():
+            bulk_update(raspberry_pis, update_fields=[
+                'ip_address', 'first_seen', 'first_tested', 'online_since_date', 'last_seen', 'version',
+                'proxy_hostname', 'tunnel_port', 'rtunnel_port', 'restart_required', 'new_config_required', 'proxy_delay', 'proxy_delay_datetime',
+            ])
+            ProxyReassignment.objects.bulk_create(reassignments)
+
+        ping_cache_helper.delete_many(ping_data_map.keys())
+        DeviceConfigCacheHelper().delete_many([i.rpid for i in raspberry_pis])
+        return reassignments
+
     def get_unique_ips(self) -> typing.List[str]:
         last_log = self.get_last_log(tail=1000)
         ips = list(set(re.findall(r'\d+\.\d+\.\d+\.\d+', last_log)))
@@ -366,3 +431,7 @@ class RaspberryPi(models.Model):
 
     class Meta:
         db_table = 'raspberry_pi'
+
+
+post_init.connect(snapshot_device_config_key, sender=RaspberryPi)
+post_save.connect(reset_device_config_cache, sender=RaspberryPi)
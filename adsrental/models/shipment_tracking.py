@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import re
+import zlib
+import datetime
+import hashlib
+import typing
+from xml.etree import ElementTree
+
+from dateutil import parser
+from django.db import models
+from django.utils import timezone
+
+
+class ShipmentTracking(models.Model):
+    '''
+    USPS tracking state of :model:`adsrental.Lead` shipment.
+
+    Kept out of :model:`adsrental.Lead` table, so hourly tracking sync does not rewrite lead rows.
+    Raw TrackV2 response is stored compressed and rewritten only when its hash changes.
+    '''
+    STATUS_UNKNOWN = 'Unknown'
+    STATUS_IN_TRANSIT = 'In Transit'
+    STATUS_DELIVERED = 'Delivered'
+    STATUS_RETURNED = 'Returned'
+    STATUS_CHOICES = [
+        (STATUS_UNKNOWN, 'Unknown'),
+        (STATUS_IN_TRANSIT, 'In Transit'),
+        (STATUS_DELIVERED, 'Delivered'),
+        (STATUS_RETURNED, 'Returned'),
+    ]
+    STATUSES_TERMINAL = [STATUS_DELIVERED, STATUS_RETURNED]
+    RETURNED_PHRASES = ['return to sender', 'returned to sender']
+
+    lead = models.OneToOneField('adsrental.Lead', related_name='shipment_tracking', on_delete=models.CASCADE)
+    tracking_code = models.CharField(max_length=255, db_index=True, help_text='USPS tracking code this data belongs to')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_UNKNOWN, db_index=True)
+    last_event = models.TextField(blank=True, null=True, help_text='Latest tracking summary')
+    delivery_date = models.DateField(blank=True, null=True)
+    raw_data = models.BinaryField(blank=True, null=True, help_text='Compressed raw response from secure.shippingapis.com')
+    payload_hash = models.CharField(max_length=32, blank=True, null=True, help_text='MD5 of raw response, used to skip unchanged updates')
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f'{self.tracking_code} {self.status}'
+
+    def get_raw_xml(self) -> typing.Optional[str]:
+        'Get decompressed raw response'
+        if not self.raw_data:
+            return None
+        return zlib.decompress(bytes(self.raw_data)).decode()
+
+    def is_terminal(self) -> bool:
+        'Check if tracking status will not change anymore'
+        return self.status in self.STATUSES_TERMINAL
+
+    @staticmethod
+    def get_payload_hash(tracking_info_xml: str) -> str:
+        return hashlib.md5(tracking_info_xml.encode()).hexdigest()
+
+    @classmethod
+    def parse_xml(cls, tracking_info_xml: str) -> typing.Tuple[str, typing.Optional[str], typing.Optional[datetime.date]]:
+        'Get status, last event and delivery date from TrackV2 response'
+        try:
+            tree = ElementTree.fromstring(tracking_info_xml)
+        except ElementTree.ParseError:
+            return cls.STATUS_UNKNOWN, None, None
+
+        track_info = tree.find('TrackInfo')
+        track_summary = track_info.find('TrackSummary') if track_info is not None else None
+        if track_summary is None or not track_summary.text:
+            return cls.STATUS_UNKNOWN, None, None
+
+        last_event = track_summary.text
+        summary = last_event.lower()
+        if 'was delivered' in summary:
+            delivery_date = None
+            dates = re.findall(r'\S+ \d{1,2}, \d{4}', last_event)
+            if dates:
+                try:
+                    delivery_date = parser.parse(dates[0]).date()
+                except ValueError:
+                    pass
+            return cls.STATUS_DELIVERED, last_event, delivery_date
+        if any(i in summary for i in cls.RETURNED_PHRASES):
+            return cls.STATUS_RETURNED, last_event, None
+
+        return cls.STATUS_IN_TRANSIT, last_event, None
+
+    def update_from_xml(self, tracking_code: str, tracking_info_xml: str) -> bool:
+        'Set raw and parsed data. Returns False if nothing changed, so row does not have to be saved.'
+        payload_hash = self.get_payload_hash(tracking_info_xml)
+        if self.tracking_code == tracking_code and self.payload_hash == payload_hash:
+            return False
+
+        self.tracking_code = tracking_code
+        self.payload_hash = payload_hash
+        self.raw_data = zlib.compress(tracking_info_xml.encode())
+        self.status, self.last_event, self.delivery_date = self.parse_xml(tracking_info_xml)
+        self.updated = timezone.now()
+        return True
@@ -0,0 +1,47 @@
+from django.db import models
+
+from adsrental.models.mixins import OutboxMixin
+
+
+class ShipStationOrderRequest(models.Model, OutboxMixin):
+    '''
+    Pending order creation or update on ShipStation for :model:`adsrental.Lead`.
+
+    Works as an outbox: *ShipStationClient.add_lead_order* creates *Pending* request,
+    *shipstation_dispatch* cron submits pending requests in batches with one API call per *BATCH_SIZE* orders.
+    Lead *shipstation_order_number* is sent as order key, so submitting the same order twice updates it
+    instead of creating a duplicate.
+    '''
+    STATUS_PENDING = 'Pending'
+    STATUS_SENDING = 'Sending'
+    STATUS_SENT = 'Sent'
+    STATUS_FAILED = 'Failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENDING, 'Sending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    MAX_ATTEMPTS = 5
+    BACKOFF_SECONDS = 60
+    SENDING_TIMEOUT_MINUTES = 10
+
+    lead = models.ForeignKey('adsrental.Lead', on_delete=models.CASCADE)
+    order_key = models.CharField(max_length=255, db_index=True, help_text='Lead shipstation_order_number at the moment of request, used as idempotent order key')
+    order_status = models.CharField(max_length=50, default='awaiting_shipment', help_text='Order status set on ShipStation')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True)
+    attempts = models.PositiveIntegerField(default=0, help_text='Submit attempts made')
+    next_attempt = models.DateTimeField(null=True, blank=True, db_index=True, help_text='Do not submit before this date')
+    last_error = models.TextField(null=True, blank=True, help_text='Error returned by ShipStation for this order')
+    dispatch_id = models.CharField(max_length=32, null=True, blank=True, db_index=True, help_text='Set by dispatcher that claimed this request')
+    shipstation_order_id = models.BigIntegerField(null=True, blank=True, help_text='Order ID returned by ShipStation')
+    sent_date = models.DateTimeField(null=True, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f'{self.order_key} {self.status}'
+
+    def mark_sent(self, shipstation_order_id: int) -> None:  # pylint: disable=arguments-differ
+        super(ShipStationOrderRequest, self).mark_sent()
+        self.shipstation_order_id = shipstation_order_id
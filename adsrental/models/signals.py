@@ -1,4 +1,51 @@
+from django.apps import apps
+
 from adsrental.slack_bot import SlackBot
+from adsrental.utils import DeviceConfigCacheHelper
+
+
+# Field of every model that points to cached device config: RaspberryPi rpid or Lead ID
+DEVICE_CONFIG_FIELDS = {
+    'leadaccount': 'lead_id',
+    'lead': 'raspberry_pi_id',
+    'ec2instance': 'rpid',
+    'raspberrypi': 'rpid',
+}
+
+
+def snapshot_device_config_key(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    '''
+    Remember loaded device config field value, so *reset_device_config_cache* can invalidate old device
+    when it is changed or cleared. Deferred fields are not loaded.
+    '''
+    field_name = DEVICE_CONFIG_FIELDS[sender._meta.model_name]  # pylint: disable=protected-access
+    instance._device_config_key = instance.__dict__.get(field_name)  # pylint: disable=protected-access
+
+
+def reset_device_config_cache(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    '''
+    Invalidate cached device config for current and previously loaded device of saved instance.
+    Lead account uses already loaded lead if possible, otherwise rpids are selected by lead IDs with one query.
+    '''
+    model_name = sender._meta.model_name  # pylint: disable=protected-access
+    field_name = DEVICE_CONFIG_FIELDS[model_name]
+    keys = {
+        instance.__dict__.get(field_name),
+        getattr(instance, '_device_config_key', None),
+    }
+    keys.discard(None)
+    instance._device_config_key = instance.__dict__.get(field_name)  # pylint: disable=protected-access
+    if not keys:
+        return
+
+    rpids = keys
+    if model_name == 'leadaccount':
+        lead_field = sender._meta.get_field('lead')  # pylint: disable=protected-access
+        if keys == {instance.lead_id} and lead_field.is_cached(instance) and instance.lead.leadid == instance.lead_id:
+            rpids = {instance.lead.raspberry_pi_id}
+        else:
+            rpids = set(apps.get_model('adsrental', 'Lead').objects.filter(leadid__in=keys).values_list('raspberry_pi_id', flat=True))
+    DeviceConfigCacheHelper().delete_many(rpids)
 
 
 def slack_new_issue(sender, instance, created, **kwargs):  # pylint: disable=unused-argument
@@ -11,7 +58,7 @@ def slack_new_issue(sender, instance, created, **kwargs):  # pylint: disable=unu
                 message = f"New issue ({instance.issue_type}) is reported on ({instance.lead_account.account_type}) account.\n"
                 message += f"RPID: {rpid}\n"
                 message += f"https://adsrental.com/dashboard/?search={rpid}"
-                slack.send_message(to, message)
+                slack.send_message(to, message, digest_key=f'new_issue:{instance.issue_type}', digest_title=f'New issues ({instance.issue_type}) are reported')
 
 
 def slack_issue_resolved(instance):
@@ -23,7 +70,7 @@ def slack_issue_resolved(instance):
             message = f"The issue ({instance.issue_type}) is resolved on ({instance.lead_account.account_type}) account.\n"
             message += f"RPID: {rpid}\n"
             message += f"https://adsrental.com/dashboard/?search={rpid}"
-            slack.send_message(to, message)
+            slack.send_message(to, message, digest_key=f'issue_resolved:{instance.issue_type}', digest_title=f'Issues ({instance.issue_type}) are resolved')
 
 
 def slack_auto_ban_warning(lead_account, reason, days_diff):
@@ -34,7 +81,7 @@ def slack_auto_ban_warning(lead_account, reason, days_diff):
         message = f"Your {lead_account.account_type} account will be banned in {days_diff*24} hours due to {reason}.\n"
         message += f"RPID: {rpid}\n"
         message += f"https://adsrental.com/dashboard/?search={rpid}"
-        slack.send_message(to, message)
+        slack.send_message(to, message, digest_key='auto_ban_warning', digest_title='Accounts will be banned soon')
 
 
 def slack_offline_warning(lead_account):
@@ -45,7 +92,7 @@ def slack_offline_warning(lead_account):
         message = f"Your {lead_account.account_type} account is offline for more than 2 hours.\n"
         message += f"RPID: {rpid}\n"
         message += f"https://adsrental.com/dashboard/?search={rpid}"
-        slack.send_message(to, message)
+        slack.send_message(to, message, digest_key='offline_warning', digest_title='Accounts are offline for more than 2 hours')
 
 
 def slack_new_tracking_number(lead):
@@ -53,7 +100,7 @@ def slack_new_tracking_number(lead):
     if to:
         slack = SlackBot()
         message = f"New tracking number {lead.usps_tracking_code} is set."
-        slack.send_message(to, message)
+        slack.send_message(to, message, digest_key='new_tracking_number', digest_title='New tracking numbers are set')
 
 
 def slack_pii_delivered(lead):
@@ -61,7 +108,7 @@ def slack_pii_delivered(lead):
     if to:
         slack = SlackBot()
         message = f"The Pii {lead.raspberry_pi_id} is delivered."
-        slack.send_message(to, message)
+        slack.send_message(to, message, digest_key='pii_delivered', digest_title='Piis are delivered')
 
 
 def slack_new_report(bundler, report_id):
@@ -81,4 +128,4 @@ def slack_daily_account_issues(lead, issue_type, issues):
     message += f"https://adsrental.com/dashboard/?search={rpid}"
     message += '\n'.join([issue.lead_account.account_type for issue in issues])
     slack = SlackBot()
-    slack.send_message(to, message)
+    slack.send_message(to, message, digest_key=f'daily_account_issues:{issue_type}', digest_title=f'Accounts with the issue ({issue_type}) for today')
@@ -0,0 +1,48 @@
+from django.db import models
+
+from adsrental.models.mixins import OutboxMixin
+
+
+class SlackMessage(models.Model, OutboxMixin):
+    '''
+    Queued Slack message. Created by *SlackBot.send_message* and delivered by *slack_dispatch* cron.
+
+    Messages with the same *digest_key* to the same recipient within *DIGEST_WINDOW_SECONDS* are collapsed into
+    one summary message with all texts in its thread if there are at least *DIGEST_MIN_MESSAGES* of them.
+    '''
+    STATUS_PENDING = 'Pending'
+    STATUS_SENDING = 'Sending'
+    STATUS_SENT = 'Sent'
+    STATUS_FAILED = 'Failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENDING, 'Sending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    MAX_ATTEMPTS = 5
+    BACKOFF_SECONDS = 60
+    SENDING_TIMEOUT_MINUTES = 10
+    DIGEST_WINDOW_SECONDS = 120
+    DIGEST_MIN_MESSAGES = 3
+
+    to = models.CharField(max_length=255, db_index=True, help_text='Slack user tag or channel')
+    message = models.TextField()
+    digest_key = models.CharField(max_length=255, null=True, blank=True, db_index=True, help_text='Similar messages have the same key and can be digested')
+    digest_title = models.CharField(max_length=255, null=True, blank=True, help_text='Summary text for digest')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt = models.DateTimeField(null=True, blank=True, db_index=True, help_text='Do not deliver before this date')
+    last_error = models.TextField(null=True, blank=True)
+    dispatch_id = models.CharField(max_length=32, null=True, blank=True, db_index=True, help_text='Set by dispatcher that claimed this message')
+    thread_ts = models.CharField(max_length=32, null=True, blank=True, help_text='Slack timestamp of digest message if this message was digested')
+    sent_date = models.DateTimeField(null=True, blank=True)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self) -> str:
+        return f'{self.to}: {self.message[:50]}'
+
+    def mark_sent(self, thread_ts: str = None) -> None:  # pylint: disable=arguments-differ
+        super(SlackMessage, self).mark_sent()
+        self.thread_ts = thread_ts
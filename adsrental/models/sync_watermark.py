@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+import datetime
+import typing
+
+from django.db import models
+
+
+class SyncWatermark(models.Model):
+    '''
+    Stores point in time up to which data from external API has been synced successfully.
+    Used by sync crons to request only changes since previous run.
+    '''
+    name = models.CharField(max_length=50, unique=True)
+    value = models.DateTimeField(help_text='Next sync requests changes made after this date')
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f'{self.name} {self.value}'
+
+    @classmethod
+    def get_value(cls, name: str) -> typing.Optional[datetime.datetime]:
+        'Get watermark date or None if sync never succeeded'
+        return cls.objects.filter(name=name).values_list('value', flat=True).first()
+
+    @classmethod
+    def set_value(cls, name: str, value: datetime.datetime) -> None:
+        'Move watermark after successful sync'
+        cls.objects.update_or_create(name=name, defaults=dict(value=value))
@@ -1,11 +1,13 @@
 import json
 import typing
 
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django_bulk_update.manager import BulkUpdateManager
 import vultr
 
+from adsrental.models.instance_sync_run import InstanceSyncRun
+
 
 class VultrInstance(models.Model):
     """
@@ -15,6 +17,8 @@ class VultrInstance(models.Model):
     USERNAME = 'Administrator'
     TAGS = ('Web', )
     RDP_PORT = 3389
+    VULTR_FIELDS = ['label', 'os', 'status', 'ip_address', 'password', 'tag', 'data']
+    SYNC_DELETE_MAX_SHARE = 0.2
 
     id = models.AutoField(primary_key=True)
     instance_id = models.PositiveIntegerField(blank=True, null=True, db_index=True, help_text='Vultr ID.')
@@ -30,24 +34,105 @@ class VultrInstance(models.Model):
     def is_running(self) -> bool:
         return self.status == 'running'
 
+    @staticmethod
+    def get_fields_from_vultr(data: typing.Dict) -> typing.Dict:
+        'Get model field values from Vultr server data'
+        return dict(
+            label=data['label'],
+            os=data['os'],
+            status=data['power_status'],
+            ip_address=data['main_ip'],
+            password=data['default_password'],
+            tag=data['tag'],
+            data=json.dumps(data),
+        )
+
+    @classmethod
+    def sync_all_from_vultr(cls, delete: bool = True) -> InstanceSyncRun:
+        '''
+        Sync all instances with allowed *TAGS* with one Vultr API call.
+
+        Servers are diffed against local rows in memory, so only new, changed and removed instances hit DB,
+        with one bulk query for each. If *delete* is not set, instances missing on Vultr are kept.
+        Deletion is skipped and reported in *error* if Vultr lists no instances or more than *SYNC_DELETE_MAX_SHARE*
+        of local instances are missing, because it is more likely a broken response than a removed fleet.
+        Returns saved :model:`adsrental.InstanceSyncRun` with stats.
+        '''
+        instance_sync_run = InstanceSyncRun(provider=InstanceSyncRun.PROVIDER_VULTR)
+        vultr_client = vultr.Vultr(settings.VULTR_API_KEY)
+        try:
+            instance_sync_run.api_calls += 1
+            servers = vultr_client.server.list()
+        except (vultr.VultrError, RuntimeError) as e:
+            instance_sync_run.finish(error=str(e))
+            return instance_sync_run
+
+        servers_map = {}
+        for new_instance_id, data in (servers or {}).items():
+            if data.get('tag') in cls.TAGS:
+                servers_map[int(new_instance_id)] = data
+        instance_sync_run.instances_total = len(servers_map)
+
+        instances_map = {}
+        duplicate_ids = []
+        for instance in cls.objects.filter(instance_id__isnull=False).order_by('id'):
+            if instance.instance_id in instances_map:
+                duplicate_ids.append(instance.id)
+                continue
+            instances_map[instance.instance_id] = instance
+
+        new_instances = []
+        changed_instances = []
+        for new_instance_id, data in servers_map.items():
+            fields = cls.get_fields_from_vultr(data)
+            instance = instances_map.get(new_instance_id)
+            if not instance:
+                new_instances.append(cls(instance_id=new_instance_id, **fields))
+                continue
+
+            changed = False
+            for field_name, value in fields.items():
+                if getattr(instance, field_name) != value:
+                    setattr(instance, field_name, value)
+                    changed = True
+            if changed:
+                changed_instances.append(instance)
+
+        error = None
+        deleted_ids = duplicate_ids
+        if delete:
+            missing_ids = [i.id for i in instances_map.values() if i.instance_id not in servers_map]
+            if missing_ids and not servers_map:
+                error = f'Vultr listed no instances, {len(missing_ids)} local instances are not deleted'
+            elif len(missing_ids) > max(len(instances_map) * cls.SYNC_DELETE_MAX_SHARE, 1):
+                error = f'{len(missing_ids)} of {len(instances_map)} local instances are missing on Vultr, they are not deleted'
+            else:
+                deleted_ids = deleted_ids + missing_ids
+
+        with transaction.atomic():
+            cls.objects.bulk_create(new_instances)
+            cls.objects.bulk_update(changed_instances, update_fields=cls.VULTR_FIELDS)
+            cls.objects.filter(id__in=deleted_ids).delete()
+
+        instance_sync_run.instances_created = len(new_instances)
+        instance_sync_run.instances_updated = len(changed_instances)
+        instance_sync_run.instances_deleted = len(deleted_ids)
+        instance_sync_run.instances_unchanged = len(servers_map) - len(new_instances) - len(changed_instances)
+        instance_sync_run.finish(error=error)
+        return instance_sync_run
+
     @classmethod
     def update_all_from_vultr(cls, instance_id: typing.Optional[int] = None) -> None:
+        if not instance_id:
+            cls.sync_all_from_vultr()
+            return
+
         vultr_client = vultr.Vultr(settings.VULTR_API_KEY)
-        for tag in cls.TAGS:
-            for new_instance_id, data in vultr_client.server.list(params=dict(tag=tag)).items():
-                new_instance_id = int(new_instance_id)
-                if instance_id and instance_id != new_instance_id:
-                    continue
-
-                cls.objects.update_or_create(instance_id=new_instance_id, defaults=dict(
-                    label=data['label'],
-                    os=data['os'],
-                    status=data['power_status'],
-                    ip_address=data['main_ip'],
-                    password=data['default_password'],
-                    tag=data['tag'],
-                    data=json.dumps(data),
-                ))
+        data = vultr_client.server.list(subid=instance_id)
+        if not data or data.get('tag') not in cls.TAGS:
+            return
+
+        cls.objects.update_or_create(instance_id=instance_id, defaults=cls.get_fields_from_vultr(data))
 
     def update_from_vultr(self) -> None:
         VultrInstance.update_all_from_vultr(self.instance_id)
@@ -1,16 +1,240 @@
-import os
+import time
+import uuid
+import asyncio
+import datetime
+import typing
+from multiprocessing.pool import ThreadPool
 
 import slack
 from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django_bulk_update.helper import bulk_update
+
+from adsrental.models.slack_message import SlackMessage
+from adsrental.utils import HttpClient
+
 
 class SlackBot():
-    'Handles slack notification'
+    '''
+    Handles slack notification.
+
+    *send_message* only queues :model:`adsrental.SlackMessage`, *dispatch* delivers queued messages
+    with per-channel rate limit and digesting.
+    '''
+    BASE_URL = 'https://www.slack.com/api/'
+    CHANNEL_MESSAGES_PER_RUN = 20
+    CHANNEL_DELAY_SECONDS = 1.1
+    MAX_MESSAGE_LENGTH = 3500
 
     def __init__(self) -> None:
-        self.client = slack.WebClient(token=settings.SLACK_TOKEN)
+        self.client = None
+        self.loop: typing.Optional[asyncio.AbstractEventLoop] = None
+
+    def get_client(self) -> slack.WebClient:
+        'Get Slack client with own event loop, so it can be used in threads. Call *close* when it is not needed anymore.'
+        if not self.client:
+            self.loop = asyncio.new_event_loop()
+            self.client = slack.WebClient(token=settings.SLACK_TOKEN, base_url=HttpClient.rewrite_url(self.BASE_URL), loop=self.loop)
+        return self.client
+
+    def close(self) -> None:
+        'Close event loop of Slack client'
+        if self.loop:
+            self.loop.close()
+        self.client = None
+        self.loop = None
+
+    def send_message(self, to: str, message: str, digest_key: typing.Optional[str] = None, digest_title: typing.Optional[str] = None) -> SlackMessage:
+        '''
+        Queue message for delivery.
+
+        *digest_key* - similar messages to the same recipient with this key can be collapsed to one digest
+        *digest_title* - summary text for digest
+        '''
+        slack_message = SlackMessage(
+            to=to,
+            message=message,
+            digest_key=digest_key,
+            digest_title=digest_title,
+        )
+        slack_message.save()
+        return slack_message
+
+    def post_message(self, to: str, text: str, thread_ts: typing.Optional[str] = None) -> str:
+        'Post message to Slack right away and return its timestamp'
+        http_client = HttpClient('slack')
+        start = time.time()
+        try:
+            response = self.get_client().chat_postMessage(
+                channel=f"@{to}",
+                text=text,
+                thread_ts=thread_ts,
+            )
+        except Exception:
+            http_client.record_failure(time.time() - start)
+            raise
+        http_client.record_success(time.time() - start)
+        return response.get('ts')
+
+    @classmethod
+    def get_batches(cls, slack_messages: typing.List[SlackMessage]) -> typing.List[typing.List[SlackMessage]]:
+        '''
+        Group messages for one recipient into single messages and digests.
+        Messages left from a digest with already posted summary are grouped by its *thread_ts*.
+        '''
+        batches = []
+        digests: typing.Dict[typing.Tuple[str, typing.Optional[str]], typing.List[SlackMessage]] = {}
+        for slack_message in slack_messages:
+            if not slack_message.digest_key:
+                batches.append([slack_message])
+                continue
+            key = (slack_message.digest_key, slack_message.thread_ts)
+            if key not in digests:
+                digests[key] = []
+                batches.append(digests[key])
+            digests[key].append(slack_message)
+
+        result = []
+        for batch in batches:
+            if len(batch) < SlackMessage.DIGEST_MIN_MESSAGES and not batch[0].thread_ts:
+                result.extend([[i] for i in batch])
+            else:
+                result.append(batch)
+        return result
+
+    def get_thread_replies(self, batch: typing.List[SlackMessage]) -> typing.List[typing.Tuple[str, typing.List[SlackMessage]]]:
+        'Split digested messages to thread replies fitting Slack message length. Returns reply texts with their messages.'
+        replies = []
+        current = ''
+        current_messages: typing.List[SlackMessage] = []
+        for slack_message in batch:
+            if current and len(current) + len(slack_message.message) > self.MAX_MESSAGE_LENGTH:
+                replies.append((current, current_messages))
+                current = ''
+                current_messages = []
+            current = f'{current}\n\n{slack_message.message}' if current else slack_message.message
+            current_messages.append(slack_message)
+        if current:
+            replies.append((current, current_messages))
+        return replies
+
+    def deliver_batches(self, batches: typing.List[typing.List[SlackMessage]]) -> typing.List[SlackMessage]:
+        'Deliver batches for one recipient one by one with delay to stay within Slack rate limit'
+        result = []
+        last_post = 0.0
 
-    def send_message(self, to, message) -> None:
-        self.client.chat_postMessage(
-            channel=f"@{to}",
-            text=message
+        def wait() -> None:
+            nonlocal last_post
+            delay = last_post + self.CHANNEL_DELAY_SECONDS - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            last_post = time.time()
+
+        for batch in batches:
+            to = batch[0].to
+            try:
+                if len(batch) == 1 and not batch[0].thread_ts:
+                    wait()
+                    self.post_message(to, batch[0].message)
+                    batch[0].mark_sent()
+                else:
+                    thread_ts = batch[0].thread_ts
+                    if not thread_ts:
+                        title = batch[0].digest_title or batch[0].digest_key
+                        wait()
+                        thread_ts = self.post_message(to, f'{title} ({len(batch)} notifications, see thread)')
+                        # Retry must post only missing replies to the same thread, even if this run does not finish
+                        SlackMessage.objects.filter(id__in=[i.id for i in batch]).update(thread_ts=thread_ts)
+                        for slack_message in batch:
+                            slack_message.thread_ts = thread_ts
+                    for text, slack_messages in self.get_thread_replies(batch):
+                        wait()
+                        self.post_message(to, text, thread_ts=thread_ts)
+                        for slack_message in slack_messages:
+                            slack_message.mark_sent(thread_ts=thread_ts)
+            except slack.errors.SlackApiError as e:
+                retry_after = None
+                if getattr(e.response, 'status_code', None) == 429:
+                    retry_after = int(e.response.headers.get('Retry-After', 60))
+                for slack_message in batch:
+                    if slack_message.status != SlackMessage.STATUS_SENT:
+                        slack_message.mark_failed(str(e), retry_after=retry_after)
+            except Exception as e:  # pylint: disable=broad-except
+                for slack_message in batch:
+                    if slack_message.status != SlackMessage.STATUS_SENT:
+                        slack_message.mark_failed(str(e))
+            result.extend(batch)
+
+        return result
+
+    @classmethod
+    def dispatch(cls, limit: int = 1000, threads: int = 10) -> typing.List[SlackMessage]:
+        '''
+        Claim pending :model:`adsrental.SlackMessage` and deliver them, recipients are processed concurrently.
+        Messages with *digest_key* wait for *DIGEST_WINDOW_SECONDS* to collect similar ones.
+        At most *CHANNEL_MESSAGES_PER_RUN* messages or digests are posted to one recipient per run.
+
+        Returns processed messages.
+        '''
+        if not HttpClient('slack').is_available():
+            return []
+
+        now = timezone.now()
+        SlackMessage.objects.filter(
+            status=SlackMessage.STATUS_SENDING,
+            next_attempt__lt=now - datetime.timedelta(minutes=SlackMessage.SENDING_TIMEOUT_MINUTES),
+        ).update(status=SlackMessage.STATUS_PENDING, dispatch_id=None)
+
+        pending_messages = SlackMessage.objects.filter(
+            status=SlackMessage.STATUS_PENDING,
+        ).filter(
+            Q(digest_key__isnull=True) | Q(created__lte=now - datetime.timedelta(seconds=SlackMessage.DIGEST_WINDOW_SECONDS)),
+        ).exclude(
+            next_attempt__gt=now,
+        ).order_by('id')[:limit]
+
+        recipient_messages: typing.Dict[str, typing.List[SlackMessage]] = {}
+        for slack_message in pending_messages:
+            recipient_messages.setdefault(slack_message.to, []).append(slack_message)
+
+        recipient_batches = []
+        claimed_ids = []
+        for slack_messages in recipient_messages.values():
+            batches = cls.get_batches(slack_messages)[:cls.CHANNEL_MESSAGES_PER_RUN]
+            recipient_batches.append(batches)
+            claimed_ids.extend([i.id for batch in batches for i in batch])
+
+        dispatch_id = uuid.uuid4().hex
+        SlackMessage.objects.filter(id__in=claimed_ids, status=SlackMessage.STATUS_PENDING).update(
+            status=SlackMessage.STATUS_SENDING,
+            dispatch_id=dispatch_id,
+            next_attempt=now,
         )
+        claimed_ids = set(SlackMessage.objects.filter(dispatch_id=dispatch_id).values_list('id', flat=True))
+        recipient_batches = [[batch for batch in batches if all(i.id in claimed_ids for i in batch)] for batches in recipient_batches]
+        recipient_batches = [i for i in recipient_batches if i]
+        if not recipient_batches:
+            return []
+
+        for batches in recipient_batches:
+            for batch in batches:
+                for slack_message in batch:
+                    slack_message.attempts += 1
+
+        def deliver(batches: typing.List[typing.List[SlackMessage]]) -> typing.List[SlackMessage]:
+            slack_bot = cls()
+            try:
+                return slack_bot.deliver_batches(batches)
+            finally:
+                slack_bot.close()
+
+        pool = ThreadPool(processes=threads)
+        try:
+            results = pool.map(deliver, recipient_batches)
+        finally:
+            pool.close()
+
+        slack_messages = [i for result in results for i in result]
+        bulk_update(slack_messages, update_fields=['status', 'attempts', 'next_attempt', 'last_error', 'dispatch_id', 'thread_ts', 'sent_date'])
+        return slack_messages
@@ -14,6 +14,15 @@ from adsrental.views.cron.fix_primary import FixPrimaryView
 from adsrental.views.cron.event_not_qualified import EventNotQualifiedView
 from adsrental.views.cron.generate_bundler_bonuses import GenerateBundlerBonusesView
 from adsrental.views.cron.slack_daily_account_status import DailyAccountStatusView
+from adsrental.views.cron.proxykeeper_stat_calculate import ProxykeeperStatCalculateView
+from adsrental.views.cron.proxykeeper_failover import ProxykeeperFailoverView
+from adsrental.views.cron.http_stats import HttpStatsView
+from adsrental.views.cron.customerio_dispatch import CustomerIODispatchView
+from adsrental.views.cron.slack_dispatch import SlackDispatchView
+from adsrental.views.cron.shipstation_dispatch import ShipStationDispatchView
+from adsrental.views.cron.adsdb_dispatch import AdsdbDispatchView
+from adsrental.views.cron.sync_vultr import SyncVultrView
+from adsrental.views.cron.lead_history_month_check import LeadHistoryMonthCheckView
 
 
 urlpatterns = [  # pylint: disable=C0103
@@ -22,12 +31,21 @@ urlpatterns = [  # pylint: disable=C0103
     path('sync_offline/', SyncOfflineView.as_view(), name='sync_offline'),
     path('sync_ec2/', SyncEC2View.as_view(), name='cron_sync_ec2'),
     path('lead_history/', LeadHistoryView.as_view(), name='cron_lead_history'),
+    path('lead_history_month_check/', LeadHistoryMonthCheckView.as_view(), name='cron_lead_history_month_check'),
     path('update_ping/', UpdatePingView.as_view(), name='cron_update_ping'),
     path('auto_ban/', AutoBanView.as_view(), name='cron_auto_ban'),
     path('auto_ban_warning/', AutoBanWarningView.as_view(), name='cron_auto_ban_warning'),
     path('slack_daily_account_status/', DailyAccountStatusView.as_view(), name='slack_daily_account_status'),
     path('check_ec2/', CheckEC2View.as_view(), name='cron_check_ec2'),
     path('bundler_lead_stat/', BundlerLeadStatsCalculateView.as_view(), name='cron_bundler_lead_stat'),
+    path('proxykeeper_stat/', ProxykeeperStatCalculateView.as_view(), name='cron_proxykeeper_stat'),
+    path('proxykeeper_failover/', ProxykeeperFailoverView.as_view(), name='cron_proxykeeper_failover'),
+    path('http_stats/', HttpStatsView.as_view(), name='cron_http_stats'),
+    path('customerio_dispatch/', CustomerIODispatchView.as_view(), name='cron_customerio_dispatch'),
+    path('slack_dispatch/', SlackDispatchView.as_view(), name='cron_slack_dispatch'),
+    path('shipstation_dispatch/', ShipStationDispatchView.as_view(), name='cron_shipstation_dispatch'),
+    path('adsdb_dispatch/', AdsdbDispatchView.as_view(), name='cron_adsdb_dispatch'),
+    path('sync_vultr/', SyncVultrView.as_view(), name='cron_sync_vultr'),
     path('sync_adsdb/', SyncAdsDBView.as_view(), name='cron_sync_adsdb'),
     path('fix_primary/', FixPrimaryView.as_view(), name='cron_fix_primary'),
     path('event_not_qualified/', EventNotQualifiedView.as_view(), name='cron_event_not_qualified'),
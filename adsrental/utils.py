@@ -2,6 +2,7 @@
 from __future__ import annotations
 
 import json
+import hashlib
 import time
 import uuid
 import secrets
@@ -9,19 +10,29 @@ import string
 import random
 import datetime
 import typing
+import threading
+from multiprocessing.pool import ThreadPool
+import urllib.parse
+from xml.etree import ElementTree
 
 import requests
+import requests.adapters
 import boto3
 import botocore
+from django.http import JsonResponse
 from django.http.request import HttpRequest
 from django.utils import timezone
 from django.core.cache import cache
 from django.conf import settings
 from django.apps import apps
+from django.db.models import F
+from django_bulk_update.helper import bulk_update
 import customerio
 from shipstation.api import ShipStation, ShipStationOrder, ShipStationAddress, ShipStationItem, ShipStationWeight
 
 from adsrental.models.customerio_event import CustomerIOEvent
+from adsrental.models.shipstation_order_request import ShipStationOrderRequest
+from adsrental.models.adsdb_push import AdsdbPush
 
 if typing.TYPE_CHECKING:
     from adsrental.models.lead import Lead
@@ -29,6 +40,183 @@ if typing.TYPE_CHECKING:
     from adsrental.models.ec2_instance import EC2Instance
 
 
+class CircuitBreakerOpenError(requests.exceptions.ConnectionError):
+    'Raised instead of a request when integration had too many failures recently'
+
+
+class HttpClient():
+    '''
+    Shared outbound HTTP layer for all integrations.
+
+    Keeps one keep-alive *requests.Session* per host per process unless *keep_alive* is False, sets default timeouts,
+    retries idempotent requests with jittered backoff and stops calling integration for
+    *BREAKER_TIMEOUT_SECONDS* after *BREAKER_THRESHOLD* failures in a row.
+    Request, error and latency counters are stored in cache per integration, see *get_stats*.
+
+    Vendor URLs can be redirected to local fake servers with *URL_OVERRIDES* or *HTTP_CLIENT_URL_OVERRIDES* setting,
+    see :mod:`adsrental.fake_vendors`.
+    '''
+    NAMES = ['shipstation', 'adsdb', 'usps', 'customerio', 'slack', 'proxy_tunnel']
+    DEFAULT_TIMEOUT = (5.0, 30.0)
+    RETRIES = 2
+    RETRY_STATUSES = [429, 500, 502, 503, 504]
+    IDEMPOTENT_METHODS = ['GET', 'HEAD', 'OPTIONS']
+    BACKOFF_SECONDS = 0.5
+    BREAKER_THRESHOLD = 5
+    BREAKER_TIMEOUT_SECONDS = 60
+    STATS_FIELDS = ['requests', 'errors', 'rejected', 'latency_ms']
+    KEY_TEMPLATE = 'http_client_{}_{}'
+    URL_OVERRIDES: typing.Dict[str, str] = {}
+
+    _sessions: typing.Dict[str, requests.Session] = {}
+    _sessions_lock = threading.Lock()
+
+    def __init__(self, name: str, timeout: typing.Any = None, retries: typing.Optional[int] = None, circuit_breaker: bool = True, keep_alive: bool = True) -> None:
+        self.name = name
+        self.timeout = timeout or self.DEFAULT_TIMEOUT
+        self.retries = self.RETRIES if retries is None else retries
+        self.circuit_breaker = circuit_breaker
+        self.keep_alive = keep_alive
+        self.cache = cache
+
+    def get_key(self, field: str) -> str:
+        'Get cache key for integration field'
+        return self.KEY_TEMPLATE.format(self.name, field)
+
+    @classmethod
+    def rewrite_url(cls, url: str) -> str:
+        'Replace vendor URL prefix if it is overriden'
+        overrides = {**getattr(settings, 'HTTP_CLIENT_URL_OVERRIDES', {}), **cls.URL_OVERRIDES}
+        for prefix, new_prefix in overrides.items():
+            if url.startswith(prefix):
+                return new_prefix + url[len(prefix):]
+        return url
+
+    @classmethod
+    def get_session(cls, url: str) -> requests.Session:
+        'Get shared session for URL host'
+        host = urllib.parse.urlsplit(url).netloc
+        session = cls._sessions.get(host)
+        if session:
+            return session
+
+        with cls._sessions_lock:
+            if host not in cls._sessions:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=20)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                cls._sessions[host] = session
+            return cls._sessions[host]
+
+    def incr(self, field: str, value: int = 1) -> None:
+        'Increment integration counter'
+        key = self.get_key(field)
+        self.cache.add(key, 0, None)
+        try:
+            self.cache.incr(key, value)
+        except ValueError:
+            self.cache.set(key, value, None)
+
+    def is_available(self) -> bool:
+        'Check if circuit breaker lets requests through'
+        if not self.circuit_breaker:
+            return True
+        return not self.cache.get(self.get_key('open'))
+
+    def record_success(self, latency: float) -> None:
+        'Update counters after successful call'
+        self.incr('requests')
+        self.incr('latency_ms', int(latency * 1000))
+        if self.circuit_breaker and self.cache.get(self.get_key('failures')):
+            self.cache.delete(self.get_key('failures'))
+
+    def record_failure(self, latency: float) -> None:
+        'Update counters after failed call and open circuit breaker if needed'
+        self.incr('requests')
+        self.incr('errors')
+        self.incr('latency_ms', int(latency * 1000))
+        if not self.circuit_breaker:
+            return
+
+        failures_key = self.get_key('failures')
+        self.cache.add(failures_key, 0, self.BREAKER_TIMEOUT_SECONDS * 10)
+        try:
+            failures = self.cache.incr(failures_key)
+        except ValueError:
+            failures = 1
+        if failures >= self.BREAKER_THRESHOLD:
+            self.cache.set(self.get_key('open'), True, self.BREAKER_TIMEOUT_SECONDS)
+
+    def get_backoff(self, attempt: int) -> float:
+        'Get jittered exponential backoff before next attempt'
+        return random.uniform(0, self.BACKOFF_SECONDS * 2 ** attempt)
+
+    def request(self, method: str, url: str, idempotent: typing.Optional[bool] = None, **kwargs: typing.Any) -> requests.Response:
+        '''
+        Send request using shared session.
+
+        *idempotent* - allow retries, by default only for GET, HEAD and OPTIONS requests.
+
+        Raises *CircuitBreakerOpenError* if integration is disabled by circuit breaker
+        and *requests.exceptions.RequestException* if all attempts failed.
+        Counters and circuit breaker are updated once per call, after retries, with latency of all attempts.
+        '''
+        if not self.is_available():
+            self.incr('rejected')
+            raise CircuitBreakerOpenError(f'Circuit breaker is open for {self.name}')
+
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in self.IDEMPOTENT_METHODS
+        retries = self.retries if idempotent else 0
+        kwargs.setdefault('timeout', self.timeout)
+        url = self.rewrite_url(url)
+        session = self.get_session(url) if self.keep_alive else requests
+
+        attempt = 0
+        start = time.time()
+        while True:
+            try:
+                response = session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException:
+                if attempt >= retries:
+                    self.record_failure(time.time() - start)
+                    raise
+            else:
+                if response.status_code < 500 and response.status_code != 429:
+                    self.record_success(time.time() - start)
+                    return response
+                if attempt >= retries or response.status_code not in self.RETRY_STATUSES:
+                    self.record_failure(time.time() - start)
+                    return response
+
+            time.sleep(self.get_backoff(attempt))
+            attempt += 1
+
+    def get(self, url: str, **kwargs: typing.Any) -> requests.Response:
+        'Send GET request'
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs: typing.Any) -> requests.Response:
+        'Send POST request'
+        return self.request('POST', url, **kwargs)
+
+    @classmethod
+    def get_stats(cls) -> typing.Dict[str, typing.Dict[str, typing.Any]]:
+        'Get counters for all integrations'
+        result = {}
+        for name in cls.NAMES:
+            client = cls(name)
+            keys = [client.get_key(i) for i in cls.STATS_FIELDS]
+            values = client.cache.get_many(keys)
+            stats = {field: values.get(key, 0) for field, key in zip(cls.STATS_FIELDS, keys)}
+            stats['avg_latency_ms'] = stats['latency_ms'] // stats['requests'] if stats['requests'] else None
+            stats['circuit_open'] = not client.is_available()
+            result[name] = stats
+        return result
+
+
 class CustomerIOClient():
     '''Manages lead data ans send events for leads to customer.io'''
     EVENT_SHIPPED = 'shipped'
@@ -47,6 +235,7 @@ class CustomerIOClient():
             return
         self.client = customerio.CustomerIO(
             settings.CUSTOMERIO_SITE_ID, settings.CUSTOMERIO_API_KEY)
+        self.client.base_url = HttpClient.rewrite_url(self.client.base_url)
 
     def get_client(self) -> typing.Optional[customerio.CustomerIO]:
         '''
@@ -84,37 +273,102 @@ class CustomerIOClient():
 
             )
 
-    def send_lead_event(self, lead: Lead, event: str, **kwargs: str) -> None:
+    def send_lead_event(self, lead: Lead, event: str, **kwargs: str) -> CustomerIOEvent:
         '''
         Create a new :model:`adsrental.Lead` event, like banned or approved.
+        Event is only stored in outbox, it is delivered later by *dispatch_events*.
 
         *lead* - :model:`adsrental.Lead` instance
         *event* - event name, should be one of listed.
         All other keyword arguments are passed to  CustomerIOEvent kwrags
 
-        Returns customerio.CustomerIO instance.
+        Returns :model:`adsrental.CustomerIOEvent` instance.
         '''
         send = True
         if not self.client:
             send = False
         if not lead.customerio_enabled:
             send = False
-        CustomerIOEvent(
+        customerio_event = CustomerIOEvent(
             lead=lead,
             name=event,
-            sent=send,
+            sent=False,
+            status=CustomerIOEvent.STATUS_PENDING if send else CustomerIOEvent.STATUS_SKIPPED,
+            idempotency_key=generate_ulid(),
             kwargs=json.dumps(kwargs),
-        ).save()
-        if self.client and send:
-            retries = 0
-            try:
-                return self.client.track(customer_id=lead.leadid, name=event, **kwargs)
-            except customerio.CustomerIOException:
-                retries += 1
-                if retries >= 3:
-                    raise
+        )
+        customerio_event.save()
+        return customerio_event
 
-        return None
+    def send_event(self, customerio_event: CustomerIOEvent) -> None:
+        '''
+        Deliver stored event to customer.io. Event *idempotency_key* is used as event id,
+        so repeated delivery does not create a duplicate.
+
+        Raises customerio.CustomerIOException on failure.
+        '''
+        http_client = HttpClient('customerio')
+        start = time.time()
+        try:
+            self.client.send_request('POST', self.client.get_event_query_string(customerio_event.lead.leadid), {
+                'id': customerio_event.idempotency_key,
+                'name': customerio_event.name,
+                'data': json.loads(customerio_event.kwargs or '{}'),
+            })
+        except customerio.CustomerIOException:
+            http_client.record_failure(time.time() - start)
+            raise
+        http_client.record_success(time.time() - start)
+
+    def dispatch_events(self, limit: int = 500, threads: int = 10) -> typing.List[CustomerIOEvent]:
+        '''
+        Claim up to *limit* pending :model:`adsrental.CustomerIOEvent` and deliver them concurrently.
+        Events stuck in *Sending* state after dispatcher crash are claimed again.
+
+        Returns processed events.
+        '''
+        http_client = HttpClient('customerio')
+        if not self.client or not http_client.is_available():
+            return []
+
+        now = timezone.now()
+        CustomerIOEvent.objects.filter(
+            status=CustomerIOEvent.STATUS_SENDING,
+            next_attempt__lt=now - datetime.timedelta(minutes=CustomerIOEvent.SENDING_TIMEOUT_MINUTES),
+        ).update(status=CustomerIOEvent.STATUS_PENDING, dispatch_id=None)
+
+        dispatch_id = uuid.uuid4().hex
+        event_ids = list(CustomerIOEvent.objects.filter(
+            status=CustomerIOEvent.STATUS_PENDING,
+        ).exclude(
+            next_attempt__gt=now,
+        ).order_by('id').values_list('id', flat=True)[:limit])
+        CustomerIOEvent.objects.filter(id__in=event_ids, status=CustomerIOEvent.STATUS_PENDING).update(
+            status=CustomerIOEvent.STATUS_SENDING,
+            dispatch_id=dispatch_id,
+            next_attempt=now,
+            attempts=F('attempts') + 1,
+        )
+        customerio_events = list(CustomerIOEvent.objects.filter(dispatch_id=dispatch_id).select_related('lead'))
+        if not customerio_events:
+            return []
+
+        def send(customerio_event: CustomerIOEvent) -> CustomerIOEvent:
+            try:
+                self.send_event(customerio_event)
+            except customerio.CustomerIOException as e:
+                customerio_event.mark_failed(str(e))
+            else:
+                customerio_event.mark_sent()
+            return customerio_event
+
+        pool = ThreadPool(processes=threads)
+        try:
+            customerio_events = pool.map(send, customerio_events)
+        finally:
+            pool.close()
+        bulk_update(customerio_events, update_fields=['status', 'sent', 'sent_date', 'next_attempt', 'last_error', 'dispatch_id'])
+        return customerio_events
 
     def is_enabled(self) -> bool:
         'Check if client is initialized.'
@@ -122,7 +376,13 @@ class CustomerIOClient():
 
 
 class ShipStationClient():
-    'Handles order creation and check on shipstation.'
+    '''
+    Handles order creation and check on shipstation.
+
+    Orders are not posted right away: *add_lead_order* queues :model:`adsrental.ShipStationOrderRequest`
+    and *dispatch_orders* submits queued orders with bulk *createorders* endpoint.
+    '''
+    BATCH_SIZE = 100
 
     def __init__(self) -> None:
         self.client = ShipStation(
@@ -132,13 +392,24 @@ class ShipStationClient():
         'Get native shipstation client'
         return self.client
 
-    def add_lead_order(self, lead: Lead, status: typing.Optional[str] = None) -> ShipStationOrder:
-        'Create order for given lead.'
+    def add_lead_order(self, lead: Lead, status: typing.Optional[str] = None) -> ShipStationOrderRequest:
+        'Queue order creation or update for given lead. Pending request for the same lead is reused.'
         if not lead.shipstation_order_number:
             random_str = str(uuid.uuid4()).replace('-', '')[:10]
             lead.shipstation_order_number = '{}__{}'.format(lead.raspberry_pi.rpid, random_str)
             lead.save()
 
+        order_request = ShipStationOrderRequest.objects.filter(lead=lead, status=ShipStationOrderRequest.STATUS_PENDING).first()
+        if not order_request:
+            order_request = ShipStationOrderRequest(lead=lead)
+        order_request.order_key = lead.shipstation_order_number
+        order_request.order_status = status or lead.SHIPSTATION_ORDER_STATUS_AWAITING_SHIPMENT
+        order_request.next_attempt = None
+        order_request.save()
+        return order_request
+
+    def get_lead_order(self, lead: Lead, status: str) -> ShipStationOrder:
+        'Build order for given lead.'
         order = ShipStationOrder(
             order_key=lead.shipstation_order_number, order_number=lead.shipstation_order_number)
         order.set_customer_details(
@@ -146,9 +417,6 @@ class ShipStationClient():
             email=lead.email,
         )
 
-        if status:
-            order.set_status(status)
-
         shipping_address = ShipStationAddress(
             name=lead.safe_name(),
             # company=sf_lead.company,
@@ -172,25 +440,94 @@ class ShipStationClient():
         item.set_weight(ShipStationWeight(units='ounces', value=0))
         order.add_item(item)
 
-        order.set_status('awaiting_shipment')
-
-        self.client.add_order(order)
-        self.submit_orders()
+        order.set_status(status)
         return order
 
-    def submit_orders(self) -> None:
-        'Submit all created or changed orders.'
-        for order in self.client.orders:
-            self.post(
-                endpoint='/orders/createorder',
-                data=order.as_dict()
-            )
+    def submit_order_requests(self, order_requests: typing.List[ShipStationOrderRequest]) -> None:
+        '''
+        Submit orders with one *createorders* call per *BATCH_SIZE* orders.
+        Every request is marked as sent or failed with error returned by ShipStation for this order.
+        '''
+        for index in range(0, len(order_requests), self.BATCH_SIZE):
+            batch = []
+            for order_request in order_requests[index:index + self.BATCH_SIZE]:
+                if not order_request.lead.raspberry_pi:
+                    order_request.mark_failed('Lead has no RaspberryPi assigned')
+                    continue
+                if order_request.order_key != order_request.lead.shipstation_order_number:
+                    order_request.order_key = order_request.lead.shipstation_order_number
+                batch.append(order_request)
+            if not batch:
+                continue
 
-    def post(self, endpoint: str, data: typing.Dict) -> None:
+            try:
+                results = self.post(
+                    endpoint='/orders/createorders',
+                    data=[self.get_lead_order(i.lead, i.order_status).as_dict() for i in batch],
+                ).get('results') or []
+            except (ValueError, requests.exceptions.RequestException) as e:
+                for order_request in batch:
+                    order_request.mark_failed(str(e))
+                continue
+
+            results_map = {i.get('orderKey'): i for i in results}
+            for order_request in batch:
+                result = results_map.get(order_request.order_key)
+                if not result:
+                    order_request.mark_failed('Order is missing in ShipStation response')
+                elif not result.get('success'):
+                    order_request.mark_failed(result.get('errorMessage') or 'Unknown error')
+                else:
+                    order_request.mark_sent(result.get('orderId'))
+
+    def dispatch_orders(self, limit: int = 500) -> typing.List[ShipStationOrderRequest]:
+        '''
+        Claim up to *limit* pending :model:`adsrental.ShipStationOrderRequest` and submit them in batches.
+        Requests stuck in *Sending* state after dispatcher crash are claimed again.
+
+        Returns processed requests.
+        '''
+        if not HttpClient('shipstation').is_available():
+            return []
+
+        now = timezone.now()
+        ShipStationOrderRequest.objects.filter(
+            status=ShipStationOrderRequest.STATUS_SENDING,
+            next_attempt__lt=now - datetime.timedelta(minutes=ShipStationOrderRequest.SENDING_TIMEOUT_MINUTES),
+        ).update(status=ShipStationOrderRequest.STATUS_PENDING, dispatch_id=None)
+
+        dispatch_id = uuid.uuid4().hex
+        order_request_ids = list(ShipStationOrderRequest.objects.filter(
+            status=ShipStationOrderRequest.STATUS_PENDING,
+        ).exclude(
+            next_attempt__gt=now,
+        ).order_by('id').values_list('id', flat=True)[:limit])
+        ShipStationOrderRequest.objects.filter(id__in=order_request_ids, status=ShipStationOrderRequest.STATUS_PENDING).update(
+            status=ShipStationOrderRequest.STATUS_SENDING,
+            dispatch_id=dispatch_id,
+            next_attempt=now,
+            attempts=F('attempts') + 1,
+        )
+        order_requests = list(ShipStationOrderRequest.objects.filter(dispatch_id=dispatch_id).select_related('lead', 'lead__raspberry_pi'))
+        if not order_requests:
+            return []
+
+        self.submit_order_requests(order_requests)
+        bulk_update(order_requests, update_fields=['order_key', 'status', 'shipstation_order_id', 'sent_date', 'next_attempt', 'last_error', 'dispatch_id'])
+
+        leads = []
+        for order_request in order_requests:
+            if order_request.status == ShipStationOrderRequest.STATUS_SENT and order_request.lead.shipstation_order_status != order_request.order_status:
+                order_request.lead.shipstation_order_status = order_request.order_status
+                leads.append(order_request.lead)
+        bulk_update(leads, update_fields=['shipstation_order_status'])
+        return order_requests
+
+    def post(self, endpoint: str, data: typing.Any) -> typing.Dict:
         'Rewrite original shipstaion.post method to catch exceptions.'
         url = '{}{}'.format(self.client.url, endpoint)
         headers = {'content-type': 'application/json'}
-        response = requests.post(
+        response = HttpClient('shipstation').post(
             url,
             auth=(self.client.key, self.client.secret),
             data=json.dumps(data),
@@ -198,13 +535,14 @@ class ShipStationClient():
         )
         if response.status_code not in [200, 201]:
             raise ValueError('Shipstation Error', response.status_code, data, response.text)
+        return response.json()
 
     @staticmethod
     def get_lead_order_data(lead: Lead) -> typing.Optional[typing.Dict]:
         'Get order data for lead.'
         if not lead.shipstation_order_number:
             return None
-        data = requests.get(
+        data = HttpClient('shipstation').get(
             'https://ssapi.shipstation.com/orders',
             params={'orderNumber': lead.shipstation_order_number},
             auth=requests.auth.HTTPBasicAuth(
@@ -214,6 +552,75 @@ class ShipStationClient():
         return data
 
 
+class USPSTrackingClient():
+    '''
+    Batched client for USPS TrackV2 API.
+
+    One request contains up to *BATCH_SIZE* tracking codes, batches are sent concurrently
+    over pooled *HttpClient* session. Combined response is split back to per-code XML documents
+    compatible with *Lead.get_pi_delivered_from_xml*.
+    '''
+    URL = 'https://secure.shippingapis.com/ShippingAPI.dll'
+    USER_ID = '039ADCRU4974'
+    BATCH_SIZE = 10
+
+    def __init__(self) -> None:
+        self.http_client = HttpClient('usps')
+
+    def get_request_xml(self, tracking_codes: typing.List[str]) -> str:
+        'Build TrackRequest XML for a list of tracking codes'
+        root = ElementTree.Element('TrackRequest', USERID=self.USER_ID)
+        for tracking_code in tracking_codes:
+            ElementTree.SubElement(root, 'TrackID', ID=tracking_code)
+        return ElementTree.tostring(root, encoding='unicode')
+
+    @staticmethod
+    def split_response_xml(response_xml: str) -> typing.Dict[str, str]:
+        'Split TrackResponse XML to separate TrackResponse documents by tracking code'
+        try:
+            tree = ElementTree.fromstring(response_xml)
+        except ElementTree.ParseError:
+            return {}
+
+        result = {}
+        for track_info in tree.findall('TrackInfo'):
+            tracking_code = track_info.get('ID')
+            if not tracking_code:
+                continue
+            result[tracking_code] = '<TrackResponse>{}</TrackResponse>'.format(ElementTree.tostring(track_info, encoding='unicode'))
+        return result
+
+    def get_batch_tracking_info(self, tracking_codes: typing.List[str]) -> typing.Dict[str, str]:
+        'Get tracking info for up to *BATCH_SIZE* codes with one request. Codes with failed request are missing in result.'
+        try:
+            response = self.http_client.get(self.URL, params={
+                'API': 'TrackV2',
+                'xml': self.get_request_xml(tracking_codes),
+            })
+        except requests.exceptions.RequestException:
+            return {}
+
+        return self.split_response_xml(response.text)
+
+    def get_tracking_info(self, tracking_codes: typing.Iterable[str], threads: int = 10) -> typing.Dict[str, str]:
+        'Get tracking info XML for all codes, batches are processed concurrently.'
+        unique_codes = sorted(set(i for i in tracking_codes if i))
+        batches = [unique_codes[i:i + self.BATCH_SIZE] for i in range(0, len(unique_codes), self.BATCH_SIZE)]
+        if not batches:
+            return {}
+
+        pool = ThreadPool(processes=max(1, min(threads, len(batches))))
+        try:
+            results = pool.map(self.get_batch_tracking_info, batches)
+        finally:
+            pool.close()
+
+        tracking_info = {}
+        for result in results:
+            tracking_info.update(result)
+        return tracking_info
+
+
 class BotoResource():
     'Handles AWS boto operations.'
 
@@ -616,6 +1023,26 @@ class PingCacheHelper():
             keys = [i for i in keys if i != key]
             self.cache.set(self.KEYS, keys)
 
+    def get_many(self, rpids: typing.Iterable[str]) -> typing.Dict[str, typing.Dict]:
+        'Get valid data for all rpids with one cache request'
+        result = {}
+        keys_map = {self.get_key(rpid): rpid for rpid in rpids}
+        for key, data in self.cache.get_many(list(keys_map.keys())).items():
+            if self.is_data_valid(data):
+                result[keys_map[key]] = data
+        return result
+
+    def delete_many(self, rpids: typing.Iterable[str]) -> None:
+        '''Delete cache data for all rpids and update keys list once'''
+        delete_keys = set(self.get_key(rpid) for rpid in rpids)
+        if not delete_keys:
+            return
+        self.cache.delete_many(list(delete_keys))
+        keys = self.cache.get(self.KEYS, [])
+        new_keys = [i for i in keys if i not in delete_keys]
+        if len(new_keys) != len(keys):
+            self.cache.set(self.KEYS, new_keys)
+
     def get_data_for_request(self, request: HttpRequest) -> typing.Dict:
         '''Get data from cache or db using request.GET'''
         rpid = request.GET.get('rpid', '').strip()
@@ -648,6 +1075,79 @@ class PingCacheHelper():
         return ping_data
 
 
+class DeviceConfigCacheHelper():
+    '''
+    Stores versioned config documents served to RaspberryPi devices, so unchanged config
+    can be returned or confirmed with 304 by ETag without DB access.
+
+    Documents are invalidated on :model:`adsrental.RaspberryPi`, :model:`adsrental.Lead`,
+    :model:`adsrental.LeadAccount` and :model:`adsrental.EC2Instance` save.
+    '''
+    KEY_TEMPLATE = 'device_config_{}_{}'
+    NAMES = ['connection_data', 'ec2_data']
+    TTL_SECONDS = 3600
+
+    def __init__(self) -> None:
+        self.cache = cache
+
+    def get_key(self, name: str, rpid: str) -> str:
+        'Get key string for given document name and rpid'
+        return self.KEY_TEMPLATE.format(name, rpid)
+
+    def get(self, name: str, rpid: str) -> typing.Optional[typing.Dict]:
+        'Get document with "etag" and "data" keys if it is valid'
+        document = self.cache.get(self.get_key(name, rpid))
+        if not document or document.get('v') != settings.CACHE_VERSION:
+            return None
+        return document
+
+    def set(self, name: str, rpid: str, data: typing.Dict) -> typing.Dict:
+        'Store new document version for rpid and return it'
+        etag = '"{}"'.format(hashlib.md5(json.dumps(data, sort_keys=True).encode()).hexdigest())
+        document = dict(
+            v=settings.CACHE_VERSION,
+            etag=etag,
+            data=data,
+        )
+        self.cache.set(self.get_key(name, rpid), document, self.TTL_SECONDS)
+        return document
+
+    def delete_many(self, rpids: typing.Iterable[str]) -> None:
+        'Invalidate all documents for given rpids'
+        keys = []
+        for rpid in rpids:
+            if not rpid:
+                continue
+            for name in self.NAMES:
+                keys.append(self.get_key(name, rpid))
+        if keys:
+            self.cache.delete_many(keys)
+
+    @staticmethod
+    def is_not_modified(request: HttpRequest, document: typing.Dict) -> bool:
+        'Check if device already has this document version'
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH', '')
+        return document['etag'] in [i.strip() for i in if_none_match.split(',')]
+
+    @staticmethod
+    def get_response(document: typing.Dict) -> JsonResponse:
+        'Get JSON response for document with ETag header'
+        response = JsonResponse(document['data'])
+        response['ETag'] = document['etag']
+        return response
+
+
+def generate_ulid() -> str:
+    'Generate time-sortable ULID string, accepted by customer.io as event id'
+    alphabet = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+    value = (int(time.time() * 1000) << 80) | secrets.randbits(80)
+    result = []
+    for _ in range(26):
+        result.append(alphabet[value & 31])
+        value >>= 5
+    return ''.join(reversed(result))
+
+
 def generate_password(length: int = 12) -> str:
     result = []
     for _ in range(2):
@@ -717,10 +1217,22 @@ class AdsdbClientNotFoundError(AdsdbClientError):
 
 
 class AdsdbClient():
+    '''
+    Client for adsdb.io accounts API.
+
+    Pages and id chunks are fetched concurrently with at most *threads* requests at once
+    over pooled *HttpClient* session.
+    '''
     BANNED_FILTERS = {'rules': [{'field': 'accounts.account_status', 'data': 3}]}
+    CREATE_BATCH_SIZE = 50
+    UPDATED_FIELD = 'accounts.updated_at'
+    DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+    THREADS = 5
 
-    def __init__(self):
+    def __init__(self, threads=THREADS):
         self.auth = requests.auth.HTTPBasicAuth(settings.ADSDB_USERNAME, settings.ADSDB_PASSWORD)
+        self.http_client = HttpClient('adsdb')
+        self.threads = threads
 
     @staticmethod
     def chunks(iterable, chunk_size):
@@ -728,37 +1240,257 @@ class AdsdbClient():
         for i in range(0, len(iterable), chunk_size):
             yield iterable[i:i + chunk_size]
 
+    @classmethod
+    def get_updated_filters(cls, updated_since, filters=None):
+        'Add rule to *filters* to get only accounts changed after *updated_since*'
+        filters = dict(filters or {})
+        filters['rules'] = [
+            *filters.get('rules', []),
+            {'field': cls.UPDATED_FIELD, 'op': 'ge', 'data': updated_since.astimezone(datetime.timezone.utc).strftime(cls.DATETIME_FORMAT)},
+        ]
+        return filters
+
+    def map(self, func, items):
+        'Run func for all items with bounded parallelism'
+        items = list(items)
+        if len(items) < 2:
+            return [func(i) for i in items]
+
+        pool = ThreadPool(processes=min(self.threads, len(items)))
+        try:
+            return pool.map(func, items)
+        finally:
+            pool.close()
+
     def get_accounts_by_ids(self, ids, limit=200, **kwargs):
-        result = []
-        for ids_group in self.chunks(ids, limit):
+        def get_ids_group(ids_group):
             try:
-                result.extend(self.get_accounts(limit=len(ids_group), ids=','.join(ids_group), **kwargs))
+                return self.get_accounts(limit=len(ids_group), ids=','.join(ids_group), **kwargs)
             except AdsdbClientError as e:
                 raise AdsdbClientNotFoundError({'ids': ids_group, 'error': e})
 
+        result = []
+        for accounts in self.map(get_ids_group, self.chunks(ids, limit)):
+            result.extend(accounts)
+
         return result
 
+    def get_page(self, page, limit, **kwargs):
+        data = self.http_client.post(
+            'https://www.adsdb.io/api/v1/accounts/get',
+            idempotent=True,
+            auth=self.auth,
+            json={
+                'limit': limit,
+                'page': page,
+                **kwargs,
+            },
+        ).json()
+        if 'data' not in data:
+            raise AdsdbClientError(data)
+
+        return data
+
     def get_accounts(self, limit=200, **kwargs):
-        page = 1
-        next_page_exists = True
-        result = []
-        while next_page_exists:
-            data = requests.post(
-                'https://www.adsdb.io/api/v1/accounts/get',
-                auth=self.auth,
-                json={
-                    'limit': limit,
-                    'page': page,
-                    **kwargs,
-                },
-            ).json()
-            if 'data' not in data:
-                raise AdsdbClientError(data)
-
-            result.extend(data['data'])
-            page += 1
-            if len(result) >= data.get('count', 0):
-                next_page_exists = False
-                break
+        '''
+        Get all pages of accounts. First page tells total count, the rest of pages are fetched concurrently.
+        '''
+        data = self.get_page(1, limit, **kwargs)
+        result = list(data['data'])
+        count = data.get('count', 0)
+        if not data['data'] or len(result) >= count:
+            return result
+
+        pages = (count + limit - 1) // limit
+        for page_data in self.map(lambda page: self.get_page(page, limit, **kwargs), range(2, pages + 1)):
+            result.extend(page_data['data'])
 
         return result
+
+    def get_changed_accounts(self, updated_since, filters=None, **kwargs):
+        '''
+        Get accounts changed after *updated_since*.
+
+        Raises *AdsdbClientError* if any returned account has no *updated_at* or it is older than *updated_since*,
+        so ignored or misread filter is not taken for a complete delta.
+        '''
+        accounts = self.get_accounts(filters=self.get_updated_filters(updated_since, filters), **kwargs)
+        updated_since_utc = updated_since.astimezone(datetime.timezone.utc).replace(tzinfo=None, microsecond=0)
+        for account in accounts:
+            try:
+                updated_at = datetime.datetime.strptime(account['updated_at'], self.DATETIME_FORMAT)
+            except (KeyError, TypeError, ValueError):
+                raise AdsdbClientError({'error': 'No valid updated_at in changed accounts', 'account': account})
+            if updated_at < updated_since_utc:
+                raise AdsdbClientError({'error': f'{self.UPDATED_FIELD} filter is ignored', 'account': account})
+        return accounts
+
+    def create_accounts(self, accounts_data):
+        'Create several accounts with one request. Returns parsed response, raises AdsdbClientError on failure.'
+        response = self.http_client.post(
+            'https://www.adsdb.io/api/v1/accounts/create-s',
+            json=accounts_data,
+            auth=self.auth,
+        )
+        try:
+            response_json = response.json()
+        except ValueError:
+            raise AdsdbClientError({'status': response.status_code, 'text': response.text})
+        if response.status_code not in [200, 409] or not isinstance(response_json.get('account_data'), list):
+            raise AdsdbClientError({'status': response.status_code, 'response': response_json})
+        return response_json
+
+    def update_account(self, account_id, data):
+        'Update one account. Returns parsed response, raises AdsdbClientError on failure.'
+        response = self.http_client.post(
+            'https://www.adsdb.io/api/v1/accounts/update-s',
+            json={
+                'account_id': int(account_id),
+                'data': data,
+            },
+            auth=self.auth,
+        )
+        try:
+            response_json = response.json()
+        except ValueError:
+            raise AdsdbClientError({'status': response.status_code, 'text': response.text})
+        if response.status_code != 200:
+            raise AdsdbClientError({'status': response.status_code, 'response': response_json})
+        return response_json
+
+    def push_create_batch(self, adsdb_pushes):
+        'Create accounts for pushes with one request, assign returned ids to lead accounts'
+        try:
+            response_json = self.create_accounts([json.loads(i.request_data) for i in adsdb_pushes])
+        except (AdsdbClientError, requests.exceptions.RequestException) as e:
+            for adsdb_push in adsdb_pushes:
+                adsdb_push.mark_failed(str(e))
+            return
+
+        account_data = response_json['account_data']
+        for index, adsdb_push in enumerate(adsdb_pushes):
+            item = account_data[index] if index < len(account_data) else {}
+            adsdb_push.response = json.dumps(item)
+            adsdb_account_id = item.get('id') or item.get('conflict_id')
+            if not adsdb_account_id:
+                adsdb_push.mark_failed('No account id in response')
+                continue
+            adsdb_push.lead_account.adsdb_account_id = str(adsdb_account_id)
+            adsdb_push.mark_sent()
+
+    def push_update(self, adsdb_push):
+        'Update existing account for push'
+        try:
+            response_json = self.update_account(adsdb_push.lead_account.adsdb_account_id, json.loads(adsdb_push.request_data))
+        except (AdsdbClientError, requests.exceptions.RequestException) as e:
+            adsdb_push.mark_failed(str(e))
+            return
+        adsdb_push.response = json.dumps(response_json)
+        adsdb_push.mark_sent()
+
+    def dispatch_pushes(self, limit=500):
+        '''
+        Claim up to *limit* pending :model:`adsrental.AdsdbPush` that did not get updates for *COALESCE_SECONDS* and send them.
+        New accounts are created in batches of *CREATE_BATCH_SIZE*, updates are sent concurrently.
+        Pushes stuck in *Sending* state after dispatcher crash are claimed again.
+        Created accounts with ID that belongs to another lead account are failed without retry.
+
+        Returns processed pushes.
+        '''
+        if not self.http_client.is_available():
+            return []
+
+        lead_account_model = apps.get_model('adsrental', 'LeadAccount')
+        now = timezone.now()
+        AdsdbPush.objects.filter(
+            status=AdsdbPush.STATUS_SENDING,
+            next_attempt__lt=now - datetime.timedelta(minutes=AdsdbPush.SENDING_TIMEOUT_MINUTES),
+        ).update(status=AdsdbPush.STATUS_PENDING, dispatch_id=None)
+
+        dispatch_id = uuid.uuid4().hex
+        adsdb_push_ids = list(AdsdbPush.objects.filter(
+            status=AdsdbPush.STATUS_PENDING,
+            requested__lte=now - datetime.timedelta(seconds=AdsdbPush.COALESCE_SECONDS),
+        ).exclude(
+            next_attempt__gt=now,
+        ).order_by('id').values_list('id', flat=True)[:limit])
+        AdsdbPush.objects.filter(id__in=adsdb_push_ids, status=AdsdbPush.STATUS_PENDING).update(
+            status=AdsdbPush.STATUS_SENDING,
+            dispatch_id=dispatch_id,
+            next_attempt=now,
+            attempts=F('attempts') + 1,
+        )
+        adsdb_pushes = list(AdsdbPush.objects.filter(dispatch_id=dispatch_id).select_related(
+            'lead_account',
+            'lead_account__lead',
+            'lead_account__lead__bundler',
+            'lead_account__lead__raspberry_pi',
+        ).order_by('id'))
+        if not adsdb_pushes:
+            return []
+
+        latest_pushes = {}
+        for adsdb_push in adsdb_pushes:
+            if adsdb_push.lead_account_id in latest_pushes:
+                latest_pushes[adsdb_push.lead_account_id].mark_skipped()
+            latest_pushes[adsdb_push.lead_account_id] = adsdb_push
+
+        create_pushes = []
+        update_pushes = []
+        for adsdb_push in latest_pushes.values():
+            data = adsdb_push.lead_account.get_adsdb_push_data()
+            if data is None:
+                adsdb_push.mark_skipped()
+                continue
+            adsdb_push.request_data = json.dumps(data)
+            if adsdb_push.lead_account.adsdb_account_id:
+                update_pushes.append(adsdb_push)
+            else:
+                create_pushes.append(adsdb_push)
+
+        self.map(self.push_create_batch, self.chunks(create_pushes, self.CREATE_BATCH_SIZE))
+        self.map(self.push_update, update_pushes)
+
+        created_ids = [i.lead_account.adsdb_account_id for i in create_pushes if i.status == AdsdbPush.STATUS_SENT]
+        conflicting_ids = set(lead_account_model.objects.filter(
+            adsdb_account_id__in=created_ids,
+        ).exclude(
+            id__in=[i.lead_account_id for i in create_pushes],
+        ).values_list('adsdb_account_id', flat=True))
+        for adsdb_account_id in set(created_ids):
+            if created_ids.count(adsdb_account_id) > 1:
+                conflicting_ids.add(adsdb_account_id)
+
+        for adsdb_push in create_pushes:
+            lead_account = adsdb_push.lead_account
+            if adsdb_push.status != AdsdbPush.STATUS_SENT or lead_account.adsdb_account_id in conflicting_ids:
+                continue
+            # Targeted update, so account ID is not overwritten from instances loaded before it was assigned
+            assigned = lead_account_model.objects.filter(id=lead_account.id, adsdb_account_id__isnull=True).update(adsdb_account_id=lead_account.adsdb_account_id)
+            if not assigned:
+                current_id = lead_account_model.objects.filter(id=lead_account.id).values_list('adsdb_account_id', flat=True).first()
+                if current_id != lead_account.adsdb_account_id:
+                    conflicting_ids.add(lead_account.adsdb_account_id)
+
+        lead_accounts = []
+        for adsdb_push in adsdb_pushes:
+            lead_account = adsdb_push.lead_account
+            if adsdb_push.status == AdsdbPush.STATUS_SENT and adsdb_push in create_pushes and lead_account.adsdb_account_id in conflicting_ids:
+                # Retry would create one more account in Adsdb, conflict has to be resolved manually
+                adsdb_push.mark_failed(f'Adsdb account ID {lead_account.adsdb_account_id} conflicts with ID already assigned to this or another lead account', retry=False)
+                adsdb_push.sent_date = None
+                lead_account.adsdb_account_id = None
+            if adsdb_push.status == AdsdbPush.STATUS_SENT:
+                lead_account.adsdb_sync_status = lead_account_model.ADSDB_SYNC_STATUS_SYNCED
+                lead_account.adsdb_sync_date = now
+                lead_accounts.append(lead_account)
+            elif adsdb_push.status == AdsdbPush.STATUS_FAILED:
+                lead_account.adsdb_sync_status = lead_account_model.ADSDB_SYNC_STATUS_FAILED
+                lead_accounts.append(lead_account)
+            elif adsdb_push.status == AdsdbPush.STATUS_SKIPPED and adsdb_push in latest_pushes.values():
+                lead_account.adsdb_sync_status = None
+                lead_accounts.append(lead_account)
+
+        bulk_update(adsdb_pushes, update_fields=['status', 'next_attempt', 'last_error', 'dispatch_id', 'request_data', 'response', 'sent_date'])
+        bulk_update(lead_accounts, update_fields=['adsdb_sync_status', 'adsdb_sync_date'])
+        return adsdb_pushes
@@ -8,6 +8,7 @@ from django.utils.decorators import method_decorator
 from django.utils import timezone
 
 from adsrental.models.lead_history import LeadHistory
+from adsrental.models.lead_check_month import LeadCheckMonth
 from adsrental.models.bundler import Bundler
 from adsrental.models.lead import Lead
 from adsrental.utils import get_month_boundaries_for_dt
@@ -33,15 +34,14 @@ class BundlerCheckDaysView(View):
         if not request.user.is_superuser and request.user.bundler != bundler:
             raise Http404
 
-        lead_histories = LeadHistory.objects.filter(
-            lead__bundler=bundler,
-            date__gte=start_date,
-            date__lt=end_date.date(),
-            lead=lead,
-        ).select_related('lead', 'lead__raspberry_pi')
+        lead_histories = []
+        if lead.bundler_id == bundler.id:
+            lead_histories = [i for i in LeadCheckMonth.get_lead_histories([lead.leadid], start_date.date()) if i.date < end_date.date()]
+        for lead_history in lead_histories:
+            lead_history.lead = lead
+        lead_histories = LeadHistory.calculate_amounts(lead_histories)
         total = decimal.Decimal('0.00')
         for lead_history in lead_histories:
-            lead_history.amount, lead_history.note = lead_history.get_amount_with_note()
             total += lead_history.amount
 
         return render(request, 'bundler_report_check_days.html', context=dict(
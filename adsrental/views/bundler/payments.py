@@ -19,6 +19,7 @@ from adsrental.models.lead_account import LeadAccount
 from adsrental.models.bundler import Bundler
 from adsrental.models.raspberry_pi import RaspberryPi
 from adsrental.models.bundler_payment import BundlerPayment
+from adsrental.models.bundler_payment_total import BundlerPaymentTotal
 from adsrental.models.bundler_payments_report import BundlerPaymentsReport
 from adsrental.models.signals import slack_new_report
 
@@ -181,7 +182,7 @@ class BundlerPaymentsView(View):
                     lead_account.bundler_paid_date = now_utc
                     lead_account.save()
 
-            bundler_payments.update(report=report, paid=True)
+            BundlerPaymentTotal.set_paid(bundler_payments, True, report=report)
             for chargebacks in bundler_chargebacks_by_bundler_id.values():
                 for chargeback in chargebacks:
                     chargeback.report = report
@@ -0,0 +1,30 @@
+from django.http import JsonResponse, HttpRequest
+
+from adsrental.views.cron.base import CronView
+from adsrental.models.adsdb_push import AdsdbPush
+from adsrental.utils import AdsdbClient
+
+
+class AdsdbDispatchView(CronView):
+    '''
+    Send pending :model:`adsrental.AdsdbPush` to Adsdb. New accounts are created in batches, updates are sent concurrently.
+
+    Runs every minute by cron.
+
+    Parameters:
+
+    * limit - max pushes to send per run. Default 500
+    * threads - amount of concurrent requests. Default 5
+    '''
+    def get(self, request: HttpRequest) -> JsonResponse:
+        limit = int(request.GET.get('limit', 500))
+        threads = int(request.GET.get('threads', AdsdbClient.THREADS))
+        adsdb_pushes = AdsdbClient(threads=threads).dispatch_pushes(limit=limit)
+        return self.render({
+            'result': True,
+            'sent': [i.lead_account_id for i in adsdb_pushes if i.status == AdsdbPush.STATUS_SENT],
+            'skipped': [i.lead_account_id for i in adsdb_pushes if i.status == AdsdbPush.STATUS_SKIPPED],
+            'retry': {i.lead_account_id: i.last_error for i in adsdb_pushes if i.status == AdsdbPush.STATUS_PENDING},
+            'failed': {i.lead_account_id: i.last_error for i in adsdb_pushes if i.status == AdsdbPush.STATUS_FAILED},
+            'pending_total': AdsdbPush.objects.filter(status=AdsdbPush.STATUS_PENDING).count(),
+        })
@@ -1,14 +1,35 @@
 from django.views import View
 from django.http import JsonResponse, HttpRequest
 
-from adsrental.models.bundler import Bundler
 from adsrental.models.bundler_lead_stat import BundlerLeadStat
 
 
 class BundlerLeadStatsCalculateView(View):
+    '''
+    Recalculate :model:`adsrental.BundlerLeadStat` for all :model:`adsrental.Bundler` entries.
+    Runs hourly by cron.
+
+    Counters are updated on every change, so this job reconciles them: moves time windows
+    and fixes changes made outside of counter hooks. All counters are calculated with one grouped query
+    and stat rows are replaced in one transaction.
+    '''
     def get(self, request: HttpRequest) -> JsonResponse:
-        for bundler in Bundler.objects.all():
-            BundlerLeadStat.calculate(bundler)
+        old_counters = {}
+        for row in BundlerLeadStat.objects.values('bundler_id', *BundlerLeadStat.COUNTER_FIELDS):
+            old_counters[row.pop('bundler_id')] = row
+
+        drifted = {}
+        bundler_lead_stats = BundlerLeadStat.calculate_all()
+        for bundler_lead_stat in bundler_lead_stats:
+            old_row = old_counters.get(bundler_lead_stat.bundler_id)
+            if old_row is None:
+                continue
+            for field in BundlerLeadStat.COUNTER_FIELDS:
+                if old_row[field] != getattr(bundler_lead_stat, field):
+                    drifted[field] = drifted.get(field, 0) + 1
+
         return JsonResponse({
             'result': True,
+            'bundlers': len(bundler_lead_stats),
+            'drifted': drifted,
         })
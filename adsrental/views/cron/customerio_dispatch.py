@@ -0,0 +1,29 @@
+from django.http import JsonResponse, HttpRequest
+
+from adsrental.views.cron.base import CronView
+from adsrental.models.customerio_event import CustomerIOEvent
+from adsrental.utils import CustomerIOClient
+
+
+class CustomerIODispatchView(CronView):
+    '''
+    Deliver pending :model:`adsrental.CustomerIOEvent` outbox entries to customer.io in concurrent batches.
+
+    Runs every minute by cron.
+
+    Parameters:
+
+    * limit - max events to deliver per run. Default 500
+    * threads - amount of concurrent requests. Default 10
+    '''
+    def get(self, request: HttpRequest) -> JsonResponse:
+        limit = int(request.GET.get('limit', 500))
+        threads = int(request.GET.get('threads', 10))
+        customerio_events = CustomerIOClient().dispatch_events(limit=limit, threads=threads)
+        return self.render({
+            'result': True,
+            'sent': [i.id for i in customerio_events if i.status == CustomerIOEvent.STATUS_SENT],
+            'retry': [i.id for i in customerio_events if i.status == CustomerIOEvent.STATUS_PENDING],
+            'failed': [i.id for i in customerio_events if i.status == CustomerIOEvent.STATUS_FAILED],
+            'pending_total': CustomerIOEvent.objects.filter(status=CustomerIOEvent.STATUS_PENDING).count(),
+        })
@@ -0,0 +1,17 @@
+from django.http import JsonResponse, HttpRequest
+
+from adsrental.views.cron.base import CronView
+from adsrental.utils import HttpClient
+
+
+class HttpStatsView(CronView):
+    '''
+    Show outbound HTTP counters and circuit breaker state for each integration from *HttpClient*.
+
+    Used for monitoring, counters are kept in cache and are reset on cache flush.
+    '''
+    def get(self, request: HttpRequest) -> JsonResponse:
+        return self.render({
+            'result': True,
+            'stats': HttpClient.get_stats(),
+        })
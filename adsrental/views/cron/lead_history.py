@@ -1,9 +1,6 @@
-import os
 import datetime
 from dateutil import parser
 
-from django.conf import settings
-
 from adsrental.models.lead import Lead
 from adsrental.models.lead_history import LeadHistory
 from adsrental.models.lead_history_month import LeadHistoryMonth
@@ -17,10 +14,10 @@ class LeadHistoryView(CronView):
     Parameters:
 
     * rpid - if provided, process only one lead, used for debug purposes
-    * now - if 'true' creates or updates :model:`adsrental.LeadHistory` objects with current lead stats. Runs on cron hourly.
+    * now - if 'true' creates or updates :model:`adsrental.LeadHistory` objects with current lead stats in bulk. Runs on cron hourly. Days that are over are added to :model:`adsrental.LeadHistoryMonth` totals.
     * force - forde replace :model:`adsrental.LeadHistory` on run even if they are calculated
-    * date - 'YYYY-MM-DD', if provided calculates :model:`adsrental.LeadHistory` from logs. Does not check worng password and potentially incaccurate.
-    * aggregate - if 'true' calculates :model:`adsrental.LeadHistoryMonth`. You can also provide *date*
+    * date - 'YYYY-MM-DD', if provided calculates :model:`adsrental.LeadHistory` from logs. Does not check worng password and potentially incaccurate. Use *backfill_lead_history* command for date ranges.
+    * aggregate - if 'true' calculates :model:`adsrental.LeadHistoryMonth` for all leads in bulk. You can also provide *date*
     '''
 
     def get(self, request):
@@ -32,33 +29,29 @@ class LeadHistoryView(CronView):
         results = []
 
         if now:
-            leads = Lead.objects.filter(status__in=Lead.STATUSES_ACTIVE, raspberry_pi__isnull=False).prefetch_related('raspberry_pi')
+            leads = Lead.objects.filter(status__in=Lead.STATUSES_ACTIVE, raspberry_pi__isnull=False)
             if rpid:
                 leads = leads.filter(raspberry_pi__rpid=rpid)
-            for lead in leads:
-                LeadHistory.upsert_for_lead(lead)
+            count = LeadHistory.upsert_for_leads(leads)
+            finalized = LeadHistoryMonth.apply_finalized_days()
             return self.render({
                 'result': True,
+                'count': count,
+                'finalized': finalized,
             })
         if aggregate:
             start_date = parser.parse(date).date() if date else datetime.date.today()
             start_date = start_date.replace(day=1)
-            leads = Lead.objects.filter(raspberry_pi__last_seen__gte=start_date).prefetch_related('raspberry_pi')
+            leads = Lead.objects.filter(raspberry_pi__last_seen__gte=start_date)
             if rpid:
                 leads = leads.filter(raspberry_pi__rpid=rpid)
             else:
                 LeadHistoryMonth.objects.filter(date=date).delete()
 
-            counter = 0
-            for lead in leads:
-                item = LeadHistoryMonth.get_or_create(lead=lead, date=start_date)
-                item.aggregate()
-                if item.amount or item.id:
-                    item.save()
-                counter += 1
+            items = LeadHistoryMonth.aggregate_month(leads, start_date)
             return self.render({
                 'result': True,
-                'count': leads.count(),
+                'count': len(items),
             })
         if date:
             leads = Lead.objects.filter(status__in=Lead.STATUSES_ACTIVE, raspberry_pi__isnull=False).select_related('raspberry_pi')
@@ -66,33 +59,21 @@ class LeadHistoryView(CronView):
                 leads = leads.filter(raspberry_pi__rpid=rpid)
             date = parser.parse(date).date()
             if force:
-                LeadHistory.objects.filter(date=date, lead__raspberry_pi__rpid=rpid).delete()
+                LeadHistory.objects.filter(date=date, lead__in=leads).delete()
             for lead in leads:
                 if not force:
                     lead_history = LeadHistory.objects.filter(lead=lead, date=date).first()
                     if lead_history:
                         continue
 
-                log_filename = '{}.log'.format(date.strftime('%Y%m%d'))
-                log_path = os.path.join(settings.RASPBERRY_PI_LOG_PATH, lead.raspberry_pi.rpid, log_filename)
-                checks_online = 0
-                checks_offline = 24
-                checks_wrong_password = 0
-                if os.path.exists(log_path):
-                    file_data = open(log_path).read()
-                    pings_online = file_data.count('"result": true')
-                    checks_online = min(pings_online // 20, 24)
-                    checks_offline = 24 - checks_online
-                    if 'Wrong password' in file_data:
-                        checks_wrong_password = 1
+                pings_online, wrong_password, _ = LeadHistory.scan_log(LeadHistory.get_log_path(lead.raspberry_pi.rpid, date))
+                checks = LeadHistory.get_checks_from_log(pings_online, wrong_password)
                 LeadHistory(
                     lead=lead,
                     date=date,
-                    checks_online=checks_online,
-                    checks_offline=checks_offline,
-                    checks_wrong_password=checks_wrong_password,
+                    **checks
                 ).save()
-                results.append([lead.email, checks_online])
+                results.append([lead.email, checks['checks_online']])
 
             return self.render({
                 'results': results,
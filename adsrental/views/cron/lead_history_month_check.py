@@ -0,0 +1,59 @@
+from django.http import JsonResponse, HttpRequest
+
+from adsrental.views.cron.base import CronView
+from adsrental.models.lead import Lead
+from adsrental.models.lead_history import LeadHistory
+from adsrental.models.lead_history_month import LeadHistoryMonth
+
+
+class LeadHistoryMonthCheckView(CronView):
+    '''
+    Compare incrementally updated :model:`adsrental.LeadHistoryMonth` totals with full recalculation
+    from :model:`adsrental.LeadHistory` and report leads with different totals.
+
+    Runs daily by cron.
+
+    Parameters:
+
+    * date - 'YYYY-MM-DD', any date in month to check. Default is current month
+    * execute - if 'true' fixes totals for reported leads with full recalculation
+    '''
+    def get(self, request: HttpRequest) -> JsonResponse:
+        date_month = self.get_datetime().date().replace(day=1)
+        month = LeadHistoryMonth(date=date_month)
+        lead_ids = set(LeadHistoryMonth.objects.filter(date=date_month).values_list('lead_id', flat=True))
+        lead_ids.update(LeadHistory.objects.filter(
+            date__gte=month.get_first_day(),
+            date__lte=month.get_last_day(),
+            finalized=True,
+        ).values_list('lead_id', flat=True).distinct())
+
+        stored_map = {}
+        for row in LeadHistoryMonth.objects.filter(date=date_month).order_by('-id').values('lead_id', *LeadHistoryMonth.TOTALS_FIELDS):
+            stored_map[row.pop('lead_id')] = row
+
+        leads = Lead.objects.filter(leadid__in=lead_ids)
+        mismatches = {}
+        for item in LeadHistoryMonth.aggregate_month(leads, date_month, save=False):
+            expected = {i: getattr(item, i) for i in LeadHistoryMonth.TOTALS_FIELDS}
+            expected['amount'] = round(expected['amount'], 2)
+            stored = stored_map.get(item.lead_id)
+            if stored is None and not item.amount:
+                continue
+            if stored != expected:
+                mismatches[item.lead_id] = {
+                    k: [str(stored[k]) if stored else None, str(v)]
+                    for k, v in expected.items()
+                    if not stored or stored[k] != v
+                }
+
+        if mismatches and self.is_execute():
+            LeadHistoryMonth.aggregate_month(Lead.objects.filter(leadid__in=mismatches.keys()), date_month)
+
+        return self.render({
+            'result': True,
+            'date': date_month.strftime('%Y-%m-%d'),
+            'checked': len(lead_ids),
+            'mismatches': mismatches,
+            'execute': self.is_execute(),
+        })
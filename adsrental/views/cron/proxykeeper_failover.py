@@ -0,0 +1,43 @@
+from django.http import JsonResponse, HttpRequest
+
+from adsrental.views.cron.base import CronView
+from adsrental.models.proxykeeper_stat import ProxykeeperStat
+from adsrental.models.raspberry_pi import RaspberryPi
+from adsrental.models.lead import Lead
+
+
+class ProxykeeperFailoverView(CronView):
+    '''
+    Recalculate :model:`adsrental.ProxykeeperStat` and move all active tunnels from dead proxykeepers
+    to the least loaded alive ones in one transaction. Devices get new config on next ping.
+
+    Runs every 10 minutes by cron.
+
+    Parameters:
+
+    * execute - if true, tunnels are moved, otherwise only dead proxykeepers are reported
+    '''
+    def get(self, request: HttpRequest) -> JsonResponse:
+        ProxykeeperStat.calculate_all()
+        dead_hostnames = ProxykeeperStat.get_dead_hostnames()
+        raspberry_pis = []
+        if dead_hostnames:
+            raspberry_pis = list(RaspberryPi.objects.filter(
+                is_proxy_tunnel=True,
+                proxy_hostname__in=dead_hostnames,
+                lead__status__in=Lead.STATUSES_ACTIVE,
+            ))
+
+        reassignments = []
+        if self.is_execute():
+            reassignments = RaspberryPi.bulk_reassign_proxy(raspberry_pis, exclude_hostnames=dead_hostnames)
+            if reassignments:
+                ProxykeeperStat.calculate_all()
+
+        return self.render({
+            'result': True,
+            'dead': dead_hostnames,
+            'rpids': [i.rpid for i in raspberry_pis],
+            'moved': [[i.raspberry_pi_id, i.old_proxy_hostname, i.new_proxy_hostname] for i in reassignments],
+            'execute': self.is_execute(),
+        })
@@ -0,0 +1,18 @@
+from django.views import View
+from django.http import JsonResponse, HttpRequest
+
+from adsrental.models.proxykeeper_stat import ProxykeeperStat
+
+
+class ProxykeeperStatCalculateView(View):
+    '''
+    Recalculate :model:`adsrental.ProxykeeperStat` for all proxykeepers.
+
+    Also recalculated every 10 minutes by *proxykeeper_failover* cron.
+    '''
+    def get(self, request: HttpRequest) -> JsonResponse:
+        stats = ProxykeeperStat.calculate_all()
+        return JsonResponse({
+            'result': True,
+            'hosts': {i.proxy_hostname: i.tunnels_total for i in stats},
+        })
@@ -0,0 +1,27 @@
+from django.http import JsonResponse, HttpRequest
+
+from adsrental.views.cron.base import CronView
+from adsrental.models.shipstation_order_request import ShipStationOrderRequest
+from adsrental.utils import ShipStationClient
+
+
+class ShipStationDispatchView(CronView):
+    '''
+    Submit pending :model:`adsrental.ShipStationOrderRequest` to ShipStation with bulk order endpoint.
+
+    Runs every minute by cron.
+
+    Parameters:
+
+    * limit - max orders to submit per run. Default 500
+    '''
+    def get(self, request: HttpRequest) -> JsonResponse:
+        limit = int(request.GET.get('limit', 500))
+        order_requests = ShipStationClient().dispatch_orders(limit=limit)
+        return self.render({
+            'result': True,
+            'sent': [i.order_key for i in order_requests if i.status == ShipStationOrderRequest.STATUS_SENT],
+            'retry': {i.order_key: i.last_error for i in order_requests if i.status == ShipStationOrderRequest.STATUS_PENDING},
+            'failed': {i.order_key: i.last_error for i in order_requests if i.status == ShipStationOrderRequest.STATUS_FAILED},
+            'pending_total': ShipStationOrderRequest.objects.filter(status=ShipStationOrderRequest.STATUS_PENDING).count(),
+        })
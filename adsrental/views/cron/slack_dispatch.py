@@ -0,0 +1,30 @@
+from django.http import JsonResponse, HttpRequest
+
+from adsrental.views.cron.base import CronView
+from adsrental.models.slack_message import SlackMessage
+from adsrental.slack_bot import SlackBot
+
+
+class SlackDispatchView(CronView):
+    '''
+    Deliver queued :model:`adsrental.SlackMessage` with per-recipient rate limit and digesting.
+
+    Runs every minute by cron.
+
+    Parameters:
+
+    * limit - max messages to process per run. Default 1000
+    * threads - amount of recipients processed concurrently. Default 10
+    '''
+    def get(self, request: HttpRequest) -> JsonResponse:
+        limit = int(request.GET.get('limit', 1000))
+        threads = int(request.GET.get('threads', 10))
+        slack_messages = SlackBot.dispatch(limit=limit, threads=threads)
+        return self.render({
+            'result': True,
+            'sent': [i.id for i in slack_messages if i.status == SlackMessage.STATUS_SENT],
+            'digested': [i.id for i in slack_messages if i.status == SlackMessage.STATUS_SENT and i.thread_ts],
+            'retry': [i.id for i in slack_messages if i.status == SlackMessage.STATUS_PENDING],
+            'failed': [i.id for i in slack_messages if i.status == SlackMessage.STATUS_FAILED],
+            'pending_total': SlackMessage.objects.filter(status=SlackMessage.STATUS_PENDING).count(),
+        })
@@ -1,22 +1,62 @@
+import datetime
+
 from django.conf import settings
 from django.http import JsonResponse, HttpRequest
+from django.utils import timezone
 
-from adsrental.models import LeadAccount, User
-from adsrental.utils import AdsdbClient
+from adsrental.models import LeadAccount, User, SyncWatermark
+from adsrental.utils import AdsdbClient, AdsdbClientError
 from adsrental.views.cron.base import CronView
 
 
 class SyncAdsDBView(CronView):
+    '''
+    Ban :model:`adsrental.LeadAccount` that are dead in adsdb.
+
+    By default only accounts changed in adsdb since previous successful run are requested, see :model:`adsrental.SyncWatermark`.
+    Full sync of all accounts runs if there was no full sync for *FULL_SYNC_HOURS*,
+    or if adsdb fails or returns accounts that do not match changed accounts filter.
+
+    Parameters:
+
+    * execute - if 'true' bans accounts in bulk, otherwise only reports them and does not move watermark
+    * full - if 'true' forces full sync
+    * safe - if 'true' full sync gets all adsdb accounts instead of requesting them by ids
+    '''
+    WATERMARK = 'adsdb'
+    WATERMARK_FULL = 'adsdb_full'
+    WATERMARK_OVERLAP = datetime.timedelta(minutes=10)
+    FULL_SYNC_HOURS = 24
+
+    def is_full_sync(self, now: datetime.datetime) -> bool:
+        if self._request.GET.get('full', '') == 'true':
+            return True
+        last_full_sync = SyncWatermark.get_value(self.WATERMARK_FULL)
+        if not last_full_sync or not SyncWatermark.get_value(self.WATERMARK):
+            return True
+        return last_full_sync < now - datetime.timedelta(hours=self.FULL_SYNC_HOURS)
+
     def get(self, request: HttpRequest) -> JsonResponse:
         messages = []
+        ban_reasons = {}
         safe = request.GET.get('safe', '') == 'true'
         user = User.objects.get(email=settings.ADSDBSYNC_USER_EMAIL)
         known_ban_reasons = dict(LeadAccount.BAN_REASON_CHOICES).keys()
         lead_accounts = LeadAccount.objects.filter(adsdb_account_id__isnull=False).exclude(status=LeadAccount.STATUS_BANNED)
+        now = timezone.now()
+        full = self.is_full_sync(now)
+        delta_error = None
 
-        if safe:
+        if not full:
+            updated_since = SyncWatermark.get_value(self.WATERMARK) - self.WATERMARK_OVERLAP
+            try:
+                lead_accounts = lead_accounts.get_adsdb_data_changed(updated_since, filters=AdsdbClient.BANNED_FILTERS, archive=True)
+            except AdsdbClientError as e:
+                delta_error = str(e)
+                full = True
+        if full and safe:
             lead_accounts.get_adsdb_data_safe(filters=AdsdbClient.BANNED_FILTERS, archive=True)
-        else:
+        elif full:
             lead_accounts.get_adsdb_data(filters=AdsdbClient.BANNED_FILTERS, archive=True)
 
         for lead_account in lead_accounts:
@@ -34,11 +74,19 @@ class SyncAdsDBView(CronView):
                 ban_reason = adsdb_account['ban_message']
 
             messages.append(f'{lead_account.account_type} account {lead_account.username} banned for {ban_reason}')
+            ban_reasons[lead_account.id] = ban_reason
+
+        if self.is_execute() and ban_reasons:
+            LeadAccount.objects.filter(id__in=ban_reasons.keys()).bulk_ban(edited_by=user, reasons=ban_reasons)
 
-            if self.is_execute():
-                lead_account.ban(edited_by=user, reason=ban_reason)
+        if self.is_execute():
+            SyncWatermark.set_value(self.WATERMARK, now)
+            if full:
+                SyncWatermark.set_value(self.WATERMARK_FULL, now)
 
         return self.render({
             'messages': messages,
             'total_banned': len(messages),
+            'full': full,
+            'delta_error': delta_error,
         })
@@ -1,6 +1,6 @@
 'Sync delivered status from ShippingAPI'
+import math
 import datetime
-from multiprocessing.pool import ThreadPool
 
 from django.views import View
 from django.http import JsonResponse
@@ -8,26 +8,26 @@ from django.utils import timezone
 from django_bulk_update.helper import bulk_update
 
 from adsrental.models.lead import Lead
-from adsrental.utils import CustomerIOClient
+from adsrental.models.shipment_tracking import ShipmentTracking
+from adsrental.utils import CustomerIOClient, USPSTrackingClient
 
 
 class SyncDeliveredView(View):
     '''
-    Get data from *https://secure.shippingapis.com/ShippingAPI.dll* and update *pi_delivered* field in :model:`adsrental.Lead.`
+    Get data from *https://secure.shippingapis.com/ShippingAPI.dll* and update *pi_delivered* field in :model:`adsrental.Lead`.
     Run by cron hourly.
 
+    Tracking codes are sent in batches of *USPSTrackingClient.BATCH_SIZE* per request.
+    Leads with terminal tracking state (delivered or returned) reuse saved :model:`adsrental.ShipmentTracking` unless *all* is set.
+    :model:`adsrental.ShipmentTracking` is written only if response changed, lead is written only if *pi_delivered* changed.
+
     Parameters:
 
-    * all - if 'true' runs through all leads including delivered. this can take a while.
+    * all - if 'true' runs through all leads including delivered and requests fresh info for all of them. this can take a while.
     * test - if 'true' does not make any changes to DB or send customerIO events
     * days_ago - check only leads shipped N days ago. Default 31
-    * threads - amount of threads to send requests to remote server. Default 10.
+    * threads - amount of batches to send to remote server concurrently. Default 10.
     '''
-    def get_tracking_info(self, lead):
-        'Miltithreding func to build array fo results'
-        tracking_info_xml = lead.get_shippingapis_tracking_info()
-        return [lead.email, tracking_info_xml]
-
     def get(self, request):
         'Get endpoint'
         leads = []
@@ -35,6 +35,10 @@ class SyncDeliveredView(View):
         not_delivered = []
         errors = []
         changed = []
+        terminal = []
+        changed_leads = []
+        new_trackings = []
+        changed_trackings = []
         process_all = request.GET.get('all') == 'true'
         test = request.GET.get('test') == 'true'
         threads = int(request.GET.get('threads', 10))
@@ -44,40 +48,58 @@ class SyncDeliveredView(View):
                 status__in=Lead.STATUSES_ACTIVE,
                 usps_tracking_code__isnull=False,
                 ship_date__gte=timezone.now() - datetime.timedelta(days=days_ago),
-            ).prefetch_related('raspberry_pi')
+            ).prefetch_related('raspberry_pi').select_related('shipment_tracking')
         else:
             leads = Lead.objects.filter(
                 status__in=Lead.STATUSES_ACTIVE,
                 usps_tracking_code__isnull=False,
                 pi_delivered=False,
                 ship_date__gte=timezone.now() - datetime.timedelta(days=days_ago),
-            ).prefetch_related('raspberry_pi')
-        pool = ThreadPool(processes=threads)
-        results = pool.map(self.get_tracking_info, leads)
-        results_map = dict(results)
+            ).prefetch_related('raspberry_pi').select_related('shipment_tracking')
+        leads = list(leads)
+        terminal_leads = set() if process_all else set(i for i in leads if i.is_tracking_terminal())
+        tracking_codes = set(i.usps_tracking_code for i in leads if i not in terminal_leads)
+        tracking_info_map = USPSTrackingClient().get_tracking_info(tracking_codes, threads=threads)
         for lead in leads:
             label = lead.raspberry_pi.rpid if lead.raspberry_pi else lead.email
-            tracking_info_xml = results_map.get(lead.email)
+            if lead in terminal_leads:
+                terminal.append(label)
+                tracking_info_xml = lead.get_shipment_tracking().get_raw_xml()
+            else:
+                tracking_info_xml = tracking_info_map.get(lead.usps_tracking_code)
             pi_delivered = lead.get_pi_delivered_from_xml(tracking_info_xml)
             if pi_delivered is None:
                 errors.append(label)
                 continue
-            lead.tracking_info = tracking_info_xml
+
+            try:
+                shipment_tracking = lead.shipment_tracking
+            except ShipmentTracking.DoesNotExist:
+                shipment_tracking = ShipmentTracking(lead=lead)
+            if shipment_tracking.update_from_xml(lead.usps_tracking_code, tracking_info_xml):
+                if shipment_tracking.pk:
+                    changed_trackings.append(shipment_tracking)
+                else:
+                    new_trackings.append(shipment_tracking)
+
+            old_values = (lead.pi_delivered, lead.delivery_date)
             if pi_delivered is not None and pi_delivered != lead.pi_delivered:
                 changed.append(label)
                 if not test and pi_delivered:
                     CustomerIOClient().send_lead_event(lead, CustomerIOClient.EVENT_DELIVERED, tracking_code=lead.usps_tracking_code)
             lead.update_pi_delivered(pi_delivered, tracking_info_xml)
+            if (lead.pi_delivered, lead.delivery_date) != old_values:
+                changed_leads.append(lead)
 
             if pi_delivered:
                 delivered.append(label)
             else:
                 not_delivered.append(label)
 
+        ShipmentTracking.objects.bulk_create(new_trackings)
+        bulk_update(changed_trackings, update_fields=['tracking_code', 'payload_hash', 'raw_data', 'status', 'last_event', 'delivery_date', 'updated'])
         if not test:
-            bulk_update(leads, update_fields=['tracking_info', 'pi_delivered', 'delivery_date'])
-        else:
-            bulk_update(leads, update_fields=['tracking_info', ])
+            bulk_update(changed_leads, update_fields=['pi_delivered', 'delivery_date'])
 
         return JsonResponse({
             'all': process_all,
@@ -86,4 +108,7 @@ class SyncDeliveredView(View):
             'delivered': delivered,
             'not_delivered': not_delivered,
             'errors': errors,
+            'terminal': terminal,
+            'tracking_updated': len(new_trackings) + len(changed_trackings),
+            'requests': math.ceil(len(tracking_codes) / USPSTrackingClient.BATCH_SIZE),
         })
@@ -2,6 +2,7 @@ from django.views import View
 from django.http import JsonResponse
 
 from adsrental.models.ec2_instance import EC2Instance
+from adsrental.models.instance_sync_run import InstanceSyncRun
 from adsrental.utils import BotoResource
 
 
@@ -18,8 +19,17 @@ class SyncEC2View(View):
     * execute - if 'true' performs all actions in AWS, otherwise it is test run
     '''
     ec2_max_results = 300
+    sync_fields = ('status', 'email', 'rpid', 'lead_id', 'is_duplicate', 'hostname', 'ip_address')
+
+    @staticmethod
+    def iterate_pages(boto_instances, instance_sync_run):
+        'Iterate boto collection page by page, every page is one API call'
+        for page in boto_instances.pages():
+            instance_sync_run.api_calls += 1
+            yield from page
 
     def _handler_process_all(self, terminate_stopped, execute):
+        instance_sync_run = InstanceSyncRun(provider=InstanceSyncRun.PROVIDER_EC2)
         boto_resource = BotoResource().get_resource()
         ec2_instances = EC2Instance.objects.all()
         ec2_instances_map = {}
@@ -33,16 +43,25 @@ class SyncEC2View(View):
         terminated_rpids = []
         deleted_rpids = []
         existing_instance_ids = []
-        for boto_instance in boto_instances:
+        for boto_instance in self.iterate_pages(boto_instances, instance_sync_run):
             status = boto_instance.state['Name']
             if status == EC2Instance.STATUS_TERMINATED:
                 continue
             counter += 1
             existing_instance_ids.append(boto_instance.id)
-            instance = EC2Instance.upsert_from_boto(boto_instance, ec2_instances_map.get(boto_instance.id))
+            existing_instance = ec2_instances_map.get(boto_instance.id)
+            old_values = [getattr(existing_instance, i) for i in self.sync_fields] if existing_instance else None
+            instance = EC2Instance.upsert_from_boto(boto_instance, existing_instance)
+            if not existing_instance:
+                instance_sync_run.instances_created += 1
+            elif old_values != [getattr(instance, i) for i in self.sync_fields]:
+                instance_sync_run.instances_updated += 1
+            else:
+                instance_sync_run.instances_unchanged += 1
             if terminate_stopped:
                 if instance and instance.status == EC2Instance.STATUS_STOPPED and not instance.lead:
                     if execute:
+                        instance_sync_run.api_calls += 1
                         instance.terminate()
                     terminated_rpids.append(instance.rpid)
 
@@ -53,6 +72,10 @@ class SyncEC2View(View):
                 instance.save()
                 instance.delete()
 
+        instance_sync_run.instances_total = counter
+        instance_sync_run.instances_deleted = len(deleted_rpids)
+        instance_sync_run.finish()
+
         return JsonResponse({
             'total': counter,
             'terminated_rpids': terminated_rpids,
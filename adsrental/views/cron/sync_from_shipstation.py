@@ -1,12 +1,18 @@
 import datetime
+import typing
+from multiprocessing.pool import ThreadPool
 
+import pytz
 import requests
 from django.views import View
 from django.http import JsonResponse
 from django.conf import settings
 from django.utils import timezone
+from django_bulk_update.helper import bulk_update
 
 from adsrental.models.lead import Lead
+from adsrental.models.sync_watermark import SyncWatermark
+from adsrental.utils import HttpClient
 
 
 class SyncFromShipStationView(View):
@@ -14,11 +20,91 @@ class SyncFromShipStationView(View):
     Get shipments from shipstation API and populate *usps_tracking_code* in :model:`adsrental.Lead` identified by *shipstation_order_number*.
     Runs hourly by cron.
 
+    Only shipments created and orders modified since previous successful run are requested,
+    see :model:`adsrental.SyncWatermark`. Pages are fetched concurrently, leads are matched with one query per endpoint
+    and saved with bulk update.
+
     Parameters:
 
-    * days_ago - Get orders that were created X days ago. If not provided, gets orders 1 day ago.
+    * days_ago - Get orders that were created X days ago instead of changes since previous run. If there was no successful run, gets orders 1 day ago.
     * force - if 'true' removes tracking codes that are not present in SS.
+    * find - if 'true' links orders to leads without order number by RPID.
+    * threads - amount of pages to fetch concurrently. Default 5.
     '''
+    BASE_URL = 'https://ssapi.shipstation.com'
+    PAGE_SIZE = 500
+    SHIPSTATION_TIMEZONE = 'America/Los_Angeles'
+    SHIPSTATION_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+    WATERMARK_SHIPMENTS = 'shipstation_shipments'
+    WATERMARK_ORDERS = 'shipstation_orders'
+    WATERMARK_OVERLAP = datetime.timedelta(hours=1)
+
+    def get_page(self, endpoint: str, params: typing.Dict, page: int) -> typing.Dict:
+        'Get one page from ShipStation API'
+        return HttpClient('shipstation').get(
+            f'{self.BASE_URL}/{endpoint}',
+            params={**params, 'page': page, 'pageSize': self.PAGE_SIZE},
+            auth=requests.auth.HTTPBasicAuth(settings.SHIPSTATION_API_KEY, settings.SHIPSTATION_API_SECRET),
+        ).json()
+
+    def get_rows(self, endpoint: str, key: str, params: typing.Dict, threads: int) -> typing.List[typing.Dict]:
+        'Get first page to find out amount of pages, the rest of pages are fetched concurrently'
+        response = self.get_page(endpoint, params, 1)
+        if key not in response:
+            raise ValueError('Shipstation Error', endpoint, response)
+
+        pages = int(response.get('pages') or 1)
+        rows = list(response[key])
+        if pages < 2:
+            return rows
+
+        pool = ThreadPool(processes=max(1, min(threads, pages - 1)))
+        try:
+            responses = pool.map(lambda page: self.get_page(endpoint, params, page), range(2, pages + 1))
+        finally:
+            pool.close()
+
+        for page_response in responses:
+            if key not in page_response:
+                raise ValueError('Shipstation Error', endpoint, page_response)
+            rows.extend(page_response[key])
+        return rows
+
+    def get_date_start(self, watermark_name: str, days_ago: typing.Optional[int], now: datetime.datetime) -> str:
+        'Get start date for request in ShipStation timezone'
+        date_start = None
+        if days_ago is None:
+            date_start = SyncWatermark.get_value(watermark_name)
+            if date_start:
+                date_start = date_start - self.WATERMARK_OVERLAP
+        if date_start is None:
+            date_start = now - datetime.timedelta(days=days_ago or 1)
+        return timezone.localtime(date_start, pytz.timezone(self.SHIPSTATION_TIMEZONE)).strftime(self.SHIPSTATION_DATETIME_FORMAT)
+
+    def get_leads_map(self, order_numbers: typing.List[str], find: bool) -> typing.Tuple[typing.Dict[str, Lead], typing.List[str]]:
+        'Match leads to order numbers with one query. If *find* is set, missing leads are matched by RPID and get order number'
+        leads_map = {}
+        for lead in Lead.objects.filter(shipstation_order_number__in=order_numbers):
+            leads_map[lead.shipstation_order_number] = lead
+
+        orders_found = []
+        missing_order_numbers = [i for i in order_numbers if i not in leads_map]
+        if find and missing_order_numbers:
+            rpid_order_numbers = {i.split('__')[0]: i for i in missing_order_numbers}
+            found_leads = Lead.objects.filter(
+                shipstation_order_number=None,
+                raspberry_pi__rpid__in=rpid_order_numbers.keys(),
+            ).select_related('raspberry_pi')
+            for lead in found_leads:
+                order_number = rpid_order_numbers[lead.raspberry_pi.rpid]
+                if order_number in leads_map:
+                    continue
+                lead.shipstation_order_number = order_number
+                leads_map[order_number] = lead
+                orders_found.append(order_number)
+            bulk_update([leads_map[i] for i in orders_found], update_fields=['shipstation_order_number'])
+
+        return leads_map, orders_found
 
     def get(self, request):
         order_numbers = []
@@ -26,87 +112,55 @@ class SyncFromShipStationView(View):
         orders_not_found = []
         orders_found = []
         orders_status_updated = []
-        days_ago = int(request.GET.get('days_ago', '1'))
+        days_ago = int(request.GET['days_ago']) if request.GET.get('days_ago') else None
         force = request.GET.get('force', '') == 'true'
         find = request.GET.get('find', '') == 'true'
-        request_params = {}
-        date_start = timezone.now() - datetime.timedelta(days=days_ago)
-        request_params['shipDateStart'] = date_start.strftime(settings.SYSTEM_DATE_FORMAT)
-
-        last_page = False
-        page = 0
-        while not last_page:
-            if page:
-                request_params['page'] = page
-            page += 1
-            response = requests.get(
-                'https://ssapi.shipstation.com/shipments',
-                params=request_params,
-                auth=requests.auth.HTTPBasicAuth(settings.SHIPSTATION_API_KEY, settings.SHIPSTATION_API_SECRET),
-            ).json()
-
-            if 'shipments' not in response:
-                break
-
-            last_page = len(response['shipments']) < 100
-
-            for row in response['shipments']:
-                order_number = row['orderNumber']
-                rpid = order_number.split('__')[0]
-                lead = Lead.objects.filter(shipstation_order_number=order_number).first()
-
-                if find and not lead:
-                    lead = Lead.objects.filter(shipstation_order_number=None, raspberry_pi__rpid=rpid).first()
-                    if lead:
-                        lead.shipstation_order_number = order_number
-                        lead.save()
-                        orders_found.append(order_number)
-
-                if not lead:
-                    orders_not_found.append(order_number)
-                    continue
-
-                if force:
-                    lead.usps_tracking_code = None
-                if not lead.usps_tracking_code:
-                    orders_new.append(order_number)
-                lead.update_from_shipstation(row)
-                order_numbers.append(order_number)
-
-        last_page = False
-        page = 0
-        request_params = {}
-        request_params['modifyDateStart'] = date_start.strftime(settings.SYSTEM_DATE_FORMAT)
-        while not last_page:
-            if page:
-                request_params['page'] = page
-            page += 1
-            response = requests.get(
-                'https://ssapi.shipstation.com/orders',
-                params=request_params,
-                auth=requests.auth.HTTPBasicAuth(settings.SHIPSTATION_API_KEY, settings.SHIPSTATION_API_SECRET),
-            ).json()
-            last_page = len(response['orders']) < 100
-            for row in response['orders']:
-                order_number = row['orderNumber']
-                rpid = order_number.split('__')[0]
-                lead = Lead.objects.filter(shipstation_order_number=order_number).first()
-
-                if find and not lead:
-                    lead = Lead.objects.filter(shipstation_order_number=None, raspberry_pi__rpid=rpid).first()
-                    if lead:
-                        lead.shipstation_order_number = order_number
-                        lead.save()
-                        orders_found.append(order_number)
-
-                if not lead:
-                    orders_not_found.append(order_number)
-                    continue
-
-                if lead.shipstation_order_status != row['orderStatus']:
-                    lead.shipstation_order_status = row['orderStatus']
-                    lead.save()
-                    orders_status_updated.append(order_number)
+        threads = int(request.GET.get('threads', 5))
+        now = timezone.now()
+
+        shipments_date_start = self.get_date_start(self.WATERMARK_SHIPMENTS, days_ago, now)
+        shipments = self.get_rows('shipments', 'shipments', {'createDateStart': shipments_date_start}, threads)
+        leads_map, found = self.get_leads_map(list(dict.fromkeys(i['orderNumber'] for i in shipments)), find)
+        orders_found.extend(found)
+        changed_leads = {}
+        for row in shipments:
+            order_number = row['orderNumber']
+            lead = leads_map.get(order_number)
+            if not lead:
+                orders_not_found.append(order_number)
+                continue
+
+            if force:
+                lead.usps_tracking_code = None
+                changed_leads[lead.pk] = lead
+            if not lead.usps_tracking_code:
+                orders_new.append(order_number)
+            if lead.update_from_shipstation(row, save=False):
+                changed_leads[lead.pk] = lead
+            order_numbers.append(order_number)
+
+        bulk_update(list(changed_leads.values()), update_fields=['ship_date', 'usps_tracking_code', 'pi_delivered'])
+        SyncWatermark.set_value(self.WATERMARK_SHIPMENTS, now)
+
+        orders_date_start = self.get_date_start(self.WATERMARK_ORDERS, days_ago, now)
+        orders = self.get_rows('orders', 'orders', {'modifyDateStart': orders_date_start}, threads)
+        leads_map, found = self.get_leads_map(list(dict.fromkeys(i['orderNumber'] for i in orders)), find)
+        orders_found.extend(found)
+        changed_leads = {}
+        for row in orders:
+            order_number = row['orderNumber']
+            lead = leads_map.get(order_number)
+            if not lead:
+                orders_not_found.append(order_number)
+                continue
+
+            if lead.shipstation_order_status != row['orderStatus']:
+                lead.shipstation_order_status = row['orderStatus']
+                changed_leads[lead.pk] = lead
+                orders_status_updated.append(order_number)
+
+        bulk_update(list(changed_leads.values()), update_fields=['shipstation_order_status'])
+        SyncWatermark.set_value(self.WATERMARK_ORDERS, now)
 
         return JsonResponse({
             'result': True,
@@ -116,4 +170,6 @@ class SyncFromShipStationView(View):
             'orders_not_found': orders_not_found,
             'orders_status_updated': orders_status_updated,
             'days_ago': days_ago,
+            'shipments_date_start': shipments_date_start,
+            'orders_date_start': orders_date_start,
         })
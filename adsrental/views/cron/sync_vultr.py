@@ -0,0 +1,30 @@
+from django.http import JsonResponse, HttpRequest
+
+from adsrental.views.cron.base import CronView
+from adsrental.models.vultr_instance import VultrInstance
+
+
+class SyncVultrView(CronView):
+    '''
+    Sync all :model:`adsrental.VultrInstance` from Vultr with one API call. Stats are stored in :model:`adsrental.InstanceSyncRun`.
+
+    Runs hourly by cron.
+
+    Parameters:
+
+    * keep_missing - if 'true' instances removed from Vultr are not deleted from DB
+    '''
+    def get(self, request: HttpRequest) -> JsonResponse:
+        keep_missing = request.GET.get('keep_missing', '') == 'true'
+        instance_sync_run = VultrInstance.sync_all_from_vultr(delete=not keep_missing)
+        return self.render({
+            'result': instance_sync_run.error is None,
+            'error': instance_sync_run.error,
+            'api_calls': instance_sync_run.api_calls,
+            'total': instance_sync_run.instances_total,
+            'created': instance_sync_run.instances_created,
+            'updated': instance_sync_run.instances_updated,
+            'deleted': instance_sync_run.instances_deleted,
+            'unchanged': instance_sync_run.instances_unchanged,
+            'duration': instance_sync_run.duration,
+        })
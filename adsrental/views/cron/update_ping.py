@@ -1,10 +1,13 @@
 from django.core.cache import cache
 from django.views import View
 from django.http import JsonResponse
+from django.utils import timezone
 from django_bulk_update.helper import bulk_update
 
+from adsrental.models.bundler_lead_stat import BundlerLeadStat
 from adsrental.models.ec2_instance import EC2Instance
 from adsrental.models.raspberry_pi import RaspberryPi
+from adsrental.models.sync_watermark import SyncWatermark
 from adsrental.utils import PingCacheHelper
 
 
@@ -14,6 +17,8 @@ class UpdatePingView(View):
 
     Runs every 2 minutes by cron.
 
+    RaspberryPi online/offline transitions since previous flush are applied to :model:`adsrental.BundlerLeadStat` counters.
+
     Parameters:
 
     * rpid - if provided, process only one lead, used for debug purposes
@@ -36,7 +41,10 @@ class UpdatePingView(View):
 
         rpids = []
         invalidated_rpids = []
+        now = timezone.now()
+        previous_flush = SyncWatermark.get_value(BundlerLeadStat.ONLINE_WATERMARK) or now
         raspberry_pis = RaspberryPi.objects.filter(rpid__in=rpids_ping_map.keys()).prefetch_related('lead')
+        was_online = {i.rpid: BundlerLeadStat.is_online(i, previous_flush) for i in raspberry_pis}
         ec2_instances = EC2Instance.objects.filter(rpid__in=rpids_ping_map.keys()).select_related('lead')
         ec2_instances_map = {}
         for ec2_instance in ec2_instances:
@@ -58,9 +66,12 @@ class UpdatePingView(View):
 
         bulk_update(raspberry_pis, update_fields=['ip_address', 'first_seen', 'first_tested', 'online_since_date', 'last_seen', 'version'])
         bulk_update(ec2_instances, update_fields=['last_troubleshoot', 'tunnel_up_date'])
+        transitions = BundlerLeadStat.update_online_counters(list(raspberry_pis), was_online, previous_flush, now)
+        SyncWatermark.set_value(BundlerLeadStat.ONLINE_WATERMARK, now)
         return JsonResponse({
             'rpids': rpids,
             'invalidated': invalidated_rpids,
+            'transitions': transitions,
             'result': True,
         })
 
@@ -47,6 +47,6 @@ class ChangeAddressView(View):
             ShipStationClient().add_lead_order(lead, status=Lead.SHIPSTATION_ORDER_STATUS_AWAITING_SHIPMENT)
             lead.shipstation_order_status = Lead.SHIPSTATION_ORDER_STATUS_AWAITING_SHIPMENT
             lead.save()
-            messages.success(request, 'Shipstation order successfully updated')
+            messages.success(request, 'Shipstation order update queued')
 
         return redirect('dashboard_change_address', lead_id=lead.leadid)
@@ -1,45 +1,65 @@
-from django.db.models import Sum, Q
+import decimal
+
+from django.db.models import Sum
 from django.views import View
 from django.shortcuts import render, Http404
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
 
 from adsrental.models.bundler_payment import BundlerPayment
+from adsrental.models.bundler_payment_total import BundlerPaymentTotal
 from adsrental.forms import BundlerPaymentsForm
 
 
 class BundlerPaymentsView(View):
+    '''
+    Paid and not paid :model:`adsrental.BundlerPayment` totals by payment type and by bundler.
+
+    Totals are read from :model:`adsrental.BundlerPaymentTotal` ledger with one query,
+    links lead to payment rows in admin.
+    '''
     template_name = 'report/bundler_payments.html'
 
+    @staticmethod
+    def get_totals(rows, key=None):
+        'Sum ledger rows by *key*, or all rows if *key* is not set'
+        result = {}
+        for row in rows:
+            group_key = row[key] if key else None
+            if group_key not in result:
+                result[group_key] = dict(paid_sum=decimal.Decimal('0.00'), not_paid_sum=decimal.Decimal('0.00'))
+                if key:
+                    result[group_key][key] = group_key
+                if key == 'bundler_id':
+                    result[group_key]['bundler__name'] = row['bundler__name']
+            result[group_key]['paid_sum'] += row['paid_sum']
+            result[group_key]['not_paid_sum'] += row['not_paid_sum']
+        return list(result.values())
+
     @method_decorator(login_required)
     def get(self, request):
         if not request.user.is_superuser:
             raise Http404
 
         form = BundlerPaymentsForm(request.GET.dict())
-        bundler_payments = BundlerPayment.objects.all()
+        bundler_payment_totals = BundlerPaymentTotal.objects.all()
         bundler_payments_by_bundler = None
         bundler = None
 
         if form.is_valid():
             bundler = form.cleaned_data['bundler']
             if bundler:
-                bundler_payments = bundler_payments.filter(bundler=bundler)
+                bundler_payment_totals = bundler_payment_totals.filter(bundler=bundler)
 
-        bundler_payments_by_type = bundler_payments.values('payment_type').annotate(
-            paid_sum=Sum('payment', filter=Q(paid=True)),
-            not_paid_sum=Sum('payment', filter=Q(paid=False)),
-        )
-        bundler_payments_total = bundler_payments.aggregate(
-            paid_sum=Sum('payment', filter=Q(paid=True)),
-            not_paid_sum=Sum('payment', filter=Q(paid=False)),
-        )
+        rows = list(bundler_payment_totals.values('bundler_id', 'bundler__name', 'payment_type').annotate(
+            paid_sum=Sum('paid_sum'),
+            not_paid_sum=Sum('not_paid_sum'),
+        ).order_by('payment_type'))
 
+        bundler_payments_by_type = self.get_totals(rows, 'payment_type')
+        bundler_payments_total = (self.get_totals(rows) or [dict(paid_sum=None, not_paid_sum=None)])[0]
         if not bundler:
-            bundler_payments_by_bundler = bundler_payments.values('bundler_id', 'bundler__name').annotate(
-                paid_sum=Sum('payment', filter=Q(paid=True)),
-                not_paid_sum=Sum('payment', filter=Q(paid=False)),
-            ).order_by('-not_paid_sum')
+            bundler_payments_by_bundler = sorted(self.get_totals(rows, 'bundler_id'), key=lambda x: x['not_paid_sum'], reverse=True)
 
         context = dict(
             form=form,
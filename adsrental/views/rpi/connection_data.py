@@ -1,45 +1,60 @@
+import typing
+
 from django.views import View
-from django.http import JsonResponse, HttpRequest
+from django.http import HttpResponse, HttpRequest, HttpResponseNotModified
 
 from adsrental.models.raspberry_pi import RaspberryPi
 from adsrental.models.lead_account import LeadAccount
+from adsrental.utils import DeviceConfigCacheHelper
 
 
 class ConnectionDataView(View):
     '''
     Get data about EC2 by RPID. Should have been used by new python RaspberryPi firmware, but was not.
+
+    Response is cached per device and has ETag, so If-None-Match with current ETag gets 304 without DB access.
     '''
 
-    def get(self, request: HttpRequest, rpid: str) -> JsonResponse:
+    def get(self, request: HttpRequest, rpid: str) -> HttpResponse:
+        device_config_cache_helper = DeviceConfigCacheHelper()
+        document = device_config_cache_helper.get('connection_data', rpid)
+        if not document:
+            document = device_config_cache_helper.set('connection_data', rpid, self.get_data(rpid))
+        if device_config_cache_helper.is_not_modified(request, document):
+            return HttpResponseNotModified()
+
+        return device_config_cache_helper.get_response(document)
+
+    def get_data(self, rpid: str) -> typing.Dict[str, typing.Any]:
         raspberry_pi = RaspberryPi.objects.filter(rpid=rpid).first()
         if not raspberry_pi:
-            return JsonResponse({
+            return {
                 'error': 'Not found',
                 'shutdown': True,
                 'result': False,
-            })
+            }
 
         lead = raspberry_pi.get_lead()
         if not lead:
-            return JsonResponse({
+            return {
                 'error': 'Not available',
                 # 'shutdown': True,
                 'hostname': '',
                 'result': False,
-            })
+            }
 
         active_accounts_count = lead.lead_accounts.filter(status__in=LeadAccount.STATUSES_ACTIVE).count()
         if not active_accounts_count:
-            return JsonResponse({
+            return {
                 'error': 'Not available',
                 # 'shutdown': True,
                 'hostname': '',
                 'result': False,
-            })
+            }
 
         if not raspberry_pi.is_proxy_tunnel:
             ec2_instance = raspberry_pi.get_ec2_instance()
-            return JsonResponse({
+            return {
                 'rpid': raspberry_pi.rpid,
                 'hostname': ec2_instance.hostname if ec2_instance else '',
                 'user': 'Administrator',
@@ -48,9 +63,9 @@ class ConnectionDataView(View):
                 'is_proxy_tunnel': False,
                 'is_beta': raspberry_pi.is_proxy_tunnel or raspberry_pi.is_beta,
                 'result': True,
-            })
+            }
 
-        return JsonResponse({
+        return {
             'rpid': raspberry_pi.rpid,
             'hostname': raspberry_pi.proxy_hostname or '',
             'user': raspberry_pi.TUNNEL_USER,
@@ -59,4 +74,4 @@ class ConnectionDataView(View):
             'is_proxy_tunnel': True,
             'is_beta': raspberry_pi.is_proxy_tunnel or raspberry_pi.is_beta,
             'result': True,
-        })
+        }
@@ -1,15 +1,30 @@
+import typing
+
 from django.views import View
 from django.shortcuts import Http404
-from django.http import JsonResponse, HttpRequest
+from django.http import HttpResponse, HttpRequest, HttpResponseNotModified
 
 from adsrental.models.ec2_instance import EC2Instance
+from adsrental.utils import DeviceConfigCacheHelper
 
 
 class EC2DataView(View):
     '''
     Get data about EC2 by RPID. Should have been used by new python RaspberryPi firmware, but was not.
+
+    Response is cached per device and has ETag, so If-None-Match with current ETag gets 304 without DB access.
     '''
-    def get(self, request: HttpRequest, rpid: str) -> JsonResponse:
+    def get(self, request: HttpRequest, rpid: str) -> HttpResponse:
+        device_config_cache_helper = DeviceConfigCacheHelper()
+        document = device_config_cache_helper.get('ec2_data', rpid)
+        if not document:
+            document = device_config_cache_helper.set('ec2_data', rpid, self.get_data(rpid))
+        if device_config_cache_helper.is_not_modified(request, document):
+            return HttpResponseNotModified()
+
+        return device_config_cache_helper.get_response(document)
+
+    def get_data(self, rpid: str) -> typing.Dict[str, typing.Any]:
         ec2_instance = EC2Instance.get_by_rpid(rpid)
         if not ec2_instance:
             raise Http404
@@ -22,8 +37,8 @@ class EC2DataView(View):
             if not ec2_instance.is_running():
                 raise Http404
 
-        return JsonResponse({
+        return {
             'hostname': ec2_instance.hostname,
             'ip_address': ec2_instance.ip_address,
             'status': ec2_instance.status,
-        })
+        }
@@ -7,6 +7,7 @@ from django.shortcuts import render, redirect
 
 from adsrental.models.lead import Lead
 from adsrental.models.lead_history import LeadHistory
+from adsrental.models.lead_check_month import LeadCheckMonth
 
 
 class UserTimestampsView(View):
@@ -31,14 +32,10 @@ class UserTimestampsView(View):
         date_start = date.replace(day=1)
         date_end = self.last_day_of_month(date)
 
-        lead_histories = LeadHistory.objects.filter(
-            lead=lead,
-            date__gte=date_start,
-            date__lte=date_end,
-        ).order_by('-date')
-
-        for lh in lead_histories:
-            lh.amount, _ = lh.get_amount_with_note()
+        lead_histories = LeadCheckMonth.get_lead_histories([lead.leadid], date_start.date())
+        for lead_history in lead_histories:
+            lead_history.lead = lead
+        lead_histories = LeadHistory.calculate_amounts(reversed(lead_histories))
 
         return render(request, 'user/timestamps.html', dict(
             lead=lead,